@@ -1,3 +1,5 @@
 from .deliver import local_deliver  # noqa: F401
+from .planner import plan_deliver  # noqa: F401
 from .configurations import xAODConfig, Platform, Config  # noqa: F401
-from .utils import local_get_structure  # noqa: F401
+from .utils import local_get_structure, local_get_dataset_structure  # noqa: F401
+from .awkward_loading import ChunkedSample, lazy_awk, parallel_awk  # noqa: F401
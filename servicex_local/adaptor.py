@@ -1,8 +1,12 @@
+import asyncio
 import getpass
+import json
 import logging
 import shutil
 import tempfile
+import threading
 import uuid
+from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Optional
@@ -10,13 +14,19 @@ from typing import Dict, List, Optional
 from servicex.models import (
     CachedDataset,
     ResultFile,
+    ResultFormat,
     Status,
     TransformRequest,
     TransformStatus,
 )
 
+from servicex_local import metrics
 from servicex_local.codegen import SXCodeGen
-from servicex_local.science_images import BaseScienceImage
+from servicex_local.events import EventLog
+from servicex_local.manifest import TransformManifest, request_key
+from servicex_local.resources import peak_rss_history, suggest_memory_limit
+from servicex_local.science_images import BaseScienceImage, FileResult
+from servicex_local.timing import Timings
 
 
 def _rewrite_sh_files(directory: Path):
@@ -33,6 +43,106 @@ def _rewrite_sh_files(directory: Path):
             file.writelines(content)
 
 
+# The names transformer_capabilities.json uses in "file-formats" for each
+# ResultFormat.
+_CAPABILITY_FORMATS = {
+    ResultFormat.root_ttree: {"root", "root-file"},
+    ResultFormat.parquet: {"parquet"},
+    ResultFormat.root_rntuple: {"root-rntuple", "rntuple"},
+}
+
+
+def _check_result_format(generated_files_dir: Path, result_format: ResultFormat) -> None:
+    """Make sure the generated transformer can write the requested format.
+
+    The check uses the ``file-formats`` list in the generated
+    ``transformer_capabilities.json``. It is skipped if the code generator
+    did not write one.
+
+    Args:
+        generated_files_dir (Path): Where the code generator wrote its files.
+        result_format (ResultFormat): The format the request asked for.
+
+    Raises:
+        ValueError: If the transformer does not list the requested format.
+    """
+    capabilities_file = generated_files_dir / "transformer_capabilities.json"
+    if not capabilities_file.exists():
+        return
+    with capabilities_file.open("r") as f:
+        file_formats = json.load(f).get("file-formats")
+    if file_formats is None:
+        return
+
+    if not _CAPABILITY_FORMATS[result_format].intersection(file_formats):
+        raise ValueError(
+            f"Transformer cannot write {result_format.value} output - it only "
+            f"supports {', '.join(file_formats)}"
+        )
+
+
+def _staging_root() -> Path:
+    "Default parent directory for request outputs"
+    return Path(tempfile.gettempdir()) / f"servicex_{getpass.getuser()}"
+
+
+def _user_cache_dir(cache_dir: Path) -> Path:
+    "This user's part of a (possibly shared) cache directory"
+    return cache_dir / f"servicex_{getpass.getuser()}"
+
+
+@dataclass
+class PreparedTransform:
+    """A transform request whose code has been generated but not yet run."""
+
+    request_id: str
+    transform_request: TransformRequest
+    generated_files_dir: Path
+    manifest: Optional[TransformManifest] = field(default=None, repr=False)
+    # When the request was handed to the adaptor, before code generation.
+    submit_time: datetime = field(default_factory=datetime.now)
+
+
+def _save_generated_files(prepared: PreparedTransform) -> None:
+    """Copy the generated code of a failed request to the temp directory and
+    log where it can be found.
+
+    Args:
+        prepared (PreparedTransform): The request that failed.
+    """
+    dest_dir: Path = (
+        Path(tempfile.gettempdir())
+        / f"servicex_{getpass.getuser()}_request_{prepared.request_id}"
+    )
+    # A resumed request re-uses its request ID, so it may have failed before
+    shutil.copytree(prepared.generated_files_dir, dest_dir, dirs_exist_ok=True)
+    shutil.rmtree(prepared.generated_files_dir, ignore_errors=True)
+
+    # Log an error with the location of the transform
+    # source files
+    logger = logging.getLogger(__name__)
+    logger.error(
+        (
+            "Error during transformation. Transform files can be "
+            f"found at: {dest_dir}"
+        )
+    )
+
+
+def _remove_unrecorded_outputs(output_directory: Path, keep: List[Path]) -> None:
+    """Delete anything in a request's output directory that is not a recorded,
+    finished output - e.g. a partial file left by a run that died.
+
+    Args:
+        output_directory (Path): The request's output directory.
+        keep (List[Path]): Outputs of files the manifest lists as done.
+    """
+    keep_set = {p.resolve() for p in keep}
+    for p in output_directory.glob("*"):
+        if p.is_file() and p.resolve() not in keep_set:
+            p.unlink()
+
+
 class SXLocalAdaptor:
 
     def __init__(
@@ -41,12 +151,31 @@ class SXLocalAdaptor:
         science_runner: BaseScienceImage,
         cache_dir: Path,
         url: str,
+        output_dir: Optional[Path] = None,
     ):
+        """Run ServiceX transforms on this machine.
+
+        Args:
+            codegen (SXCodeGen): Code generator for the queries.
+            science_runner (BaseScienceImage): Runs the generated code over files.
+            cache_dir (Path): Root of the local cache (namespaced by user).
+            url (str): The URL this adaptor pretends to serve.
+            output_dir (Optional[Path]): If given, science images write each
+                request's outputs directly to ``output_dir/<request_id>`` and
+                those files are handed back as-is. Otherwise outputs are staged
+                in the temp directory and copied into the cache.
+        """
         self.codegen = codegen
         self.science_runner = science_runner
-        self.cache_dir = cache_dir / f"servicex_{getpass.getuser()}"
+        self.cache_dir = _user_cache_dir(cache_dir)
         self.url = url
+        self.output_dir = (
+            Path(output_dir).expanduser().resolve() if output_dir is not None else None
+        )
         self.transform_status_store: Dict[str, TransformStatus] = {}
+        # If set, the time each input file spends in the science image is
+        # recorded here.
+        self.timings: Optional[Timings] = None
 
     async def _get_authorization(self):
         "Dummied out - we always have authorization"
@@ -87,6 +216,8 @@ class SXLocalAdaptor:
         transform_request: TransformRequest,
         request_id: str,
         output_files: List[Path],
+        submit_time: Optional[datetime] = None,
+        finish_time: Optional[datetime] = None,
     ) -> TransformStatus:
         assert transform_request.file_list is not None, "File list is required"
         return TransformStatus(
@@ -106,7 +237,8 @@ class SXLocalAdaptor:
                 "files": len(transform_request.file_list),
                 "app-version": "this",
                 "generated-code-cm": "this",
-                "submit-time": datetime.now(),
+                "submit-time": submit_time or datetime.now(),
+                "finish-time": finish_time,
             }
         )
 
@@ -128,78 +260,258 @@ class SXLocalAdaptor:
         Raises:
             AssertionError: If the file list in the transform_request is None.
 
+        This is `prepare_transform` followed by `run_prepared_transform`; see
+        those for the details. Callers that want to overlap code generation
+        of one request with the transform of another can call them directly.
+        """
+        prepared = await self.prepare_transform(transform_request)
+        return await self.run_prepared_transform(prepared)
+
+    async def prepare_transform(
+        self,
+        transform_request: TransformRequest,
+    ) -> PreparedTransform:
+        """
+        Run the code generator for a transformation request.
+
         This method performs the following steps:
         1. Creates a temporary directory for generated files.
         2. Generates code based on the selection in the transform request.
-        3. Creates a unique directory for the output files.
-        4. Runs the science image to perform the transformation on the input
-           files.
-        5. Stores the transformation status indexed by a GUID.
-        6. Returns the GUID as the request ID.
+        3. Rewrites any shell scripts with Linux line endings.
+        4. Checks the transformer can write the requested result format.
+
+        The code generator runs in a worker thread so the event loop is free to
+        drive other requests.
+
+        Args:
+            transform_request (TransformRequest): The transformation request.
+
+        Returns:
+            PreparedTransform: The request, its request ID, and the directory
+                holding the generated code.
         """
-        with tempfile.TemporaryDirectory() as generated_files_dir:
+        submit_time = datetime.now()
+
+        # Pick up where an earlier, unfinished run of the same request left off
+        manifest_path = self._manifest_path(transform_request)
+        manifest = TransformManifest.load(manifest_path)
+        if manifest is None or not manifest.resumable:
             request_id = str(uuid.uuid4())
-            try:
-                generated_files_dir = Path(generated_files_dir)
-                self.codegen.gen_code(
-                    transform_request.selection,
-                    generated_files_dir,
-                )
+            manifest = TransformManifest(
+                manifest_path, request_id, self._output_directory(request_id)
+            )
+        request_id = manifest.request_id
 
-                # Make sure all files have proper line endings
-                _rewrite_sh_files(generated_files_dir)
+        generated_files_dir = Path(tempfile.mkdtemp())
+        prepared = PreparedTransform(
+            request_id, transform_request, generated_files_dir, manifest, submit_time
+        )
+        try:
+            await asyncio.to_thread(
+                self.codegen.gen_code,
+                transform_request.selection,
+                generated_files_dir,
+            )
 
-                # Create a unique directory for the output files directly under
-                # the temp directory
-                output_directory: Path = (
-                    Path(tempfile.gettempdir())
-                    / f"servicex_{getpass.getuser()}/{request_id}"
-                )
-                output_directory.mkdir(parents=True, exist_ok=True)
-
-                # Run the science image to perform the transformation
-                input_files = transform_request.file_list
-                assert (
-                    input_files is not None
-                ), "Local transform needs an actual file list"
-                output_format = transform_request.result_format.name
-
-                output_files = self.science_runner.transform(
-                    generated_files_dir,
-                    input_files,
-                    output_directory,
-                    output_format,
-                )
+            # Make sure all files have proper line endings
+            _rewrite_sh_files(generated_files_dir)
 
-                # Store the TransformStatus indexed by a GUID
-                transform_status = self.create_transform_status(
-                    transform_request, request_id, output_files
-                )
-                self.transform_status_store[request_id] = transform_status
+            _check_result_format(generated_files_dir, transform_request.result_format)
+
+            return prepared
+
+        except Exception:
+            _save_generated_files(prepared)
+            raise
+
+    async def run_prepared_transform(self, prepared: PreparedTransform) -> str:
+        """
+        Run the science image over a request whose code has been generated.
 
-                # Return the GUID as the request ID
-                return request_id
+        This method performs the following steps:
+        1. Creates a unique directory for the output files.
+        2. Runs the science image to perform the transformation on the input
+           files that the request's manifest does not already list as done.
+        3. Stores the transformation status indexed by a GUID.
+        4. Returns the GUID as the request ID.
+
+        The manifest (under ``cache_dir/manifests``) is updated as each file
+        finishes, so if this run dies a re-run of the same request only
+        transforms the missing or failed files. Each file's timing, exit code,
+        container and sizes are also appended to the request's event log,
+        ``cache_dir/events/<request_id>.jsonl``.
+
+        The generated code directory is removed once the transform is done. If
+        it fails, the generated code is first copied somewhere the user can
+        find it. If this is cancelled (e.g. another sample of the deliver
+        failed), the science image starts no more files, and the files
+        already running are waited for before anything is removed.
+
+        Args:
+            prepared (PreparedTransform): The output of `prepare_transform`.
 
-            except Exception:
-                # Copy the files in generated_files_dir to the temp directory
-                dest_dir: Path = (
-                    Path(tempfile.gettempdir())
-                    / f"servicex_{getpass.getuser()}_request_{request_id}"
+        Returns:
+            str: A unique request ID for the transformation.
+        """
+        transform_request = prepared.transform_request
+        request_id = prepared.request_id
+        generated_files_dir = prepared.generated_files_dir
+        manifest = prepared.manifest or TransformManifest(
+            self._manifest_path(transform_request),
+            request_id,
+            self._output_directory(request_id),
+        )
+        events = EventLog(self._events_path(request_id))
+        start = datetime.now()
+        remaining_files: List[str] = []
+        finished: List[FileResult] = []
+        cancelled = threading.Event()
+
+        def on_file_done(result: FileResult) -> None:
+            finished.append(result)
+            metrics.FILES_PENDING.dec()
+            manifest.record(result)
+            events.file_done(result)
+            if self.timings is not None:
+                self.timings.record(
+                    "file",
+                    result.start,
+                    result.end,
+                    transform_request.title,
+                    result.input_file,
                 )
-                shutil.copytree(generated_files_dir, dest_dir)
-
-                # Log an error with the location of the transform
-                # source files
-                logger = logging.getLogger(__name__)
-                logger.error(
-                    (
-                        "Error during transformation. Transform files can be "
-                        f"found at: {dest_dir}"
+
+        try:
+            # Create a unique directory for the output files, either in the
+            # temp directory or under the user's output directory.
+            output_directory = manifest.output_directory
+            output_directory.mkdir(parents=True, exist_ok=True)
+
+            # Run the science image to perform the transformation
+            input_files = transform_request.file_list
+            assert (
+                input_files is not None
+            ), "Local transform needs an actual file list"
+            output_format = transform_request.result_format.value
+
+            done_files = set(manifest.completed_files())
+            remaining_files = [f for f in input_files if f not in done_files]
+            metrics.FILES_PENDING.inc(len(remaining_files))
+            events.emit(
+                "request_start",
+                request_id=request_id,
+                image=self.science_runner.image,
+                files=len(input_files),
+                already_done=len(input_files) - len(remaining_files),
+                output_directory=str(output_directory),
+            )
+            if done_files:
+                logging.getLogger(__name__).info(
+                    "Resuming request %s: %d of %d files already done",
+                    request_id,
+                    len(input_files) - len(remaining_files),
+                    len(input_files),
+                )
+            _remove_unrecorded_outputs(output_directory, manifest.completed_outputs())
+
+            # The science image blocks until every file is done, so run it
+            # off the event loop to let other requests proceed meanwhile.
+            new_output_files = []
+            if remaining_files:
+                work = asyncio.ensure_future(
+                    asyncio.to_thread(
+                        self.science_runner.transform,
+                        generated_files_dir,
+                        remaining_files,
+                        output_directory,
+                        output_format,
+                        on_file_done=on_file_done,
+                        cancel=cancelled,
                     )
                 )
+                try:
+                    new_output_files = await asyncio.shield(work)
+                except asyncio.CancelledError:
+                    # The thread can't be stopped, and it still needs the
+                    # generated files: stop it starting more files and wait
+                    # for the running ones before cleaning up.
+                    cancelled.set()
+                    await asyncio.gather(work, return_exceptions=True)
+                    raise
+            output_files = manifest.completed_outputs() if done_files else []
+            output_files += [f for f in new_output_files if f not in output_files]
+            manifest.finish("complete")
+            metrics.REQUESTS.inc(status="complete")
+            events.emit(
+                "request_end",
+                status="complete",
+                duration=(datetime.now() - start).total_seconds(),
+            )
 
-                # Re-raise the exception
-                raise
+            # Store the TransformStatus indexed by a GUID
+            transform_status = self.create_transform_status(
+                transform_request,
+                request_id,
+                output_files,
+                submit_time=prepared.submit_time,
+                finish_time=datetime.now(),
+            )
+            self.transform_status_store[request_id] = transform_status
+
+            # Return the GUID as the request ID
+            return request_id
+
+        except asyncio.CancelledError:
+            # Left resumable: the files that finished are in the manifest
+            events.emit(
+                "request_end",
+                status="cancelled",
+                duration=(datetime.now() - start).total_seconds(),
+            )
+            raise
+
+        except Exception as e:
+            manifest.finish("failed")
+            metrics.REQUESTS.inc(status="failed")
+            events.emit(
+                "request_end",
+                status="failed",
+                duration=(datetime.now() - start).total_seconds(),
+                error=str(e),
+            )
+            _save_generated_files(prepared)
+            raise
+
+        finally:
+            # Files that never ran (cancelled after a failure) are not pending
+            metrics.FILES_PENDING.dec(len(remaining_files) - len(finished))
+            shutil.rmtree(generated_files_dir, ignore_errors=True)
+
+    def _manifest_path(self, transform_request: TransformRequest) -> Path:
+        "Where the completion manifest for a request lives"
+        return self.cache_dir / "manifests" / f"{request_key(transform_request)}.json"
+
+    def _events_path(self, request_id: str) -> Path:
+        "Where the event log for a request lives"
+        return self.cache_dir / "events" / f"{request_id}.jsonl"
+
+    def suggest_memory_limit(self, headroom: float = 1.25) -> Optional[float]:
+        """A ``memory_limit`` for `DockerScienceImage` based on the peak memory
+        of every file in this cache's event logs.
+
+        Args:
+            headroom (float): Factor to allow on top of the largest peak.
+
+        Returns:
+            Optional[float]: The limit in GB, or None if no peaks are recorded.
+        """
+        return suggest_memory_limit(
+            peak_rss_history(self.cache_dir / "events"), headroom=headroom
+        )
+
+    def _output_directory(self, request_id: str) -> Path:
+        "Where the science image writes the outputs of a request"
+        return (self.output_dir or _staging_root()) / request_id
 
     async def get_transform_status(self, request_id: str) -> TransformStatus:
         # Retrieve the TransformStatus from the store using the request ID
@@ -211,24 +523,30 @@ class SXLocalAdaptor:
 
 
 class MinioLocalAdaptor:
-    def __init__(self, bucket: str, **kwargs):
+    def __init__(self, bucket: str, output_root: Optional[Path] = None, **kwargs):
         self.request_id = bucket
+        self.output_root = output_root
 
     @classmethod
-    def for_transform(cls, transform: TransformStatus):
+    def for_transform(
+        cls, transform: TransformStatus, output_root: Optional[Path] = None
+    ):
         return cls(
             endpoint_host=transform.minio_endpoint,  # type: ignore
             secure=transform.minio_secured,  # type: ignore
             access_key=transform.minio_access_key,  # type: ignore
             secret_key=transform.minio_secret_key,  # type: ignore
             bucket=transform.request_id,
+            output_root=output_root,
         )
 
+    @property
+    def output_directory(self) -> Path:
+        "The directory the science image wrote this request's outputs to"
+        return (self.output_root or _staging_root()) / self.request_id
+
     async def list_bucket(self) -> List[ResultFile]:
-        output_directory: Path = (
-            Path(tempfile.gettempdir())
-            / f"servicex_{getpass.getuser()}/{self.request_id}"
-        )
+        output_directory = self.output_directory
         result_files = []
         for file_path in output_directory.glob("*"):
             if file_path.is_file():
@@ -245,10 +563,7 @@ class MinioLocalAdaptor:
     async def download_file(
         self, object_name: str, local_dir: Path, shorten_filename: bool = False
     ) -> Path:
-        output_directory: Path = (
-            Path(tempfile.gettempdir())
-            / f"servicex_{getpass.getuser()}/{self.request_id}"
-        )
+        output_directory = self.output_directory
         source_path = output_directory / object_name
         destination_path = local_dir / object_name
 
@@ -257,16 +572,16 @@ class MinioLocalAdaptor:
                 f"File {object_name} not found in {output_directory}"
             )
 
-        destination_path.parent.mkdir(parents=True, exist_ok=True)
-        destination_path.write_bytes(source_path.read_bytes())
+        # The cache can be the output directory itself, in which case the file
+        # is already where it needs to be.
+        if destination_path.resolve() != source_path.resolve():
+            destination_path.parent.mkdir(parents=True, exist_ok=True)
+            await asyncio.to_thread(shutil.copyfile, source_path, destination_path)
 
         return destination_path.resolve()
 
     async def get_signed_url(self, object_name: str) -> str:
-        output_directory: Path = (
-            Path(tempfile.gettempdir())
-            / f"servicex_{getpass.getuser()}/{self.request_id}"
-        )
+        output_directory = self.output_directory
         file_path = output_directory / object_name
 
         if not file_path.exists():
@@ -0,0 +1,240 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Mapping, Optional, Sequence, Union
+
+import awkward as ak
+import uproot
+
+
+def _is_parquet(path: Union[str, Path]) -> bool:
+    return Path(str(path)).suffix in (".parquet", ".pq")
+
+
+def _find_tree(path: Union[str, Path]) -> str:
+    """Return the name of the first TTree or RNTuple in a ROOT file.
+
+    Args:
+        path (Union[str, Path]): The ROOT file.
+
+    Raises:
+        RuntimeError: If the file has no TTree or RNTuple.
+    """
+    with uproot.open(path) as f:
+        for key, classname in f.classnames().items():
+            if "TTree" in classname or "RNTuple" in classname:
+                return key.split(";")[0]
+    raise RuntimeError(f"No TTree or RNTuple found in ROOT file {path}")
+
+
+def load_file(
+    path: Union[str, Path],
+    columns: Optional[List[str]] = None,
+    tree_name: Optional[str] = None,
+) -> ak.Array:
+    """Read one delivered ROOT or parquet file into memory.
+
+    Args:
+        path (Union[str, Path]): The file.
+        columns (Optional[List[str]]): Only read these columns/branches.
+        tree_name (Optional[str]): The tree to read from a ROOT file. If None,
+            the first TTree or RNTuple is used.
+
+    Returns:
+        ak.Array: The file's contents.
+    """
+    if _is_parquet(path):
+        return ak.from_parquet(str(path), columns=columns)
+    tree_name = tree_name or _find_tree(path)
+    options = {} if columns is None else {"filter_name": columns}
+    with uproot.open(path) as f:
+        return f[tree_name].arrays(library="ak", **options)
+
+
+class ChunkedSample:
+    """The delivered files of one sample, read lazily in bounded-size chunks.
+
+    Nothing is read when this is created. Each iteration re-opens the files and
+    yields one Awkward array per chunk, so memory use is bounded by the chunk
+    size no matter how large the sample is. Iterate over it more than once to
+    make several passes.
+
+    ROOT files are read with ``uproot.iterate``, which splits them into chunks
+    of ``step_size`` (a number of entries or a size such as ``"100 MB"``).
+    Parquet files are read one row group at a time. ``step_size`` does not
+    apply to them, since the row groups were set when the file was written.
+    """
+
+    def __init__(
+        self,
+        files: Sequence[Union[str, Path]],
+        columns: Optional[List[str]] = None,
+        step_size: Union[int, str] = "100 MB",
+        tree_name: Optional[str] = None,
+    ):
+        """
+        Args:
+            files (Sequence[Union[str, Path]]): The sample's delivered files.
+            columns (Optional[List[str]]): Only read these columns/branches
+                (uproot ``filter_name`` patterns for ROOT files). All if None.
+            step_size (Union[int, str]): Chunk size for ROOT files.
+            tree_name (Optional[str]): The tree to read from ROOT files. If None,
+                the first TTree or RNTuple of each file is used.
+        """
+        self.files = [str(f) for f in files]
+        self.columns = columns
+        self.step_size = step_size
+        self.tree_name = tree_name
+
+    def __iter__(self) -> Iterator[ak.Array]:
+        for path in self.files:
+            yield from self._iter_file(path)
+
+    def iter_files(self) -> Iterator[Iterator[ak.Array]]:
+        "One chunk iterator per file, in delivery order"
+        for path in self.files:
+            yield self._iter_file(path)
+
+    def _iter_file(self, path: str) -> Iterator[ak.Array]:
+        if _is_parquet(path):
+            metadata = ak.metadata_from_parquet(path)
+            for row_group in range(metadata["num_row_groups"]):
+                yield ak.from_parquet(path, columns=self.columns, row_groups=[row_group])
+        else:
+            tree_name = self.tree_name or _find_tree(path)
+            options = {} if self.columns is None else {"filter_name": self.columns}
+            yield from uproot.iterate(
+                f"{path}:{tree_name}",
+                step_size=self.step_size,
+                library="ak",
+                **options,
+            )
+
+    def __repr__(self) -> str:
+        return f"ChunkedSample({len(self.files)} files, step_size={self.step_size!r})"
+
+
+def lazy_awk(
+    deliver_dict: Mapping[str, Sequence[Union[str, Path]]],
+    columns: Optional[List[str]] = None,
+    step_size: Union[int, str] = "100 MB",
+    tree_name: Optional[str] = None,
+) -> Dict[str, ChunkedSample]:
+    """Lazy counterpart of ``to_awk``: wrap each sample's files in a
+    `ChunkedSample` rather than loading them into memory.
+
+    Args:
+        deliver_dict (Mapping[str, Sequence]): The result of ``local_deliver``
+            (sample name to list of files).
+        columns (Optional[List[str]]): Only read these columns/branches.
+        step_size (Union[int, str]): Chunk size for ROOT files.
+        tree_name (Optional[str]): The tree to read from ROOT files.
+
+    Returns:
+        Dict[str, ChunkedSample]: A lazily read sample for each sample name.
+    """
+    return {
+        sample: ChunkedSample(files, columns=columns, step_size=step_size, tree_name=tree_name)
+        for sample, files in deliver_dict.items()
+    }
+
+
+class ParallelAwkConverter:
+    """Convert delivered files to Awkward arrays on a pool of threads.
+
+    Files are converted as soon as they are handed over with `submit`, so a
+    sample that has finished its transform can be read while others are still
+    in the science image. `results` waits for the conversions and concatenates
+    each sample's arrays in delivery order.
+
+    Threads rather than processes are used: uproot's decompression and the
+    numpy kernels underneath awkward release the GIL, and threads avoid
+    pickling every array back to the caller.
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        columns: Optional[List[str]] = None,
+        tree_name: Optional[str] = None,
+    ):
+        """
+        Args:
+            max_workers (int): Number of files converted at once.
+            columns (Optional[List[str]]): Only read these columns/branches.
+            tree_name (Optional[str]): The tree to read from ROOT files.
+        """
+        self.columns = columns
+        self.tree_name = tree_name
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="servicex_local_awk"
+        )
+        self._futures: Dict[str, List[Future]] = {}
+
+    def submit(self, sample: str, files: Sequence[Union[str, Path]]) -> None:
+        """Start converting the files of a sample.
+
+        Args:
+            sample (str): The sample name.
+            files (Sequence[Union[str, Path]]): The sample's delivered files.
+        """
+        self._futures[sample] = [
+            self._pool.submit(load_file, f, self.columns, self.tree_name)
+            for f in files
+        ]
+
+    def results(self, order: Optional[Sequence[str]] = None) -> Dict[str, ak.Array]:
+        """Wait for all conversions and return one array per sample.
+
+        Args:
+            order (Optional[Sequence[str]]): The samples, in the order wanted
+                in the result (e.g. the spec's). Samples are submitted as they
+                finish, so by default the order is whatever finished first.
+
+        Raises:
+            RuntimeError: If a sample has no files.
+        """
+        arrays = {}
+        for sample in order if order is not None else list(self._futures):
+            futures = self._futures[sample]
+            if not futures:
+                raise RuntimeError(
+                    f"Delivered result file path list for {sample} is empty."
+                )
+            parts = [f.result() for f in futures]
+            arrays[sample] = parts[0] if len(parts) == 1 else ak.concatenate(parts)
+        return arrays
+
+    def close(self) -> None:
+        "Stop the pool, dropping conversions that have not started"
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self) -> "ParallelAwkConverter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def parallel_awk(
+    deliver_dict: Mapping[str, Sequence[Union[str, Path]]],
+    max_workers: int,
+    columns: Optional[List[str]] = None,
+    tree_name: Optional[str] = None,
+) -> Dict[str, ak.Array]:
+    """Multi-threaded counterpart of ``to_awk``: every file of every sample
+    is converted in parallel and the arrays are concatenated per sample.
+
+    Args:
+        deliver_dict (Mapping[str, Sequence]): The result of ``local_deliver``
+            (sample name to list of files).
+        max_workers (int): Number of files converted at once.
+        columns (Optional[List[str]]): Only read these columns/branches.
+        tree_name (Optional[str]): The tree to read from ROOT files.
+
+    Returns:
+        Dict[str, ak.Array]: The contents of each sample.
+    """
+    with ParallelAwkConverter(max_workers, columns=columns, tree_name=tree_name) as converter:
+        for sample, files in deliver_dict.items():
+            converter.submit(sample, files)
+        return converter.results()
@@ -1,11 +1,14 @@
 import importlib
 import json
 import logging
+import sys
 import urllib.request
-from dataclasses import dataclass
-from typing import TYPE_CHECKING, Union
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, List, Optional, Union
 from enum import Enum
 
+from .log_rules import LogRules
+
 
 class Platform(Enum):
     """Options for which platform to use for the runtime environment."""
@@ -13,6 +16,8 @@ class Platform(Enum):
     docker = "docker"
     singularity = "singularity"
     wsl2 = "wsl2"
+    # Run the generated code directly on this machine, with no container.
+    local = "local"
 
 
 if TYPE_CHECKING:
@@ -27,6 +32,9 @@ _DOCKER_IMAGE = "sslhep/servicex_func_adl_xaod_transformer"
 
 _VALID_RELEASES = (21, 22, 25)
 
+# Keyword-only dataclass fields need Python 3.10. On 3.9 they stay positional.
+_KW_ONLY = {"kw_only": True} if sys.version_info >= (3, 10) else {}
+
 
 @dataclass
 class Config:
@@ -37,15 +45,32 @@ class Config:
     ignore_cache: bool = False
     awk: bool = False
     logging_level: str = "WARNING"
+    # Settings from here on are keyword-only, so subclass fields such as
+    # xAODConfig.release keep their positions.
+    concurrency: int = field(default=1, **_KW_ONLY)
+    output_dir: Optional[str] = field(default=None, **_KW_ONLY)
+    awk_lazy: bool = field(default=False, **_KW_ONLY)
+    awk_step_size: Union[int, str] = field(default="100 MB", **_KW_ONLY)
+    awk_columns: Optional[List[str]] = field(default=None, **_KW_ONLY)
+    awk_workers: int = field(default=1, **_KW_ONLY)
+    log_rules: Optional[Dict[str, str]] = field(default=None, **_KW_ONLY)
+    profile: bool = field(default=False, **_KW_ONLY)
+    sample_resources: bool = field(default=False, **_KW_ONLY)
 
     def __post_init__(self):
         if isinstance(self.platform, str):
             self.platform = Platform[self.platform]
+        if self.concurrency < 1:
+            raise ValueError(f"concurrency must be at least 1, got {self.concurrency}")
+        if self.awk_workers < 1:
+            raise ValueError(f"awk_workers must be at least 1, got {self.awk_workers}")
         if self.logging_level not in logging._nameToLevel:
             valid = sorted(logging._nameToLevel)
             raise ValueError(
                 f"logging_level must be one of {valid}, got {self.logging_level!r}"
             )
+        if self.log_rules:
+            LogRules(self.log_rules)  # Raise for bad levels or patterns now
 
 
 @dataclass
@@ -1,24 +1,33 @@
 from __future__ import annotations
 
-import hashlib
+import asyncio
 import json
 import logging
+import shutil
+import threading
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Generator, List, Union, Mapping
+from typing import Any, Callable, Generator, List, Optional, Tuple, Union, Mapping
 from deprecated import deprecated
 
 from make_it_sync import make_sync
 from servicex import General, ResultDestination, Sample, ServiceXSpec
 from servicex.expandable_progress import ExpandableProgress
-from servicex.models import ResultFormat, TransformRequest, TransformStatus
+from servicex.models import TransformRequest, TransformStatus
 from servicex.query_core import QueryStringGenerator
 from servicex.servicex_client import GuardList
 from servicex.yaml_parser import YAML
 
-from .adaptor import SXLocalAdaptor, MinioLocalAdaptor
+from . import metrics
+from .adaptor import SXLocalAdaptor, MinioLocalAdaptor, PreparedTransform, _staging_root
+from .awkward_loading import ParallelAwkConverter, lazy_awk, parallel_awk
 from .codegen import LocalXAODCodegen
 from .configurations import Config, Platform
+from .log_rules import LogRules
+from .manifest import request_key
+from .profiling import DeliverProfile
+from .science_images import BaseScienceImage
+from .timing import Timings
 from servicex_analysis_utils import to_awk
 
 logger = logging.getLogger(__name__)
@@ -64,25 +73,71 @@ def _load_ServiceXSpec(
     return config
 
 
+def _servicex_cache_dir() -> Optional[Path]:
+    "The cache directory of the user's ServiceX.yaml, or None without one"
+    from servicex.configuration import Configuration
+
+    try:
+        return Path(Configuration.read().cache_path).resolve()
+    except NameError:
+        return None
+
+
+def _science_image(image: str, platform: Platform) -> BaseScienceImage:
+    "The science image that runs files for ``platform``"
+    if platform == Platform.docker:
+        from .science_images import DockerScienceImage
+
+        return DockerScienceImage(image)
+
+    elif platform == Platform.singularity:
+        from .science_images import SingularityScienceImage
+
+        return SingularityScienceImage(image)
+
+    elif platform == Platform.wsl2:
+        from .science_images import WSL2ScienceImage
+
+        container, release = image.split(":")
+        return WSL2ScienceImage(container, release)
+
+    elif platform == Platform.local:
+        from .science_images import LocalProcessScienceImage
+
+        # No container: the image name is not used.
+        return LocalProcessScienceImage()
+
+    raise ValueError(f"Unknown platform {platform}")
+
+
 def install_sx_local(
-    image: str, platform: Platform = Platform.docker, host_port: int = 5001
+    image: str,
+    platform: Platform = Platform.docker,
+    host_port: int = 5001,
+    output_dir: Optional[Union[str, Path]] = None,
+    log_rules: Optional[Mapping[str, str]] = None,
+    sample_resources: bool = False,
 ):
     """Set up a local ServiceX endpoint for data transformation.
 
     Args:
-        image (str): Image name for the container.
+        image (str): Image name for the container. Ignored for
+            ``Platform.local``.
         platform (Platform): Which platform to use.
         host_port (int): Local host port to expose.
+        output_dir (Optional[Union[str, Path]]): Directory the science image
+            writes outputs to directly. If None, outputs are staged in the temp
+            directory and copied into the cache.
+        log_rules (Optional[Mapping[str, str]]): Extra rules mapping regular
+            expressions to the level container output lines are logged at.
+        sample_resources (bool): Sample the memory and CPU each file uses
+            while it runs.
 
     Returns:
         Tuple[str, SXLocalAdaptor]: Codegen name, adaptor.
     """
-    from servicex.configuration import Configuration
-
-    try:
-        sx_cfg = Configuration.read()
-        cache_dir = Path(sx_cfg.cache_path).resolve()
-    except NameError:
+    cache_dir = _servicex_cache_dir()
+    if cache_dir is None:
         import tempfile
 
         cache_dir = Path(tempfile.mkdtemp()).resolve()
@@ -92,28 +147,18 @@ def install_sx_local(
         )
 
     codegen = LocalXAODCodegen()
+    science_runner = _science_image(image, platform)
 
-    if platform == Platform.docker:
-        from .science_images import DockerScienceImage
-
-        science_runner = DockerScienceImage(image)
-
-    elif platform == Platform.singularity:
-        from .science_images import SingularityScienceImage
-
-        science_runner = SingularityScienceImage(image)
-
-    elif platform == Platform.wsl2:
-        from .science_images import WSL2ScienceImage
-
-        container, release = image.split(":")
-        science_runner = WSL2ScienceImage(container, release)
-
-    else:
-        raise ValueError(f"Unknown platform {platform}")
+    if log_rules:
+        science_runner.log_rules = LogRules(log_rules)
+    science_runner.sample_resources = sample_resources
 
     adaptor = SXLocalAdaptor(
-        codegen, science_runner, cache_dir, f"http://localhost:{host_port}"
+        codegen,
+        science_runner,
+        cache_dir,
+        f"http://localhost:{host_port}",
+        output_dir=Path(output_dir) if output_dir is not None else None,
     )
 
     logging.info(f"Using local ServiceX endpoint: {codegen}")
@@ -128,7 +173,8 @@ def _sample_run_info(
     Generate TransformRequest objects for a list of samples.
 
     Args:
-        g (General): A general configuration object.
+        g (General): A general configuration object. Its ``OutputFormat`` sets
+            the result format of every request.
         samples (List[Sample]): A list of Sample objects containing information
             about each sample.
     Yields:
@@ -154,7 +200,7 @@ def _sample_run_info(
             codegen="local-codegen",
             selection=selection,
             result_destination=ResultDestination.object_store,
-            result_format=ResultFormat.root_ttree,
+            result_format=g.OutputFormat.to_ResultFormat(),
         )
 
         s.dataset_identifier.populate_transform_request(tq)
@@ -172,8 +218,7 @@ def _generate_cache_key(tq: TransformRequest) -> str:
     Returns:
         str: A hash string representing the cache key.
     """
-    key = f"{tq.file_list}-{tq.selection}"
-    return hashlib.md5(key.encode()).hexdigest()
+    return request_key(tq)
 
 
 def _get_cache_file(cache_dir: Path) -> Path:
@@ -214,21 +259,147 @@ def _save_cache(cache: dict[str, Any], cache_dir: Path) -> None:
         json.dump(cache, f)
 
 
+def _status_from_cache(info: dict[str, Any]) -> TransformStatus:
+    """
+    Rebuild a TransformStatus from its cache.json entry.
+
+    Args:
+        info (dict[str, Any]): The cached entry (left unmodified).
+    Returns:
+        TransformStatus: The status it describes.
+    """
+    info = dict(info)
+    info.pop("output_directory", None)
+    info["submit_time"] = datetime.fromisoformat(info["submit_time"])
+    info["finish_time"] = (
+        datetime.fromisoformat(info["finish_time"])
+        if info["finish_time"] is not None
+        else None
+    )
+    info = {
+        k.replace("_", "-") if k not in ("request_id", "did_id") else k: v
+        for k, v in info.items()
+    }
+    return TransformStatus(**info)
+
+
+def _status_to_cache(status: TransformStatus) -> dict[str, Any]:
+    """
+    Turn a TransformStatus into a JSON-friendly cache.json entry.
+
+    Args:
+        status (TransformStatus): The status to store.
+    Returns:
+        dict[str, Any]: The cache entry.
+    """
+    info = status.model_dump()
+    info["submit_time"] = info["submit_time"].isoformat()
+    info["finish_time"] = (
+        info["finish_time"].isoformat() if info["finish_time"] is not None else None
+    )
+    return info
+
+
+async def _prepare_transform(adaptor: SXLocalAdaptor, tq: TransformRequest) -> Any:
+    """
+    Run the codegen stage for a request.
+
+    Adaptors that do not split code generation out (no ``prepare_transform``)
+    get the request back unchanged and do all the work in the transform stage.
+    """
+    prepare = getattr(adaptor, "prepare_transform", None)
+    return await prepare(tq) if prepare is not None else tq
+
+
+async def _run_transform(adaptor: SXLocalAdaptor, prepared: Any) -> str:
+    "Run the transform stage for a request returned by `_prepare_transform`."
+    if isinstance(prepared, PreparedTransform):
+        return await adaptor.run_prepared_transform(prepared)
+    return await adaptor.submit_transform(prepared)
+
+
+def _in_place_outputs(
+    adaptor: SXLocalAdaptor, prepared: Any, request_id: str
+) -> Optional[Path]:
+    """The directory a request's outputs are to be handed back from in place,
+    or None if they were staged and are to be copied into the cache.
+
+    A resumed request keeps the output directory its manifest was started
+    with, whatever the adaptor's ``output_dir`` is now.
+    """
+    if isinstance(prepared, PreparedTransform) and prepared.manifest is not None:
+        output_directory = prepared.manifest.output_directory
+        return output_directory if output_directory != _staging_root() / request_id else None
+    output_dir = getattr(adaptor, "output_dir", None)
+    return output_dir / request_id if output_dir is not None else None
+
+
+def _sample_title(tq: TransformRequest) -> str:
+    "The key a request's files are returned under"
+    return tq.title if tq.title is not None else "local-run-dataset"
+
+
+def _discard_queued(transform_queue: asyncio.Queue) -> None:
+    "Remove the generated code of requests that never reached the transform stage."
+    while not transform_queue.empty():
+        item = transform_queue.get_nowait()
+        if item is not None and isinstance(item[2], PreparedTransform):
+            shutil.rmtree(item[2].generated_files_dir, ignore_errors=True)
+
+
+def _share_file_slots(adaptor: SXLocalAdaptor, concurrency: int) -> None:
+    """
+    Give the adaptor's science image a per-file slot budget for this deliver.
+
+    Every running file holds one slot, so no more than ``concurrency`` files
+    run at once across all samples. How many files of one sample may run at
+    once is still up to the image's own ``max_workers``.
+
+    Args:
+        adaptor (SXLocalAdaptor): The adaptor whose science image is shared.
+        concurrency (int): The total number of files allowed to run at once.
+    """
+    runner = getattr(adaptor, "science_runner", None)
+    if isinstance(runner, BaseScienceImage):
+        runner.file_slots = threading.BoundedSemaphore(concurrency)
+
+
 async def deliver_async(
     spec: Union[ServiceXSpec, Mapping[str, Any], str, Path],
     adaptor: SXLocalAdaptor,
     ignore_local_cache: bool = False,
     display_progress: bool = True,
+    concurrency: int = 1,
+    on_sample_done: Optional[Callable[[str, GuardList], None]] = None,
+    timings: Optional[Timings] = None,
     **kwargs,
 ) -> dict[str, GuardList] | None:
+    """
+    Run every sample in the spec through the local adaptor.
+
+    Args:
+        spec: The ServiceX spec (object, dictionary, or path to a yaml file).
+        adaptor (SXLocalAdaptor): The adaptor that runs the transforms.
+        ignore_local_cache (bool): If True, re-run samples even when cached.
+        display_progress (bool): Show the progress bar.
+        concurrency (int): How many samples to transform at once. This is
+            also the budget of files that may run at once across all samples.
+        on_sample_done (Optional[Callable]): Called with the sample title and
+            its output files as soon as each sample's files are available, in
+            completion order. Lets the caller start reading them while other
+            samples are still being transformed.
+        timings (Optional[Timings]): If given, the time spent in each stage,
+            per sample and per file, is recorded here.
 
+    Returns:
+        dict[str, GuardList]: Output files keyed by sample title, in spec order.
+    """
     _IGNORED_KWARGS = {
         "config_path",
         "servicex_name",
         "return_exceptions",
         "fail_if_incomplete",
         "progress_bar",
-        "concurrency",
         "cache_dir",
     }
     ignored = _IGNORED_KWARGS.intersection(kwargs)
@@ -238,8 +409,9 @@ async def deliver_async(
             "The following arguments are ignored in servicex-local: %s",
             ", ".join(sorted(ignored)),
         )
+    if concurrency < 1:
+        raise ValueError(f"concurrency must be at least 1, got {concurrency}")
 
-    results: dict[str, GuardList] = {}
     cache = _load_cache(adaptor.cache_dir)  # Load cache from file system
 
     config = _load_ServiceXSpec(spec)
@@ -247,54 +419,125 @@ async def deliver_async(
     all_tqs = list(_sample_run_info(config.General, config.Sample))
     total_files = sum(len(tq.file_list or []) for tq in all_tqs)
 
+    _share_file_slots(adaptor, concurrency)
+    timings = timings if timings is not None else Timings()
+    if hasattr(adaptor, "timings"):
+        adaptor.timings = timings
+    deliver_start = datetime.now()
+
+    # Requests flow through three stages connected by bounded queues:
+    # codegen (one at a time) -> transform (concurrency workers) -> collect.
+    # Code for the next request is generated while the current ones are in
+    # the science image, and finished requests are copied out meanwhile.
+    # Cache hits skip straight to the collect stage.
+    transform_queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+    collect_queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+    outputs: List[Optional[GuardList]] = [None] * len(all_tqs)
+
     with ExpandableProgress(display_progress=display_progress) as progress:
         transform_task = progress.add_task(
             "Transform", start=True, total=total_files
         )
-
-        for tq in all_tqs:
-            cache_key = _generate_cache_key(tq)
-
-            if cache_key in cache and not ignore_local_cache:
-                info = cache[cache_key]
-                info["submit_time"] = datetime.fromisoformat(info["submit_time"])
-                info["finish_time"] = (
-                    datetime.fromisoformat(info["finish_time"])
-                    if info["finish_time"] is not None
-                    else None
-                )
-                info = {
-                    k.replace("_", "-") if k not in ("request_id", "did_id") else k: v
-                    for k, v in info.items()
-                }
-
-                status = TransformStatus(**info)
-            else:
-                request_id = await adaptor.submit_transform(tq)
+        completed_files = 0
+
+        async def codegen_stage():
+            for index, tq in enumerate(all_tqs):
+                cache_key = _generate_cache_key(tq)
+                if cache_key in cache and not ignore_local_cache:
+                    metrics.CACHE_LOOKUPS.inc(result="hit")
+                    info = cache[cache_key]
+                    status = _status_from_cache(info)
+                    await collect_queue.put(
+                        (index, status, info.get("output_directory"))
+                    )
+                else:
+                    metrics.CACHE_LOOKUPS.inc(result="miss")
+                    with timings.span(
+                        "codegen", _sample_title(tq)
+                    ), metrics.CODEGEN_SECONDS.time():
+                        prepared = await _prepare_transform(adaptor, tq)
+                    await transform_queue.put((index, cache_key, prepared))
+            for _ in range(concurrency):
+                await transform_queue.put(None)
+
+        async def transform_stage():
+            while True:
+                item = await transform_queue.get()
+                if item is None:
+                    return
+                index, cache_key, prepared = item
+                with timings.span("transform", _sample_title(all_tqs[index])):
+                    request_id = await _run_transform(adaptor, prepared)
                 status = await adaptor.get_transform_status(request_id)
-                info = status.model_dump()
-                info["submit_time"] = info["submit_time"].isoformat()
-                info["finish_time"] = (
-                    info["finish_time"].isoformat()
-                    if info["finish_time"] is not None
-                    else None
-                )
 
+                info = _status_to_cache(status)
+                output_directory = _in_place_outputs(adaptor, prepared, status.request_id)
+                if output_directory is not None:
+                    info["output_directory"] = str(output_directory)
                 cache[cache_key] = info
                 _save_cache(cache, adaptor.cache_dir)
 
-            # Build the list of results.
-            minio_results = MinioLocalAdaptor.for_transform(status)
-            download_dir = adaptor.cache_dir / status.request_id
-            files = [
-                await minio_results.download_file(n.filename, download_dir)
-                for n in await minio_results.list_bucket()
-            ]
-
-            outputs = GuardList(files)
+                await collect_queue.put(
+                    (index, status, info.get("output_directory"))
+                )
 
-            title = tq.title if tq.title is not None else "local-run-dataset"
-            results[title] = outputs
+        async def collect_stage():
+            nonlocal completed_files
+            for _ in range(len(all_tqs)):
+                index, status, output_directory = await collect_queue.get()
+                title = _sample_title(all_tqs[index])
+                collect_start = datetime.now()
+
+                # Build the list of results.
+                if output_directory is not None:
+                    # The science image wrote straight to the user's output
+                    # directory - hand those files back without copying.
+                    minio_results = MinioLocalAdaptor.for_transform(
+                        status, output_root=Path(output_directory).parent
+                    )
+                    files = [
+                        minio_results.output_directory / n.filename
+                        for n in await minio_results.list_bucket()
+                    ]
+                else:
+                    minio_results = MinioLocalAdaptor.for_transform(status)
+                    download_dir = adaptor.cache_dir / status.request_id
+                    files = []
+                    for n in await minio_results.list_bucket():
+                        with timings.span("copy", title, n.filename):
+                            files.append(
+                                await minio_results.download_file(n.filename, download_dir)
+                            )
+                timings.record("collect", collect_start, datetime.now(), title)
+                outputs[index] = GuardList(files)
+                if on_sample_done is not None:
+                    on_sample_done(title, outputs[index])
+
+                completed_files += len(all_tqs[index].file_list or [])
+                progress.update(transform_task, "Transform", completed=completed_files)
+
+        stages = [
+            asyncio.ensure_future(codegen_stage()),
+            *(asyncio.ensure_future(transform_stage()) for _ in range(concurrency)),
+            asyncio.ensure_future(collect_stage()),
+        ]
+        try:
+            await asyncio.gather(*stages)
+        except BaseException:
+            for stage in stages:
+                stage.cancel()
+            # Let the cancelled stages finish cleaning up (a request in the
+            # science image waits for its running files) before returning.
+            await asyncio.gather(*stages, return_exceptions=True)
+            _discard_queued(transform_queue)
+            raise
+
+        # Stages finish requests in any order; outputs is indexed by the
+        # position in the spec so the result keys do not depend on timing.
+        results: dict[str, GuardList] = {}
+        for tq, sample_outputs in zip(all_tqs, outputs):
+            assert sample_outputs is not None
+            results[_sample_title(tq)] = sample_outputs
 
         progress.update(
             transform_task,
@@ -305,6 +548,8 @@ async def deliver_async(
         )
         progress.refresh()
 
+    timings.record("deliver", deliver_start, datetime.now())
+
     return results
 
 
@@ -317,32 +562,92 @@ deliver = deprecated(
 _DOCKER_IMAGE = "sslhep/servicex_func_adl_xaod_transformer"
 
 
+def _image_for_config(config: Config) -> Tuple[str, Platform]:
+    "The image and platform `local_deliver` runs a config on"
+    if config.platform.value == "singularity":
+        image = f"docker://{_DOCKER_IMAGE}:{config.version}"
+    else:
+        image = f"{_DOCKER_IMAGE}:{config.version}"
+    return image, Platform(config.platform.value)
+
+
+def _install_for_config(config: Config) -> SXLocalAdaptor:
+    "The local ServiceX endpoint `local_deliver` runs a config on"
+    image, sx_platform = _image_for_config(config)
+    return install_sx_local(
+        image,
+        sx_platform,
+        output_dir=config.output_dir,
+        log_rules=config.log_rules,
+        sample_resources=config.sample_resources,
+    )
+
+
 def local_deliver(
     spec: Union[ServiceXSpec, Mapping[str, Any], str, Path],
     config: Config,
     display_progress: bool = True,
+    timings: Optional[Timings] = None,
 ):
-    """Run a query against a dataset, either locally or remotely."""
+    """Run a query against a dataset, either locally or remotely.
+
+    A report of where the time went is logged at INFO. Pass ``timings`` to
+    get the individual spans as well. With ``config.profile`` set, the whole
+    call is profiled and the profile saved in the ``profiles`` folder of the
+    cache directory.
+    """
 
     logging.basicConfig(level=config.logging_level, force=True)
 
-    if config.platform.value == "singularity":
-        image = f"docker://{_DOCKER_IMAGE}:{config.version}"
-    else:
-        image = f"{_DOCKER_IMAGE}:{config.version}"
-    sx_platform = Platform(config.platform.value)
-    adaptor = install_sx_local(image, sx_platform)
-
-    sx_result = _deliver_sync(
-        spec,
-        adaptor=adaptor,
-        ignore_local_cache=config.ignore_cache,
-        display_progress=display_progress,
-    )
+    adaptor = _install_for_config(config)
 
-    if config.awk:
-        awk_result = to_awk(sx_result)
-        if len(spec.Sample) == 1:
-            return awk_result[spec.Sample[0].Name]
-        return awk_result
-    return sx_result
+    # With several awk workers, each sample's files are converted as soon as
+    # they are collected, overlapping with the transforms still running.
+    timings = timings if timings is not None else Timings()
+    converter = None
+    if config.awk and not config.awk_lazy and config.awk_workers > 1:
+        converter = ParallelAwkConverter(config.awk_workers, columns=config.awk_columns)
+
+    profile = None
+    if config.profile:
+        profile = DeliverProfile(adaptor.cache_dir / "profiles")
+        profile.start()
+
+    try:
+        sx_result = _deliver_sync(
+            spec,
+            adaptor=adaptor,
+            ignore_local_cache=config.ignore_cache,
+            display_progress=display_progress,
+            concurrency=config.concurrency,
+            on_sample_done=converter.submit if converter is not None else None,
+            timings=timings,
+        )
+
+        if not config.awk:
+            return sx_result
+        with timings.span("to_awk"):
+            if config.awk_lazy:
+                awk_result = lazy_awk(
+                    sx_result, columns=config.awk_columns, step_size=config.awk_step_size
+                )
+            elif converter is not None:
+                # Keep the spec's order, not the order the samples finished in
+                awk_result = converter.results(order=list(sx_result))
+            elif config.awk_columns is not None:
+                # to_awk can't select columns for both ROOT and parquet files
+                awk_result = parallel_awk(sx_result, 1, columns=config.awk_columns)
+            else:
+                awk_result = to_awk(sx_result)
+    finally:
+        if converter is not None:
+            converter.close()
+        if profile is not None:
+            # Name the profile after the requests that ran in this call
+            profile.tags = list(getattr(adaptor, "transform_status_store", {}))
+            logger.info("Profile written to %s", profile.stop())
+        logger.info("Timing summary:\n%s", timings.report())
+
+    if len(spec.Sample) == 1:
+        return awk_result[spec.Sample[0].Name]
+    return awk_result
@@ -0,0 +1,85 @@
+import json
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List
+
+from .science_images import FileResult
+
+
+class EventLog:
+    """Append-only JSON-lines record of what happened while running a request.
+
+    Every line is one event with an ``event`` name and a ``time``:
+
+        {"event": "request_start", "time": "...", "request_id": "...",
+         "image": "...", "files": 10, "already_done": 0,
+         "output_directory": "..."}
+        {"event": "file", "time": "...", "input_file": "...",
+         "status": "done" | "failed", "start": "...", "end": "...",
+         "duration": 12.3, "exit_code": 0, "container": "...",
+         "bytes_in": 1234, "bytes_out": 567, "peak_rss": 2147483648,
+         "cpu_seconds": 10.2, "output_file": "...",
+         "error": null}
+        {"event": "request_end", "time": "...",
+         "status": "complete" | "failed" | "cancelled",
+         "duration": 45.6}
+
+    A resumed request appends to the log of its earlier runs, so the log keeps
+    the history of every attempt. Unlike the science image's text log, the
+    event log is kept after the request succeeds.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def emit(self, event: str, **fields: Any) -> None:
+        """Append an event.
+
+        Safe to call from the science image's worker threads.
+
+        Args:
+            event (str): The event name.
+            **fields: The event's data. Must be JSON serializable.
+        """
+        record = {"event": event, "time": datetime.now().isoformat(), **fields}
+        line = json.dumps(record, default=str)
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a") as f:
+                f.write(line + "\n")
+
+    def file_done(self, result: FileResult) -> None:
+        "Record the outcome of one file"
+        self.emit(
+            "file",
+            input_file=result.input_file,
+            status="done" if result.succeeded else "failed",
+            start=result.start.isoformat(),
+            end=result.end.isoformat(),
+            duration=result.duration,
+            exit_code=result.exit_code,
+            container=result.container,
+            bytes_in=result.bytes_in,
+            bytes_out=result.bytes_out,
+            peak_rss=result.peak_rss,
+            cpu_seconds=result.cpu_seconds,
+            output_file=(
+                str(result.output_file) if result.output_file is not None else None
+            ),
+            error=result.error,
+        )
+
+    @staticmethod
+    def read(path: Path) -> List[Dict[str, Any]]:
+        """Read back the events in a log.
+
+        Args:
+            path (Path): The event log.
+
+        Returns:
+            List[Dict[str, Any]]: The events, oldest first.
+        """
+        with path.open("r") as f:
+            return [json.loads(line) for line in f if line.strip()]
@@ -0,0 +1,279 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import IO, Deque, Dict, Iterable, List, Mapping, Optional, Tuple, Union
+
+# How often buffered log files are flushed to disk.
+_FLUSH_INTERVAL = 1.0
+
+
+def _sinks(sinks: Iterable[Union[str, Path]]) -> Tuple[Path, ...]:
+    "Absolute paths, so a file named two ways still gets one open handle"
+    return tuple(Path(s).absolute() for s in sinks)
+
+
+class _SinkWriter(logging.Handler):
+    """Writes each record to the files named in its ``sx_sinks`` attribute.
+
+    Only ever called from the pipeline's listener thread, so the open files
+    need no locking. Files are block-buffered and flushed every
+    ``flush_interval`` seconds.
+    """
+
+    def __init__(self, flush_interval: float):
+        super().__init__()
+        self.setFormatter(
+            logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+        )
+        self.flush_interval = flush_interval
+        self._files: Dict[Path, IO[str]] = {}
+        self._last_flush = time.monotonic()
+
+    def _file(self, sink: Path) -> IO[str]:
+        f = self._files.get(sink)
+        if f is None:
+            sink.parent.mkdir(parents=True, exist_ok=True)
+            f = self._files[sink] = open(sink, "a", buffering=1 << 16)
+        return f
+
+    def emit(self, record: logging.LogRecord) -> None:
+        done: Optional[threading.Event] = getattr(record, "sx_flush", None)
+        try:
+            transcript: Optional[Transcript] = getattr(record, "sx_transcript", None)
+            if transcript is not None:
+                lines = transcript._take()
+                if lines:
+                    for sink, prefix in transcript.targets:
+                        self._file(sink).write(
+                            "".join(f"{prefix}{line}\n" for line in lines)
+                        )
+                    self.flush_if_due()
+                return
+
+            if done is not None:
+                close = getattr(record, "sx_close", False)
+                for sink in record.sx_sinks:  # type: ignore[attr-defined]
+                    f = self._files.pop(sink, None) if close else self._files.get(sink)
+                    if f is None:
+                        continue
+                    if close:
+                        f.close()
+                    else:
+                        f.flush()
+                return
+
+            # Container transcripts are written as-is; records from the
+            # logging system get the usual timestamp and level.
+            text = (
+                record.getMessage()
+                if getattr(record, "sx_raw", False)
+                else self.format(record)
+            )
+            for sink in record.sx_sinks:  # type: ignore[attr-defined]
+                self._file(sink).write(text + "\n")
+            self.flush_if_due()
+        except Exception:
+            self.handleError(record)
+        finally:
+            if done is not None:
+                done.set()
+
+    def flush_if_due(self) -> None:
+        now = time.monotonic()
+        if now - self._last_flush >= self.flush_interval:
+            self.flush()
+            self._last_flush = now
+
+    def flush(self) -> None:
+        for f in self._files.values():
+            f.flush()
+
+    def close(self) -> None:
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+        super().close()
+
+
+class _Listener(logging.handlers.QueueListener):
+    "A QueueListener that also flushes its files when the queue goes quiet."
+
+    def __init__(self, log_queue: queue.Queue, writer: _SinkWriter):
+        super().__init__(log_queue, writer)
+        self.writer = writer
+
+    def dequeue(self, block: bool) -> logging.LogRecord:
+        while True:
+            try:
+                return self.queue.get(block, timeout=self.writer.flush_interval)
+            except queue.Empty:
+                self.writer.flush()
+
+
+class Transcript:
+    """The lines of one run's output, on their way to the writer thread.
+
+    Lines are collected here and handed over in batches: while a batch is
+    waiting for the writer, more lines join it rather than each costing a
+    queue entry. The writer takes whatever has collected when it gets to the
+    batch, so no line waits on a later one. Made by `LogPipeline.transcript`.
+    """
+
+    def __init__(self, log_queue: queue.Queue, targets: Tuple[Tuple[Path, str], ...]):
+        self._queue = log_queue
+        # (file, prefix for each line written to it)
+        self.targets = targets
+        # Appending to a deque is atomic, so writing a line takes no lock: the
+        # writer clears ``_queued`` before it drains the lines, so a line
+        # either makes it into that drain or queues a batch of its own.
+        self._lines: Deque[str] = deque()
+        self._queued = False
+
+    @property
+    def sinks(self) -> Tuple[Path, ...]:
+        return tuple(sink for sink, _ in self.targets)
+
+    def write(self, line: str) -> None:
+        """Queue a line to be appended to each of the transcript's files.
+
+        Args:
+            line (str): The line, without a trailing newline.
+        """
+        self._lines.append(line)
+        if not self._queued:
+            self._queued = True
+            self._queue.put_nowait(logging.makeLogRecord({"sx_transcript": self}))
+
+    def _take(self) -> List[str]:
+        "The lines collected so far, for the writer thread"
+        self._queued = False
+        lines = []
+        try:
+            while True:
+                lines.append(self._lines.popleft())
+        except IndexError:
+            return lines
+
+
+class LogPipeline:
+    """Route log output to files through a queue and a single writer thread.
+
+    Container transcripts (`write`) and records from the logging system (the
+    `handler`) are put on one queue from any number of threads. One listener
+    thread owns every open log file and does all the writing, so parallel
+    runs never contend on a handler or interleave partial lines in a file.
+
+    Each record names the files (sinks) it goes to. Writes are buffered; call
+    `flush` to wait until everything queued so far for a sink is on disk.
+    A command's output should go through a `transcript`, which resolves its
+    files once and hands them lines in batches.
+    """
+
+    def __init__(self, flush_interval: float = _FLUSH_INTERVAL):
+        """
+        Args:
+            flush_interval (float): Seconds between flushes of the log files.
+        """
+        self._queue: queue.Queue = queue.Queue()
+        self._writer = _SinkWriter(flush_interval)
+        self._listener = _Listener(self._queue, self._writer)
+        self._listener.start()
+
+    def write(self, sinks: Iterable[Union[str, Path]], line: str) -> None:
+        """Queue a line of text to be appended, as-is, to each sink. For more
+        than the odd line, use a `transcript`.
+
+        Args:
+            sinks (Iterable[Path]): The files to write to.
+            line (str): The line, without a trailing newline.
+        """
+        self._queue.put_nowait(
+            logging.makeLogRecord(
+                {"msg": line, "sx_sinks": _sinks(sinks), "sx_raw": True}
+            )
+        )
+
+    def transcript(self, sinks: Mapping[Union[str, Path], str]) -> Transcript:
+        """A `Transcript` for the output of one run.
+
+        Args:
+            sinks (Mapping[Path, str]): The files to write to, each with the
+                prefix to put in front of every line written to it.
+
+        Returns:
+            Transcript: Its ``write`` queues a line for all of ``sinks``.
+        """
+        return Transcript(self._queue, tuple(zip(_sinks(sinks), sinks.values())))
+
+    def handler(self, sinks: Iterable[Union[str, Path]]) -> "_SinkQueueHandler":
+        """A logging handler that sends records to ``sinks`` via the pipeline.
+
+        Args:
+            sinks (Iterable[Path]): The files the records are written to.
+
+        Returns:
+            logging.Handler: The handler. It does no I/O in the calling thread.
+                Its ``sinks`` can be changed while it is in use.
+        """
+        return _SinkQueueHandler(self._queue, _sinks(sinks))
+
+    def flush(self, sinks: Iterable[Union[str, Path]], close: bool = True) -> None:
+        """Wait until everything queued for ``sinks`` is written to disk.
+
+        Args:
+            sinks (Iterable[Path]): The files to flush.
+            close (bool): Also close the files. They are re-opened if more is
+                written to them later.
+        """
+        done = threading.Event()
+        self._queue.put_nowait(
+            logging.makeLogRecord(
+                {"sx_sinks": _sinks(sinks), "sx_flush": done, "sx_close": close}
+            )
+        )
+        done.wait()
+
+    def stop(self) -> None:
+        "Write out everything queued and stop the writer thread"
+        self._listener.stop()
+        self._writer.close()
+
+
+class _SinkQueueHandler(logging.handlers.QueueHandler):
+    "Tags each record with its sinks before putting it on the queue"
+
+    def __init__(self, log_queue: queue.Queue, sinks: Tuple[Path, ...]):
+        super().__init__(log_queue)
+        self.sinks = sinks
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = super().prepare(record)
+        record.sx_sinks = self.sinks
+        return record
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if self.sinks:
+            super().emit(record)
+
+
+_pipeline: Optional[LogPipeline] = None
+_pipeline_lock = threading.Lock()
+
+
+def log_pipeline() -> LogPipeline:
+    """The process-wide `LogPipeline`, started on first use.
+
+    Returns:
+        LogPipeline: The pipeline.
+    """
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = LogPipeline()
+            atexit.register(_pipeline.stop)
+        return _pipeline
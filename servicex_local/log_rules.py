@@ -0,0 +1,152 @@
+import logging
+import re
+from typing import Dict, Iterable, List, Mapping, Optional, Pattern, Union
+
+# Messages the science images print on every run that are not a sign of a
+# problem. They are matched case-insensitively, as regular expressions.
+DEFAULT_LOG_RULES: Dict[str, str] = {
+    # The grid proxy path is echoed when it is copied into the container.
+    r"x509up": "DEBUG",
+    # ROOT complains about classes it has no dictionary for, even when the
+    # query never reads them.
+    r"Warning in <TClass::Init>: no dictionary for class": "DEBUG",
+    r"Warning in <TInterpreter::ReadRootmapFile>": "DEBUG",
+    # xAOD reports file access statistics to CERN, which fails offline.
+    r"xAOD::TFileAccessTracer": "INFO",
+}
+
+# Applied after the configured rules, and subject to the multi-line block
+# promotion in `LogRules.level`.
+_BUILTIN_RULES = ((r"error", logging.ERROR), (r"warning", logging.WARNING))
+
+# Plain text, where every regular expression character is escaped
+_LITERAL = re.compile(r"(?:[^.^$*+?{}\[\]\\|()]|\\[^0-9A-Za-z])*")
+
+# Escapes that can stand for an upper-case letter
+_CHARACTER_ESCAPE = re.compile(r"\\[xuUN0-7]")
+
+# Flags that apply to a whole pattern, which it can't have inside another
+_GLOBAL_FLAGS = re.compile(r"\(\?[aiLmsux]+\)")
+
+
+def _literal(pattern: str) -> Optional[str]:
+    "The text a pattern matches, if it is a plain (possibly escaped) string"
+    if _LITERAL.fullmatch(pattern) is None:
+        return None
+    return re.sub(r"\\(.)", r"\1", pattern)
+
+
+def _lower_case(pattern: str) -> str:
+    """A pattern that finds, in a lower-cased line, what ``pattern`` finds
+    ignoring case in the original"""
+    literal = _literal(pattern)
+    if literal is not None:
+        return re.escape(literal.lower())
+    if pattern == pattern.lower() and _CHARACTER_ESCAPE.search(pattern) is None:
+        return f"(?:{pattern})"
+    # Correct, but it keeps `re` from skipping ahead to where a rule can start
+    return f"(?i:{pattern})"
+
+
+def _as_level(level: Union[int, str]) -> int:
+    if isinstance(level, int):
+        return level
+    if level not in logging._nameToLevel:
+        valid = sorted(logging._nameToLevel)
+        raise ValueError(f"Log rule level must be one of {valid}, got {level!r}")
+    return logging._nameToLevel[level]
+
+
+class LogRules:
+    """Decide the logging level of each line of science image output.
+
+    Rules map a regular expression (matched anywhere in the line, ignoring
+    case) to a logging level. The first matching rule wins: explicitly
+    configured rules first, then `DEFAULT_LOG_RULES`, then the built-in
+    "error" → ERROR and "warning" → WARNING rules. Lines that match nothing
+    are logged at DEBUG.
+
+    All the rules are compiled into one alternation that is searched once
+    per lower-cased line, so lines that match no rule (nearly all of them)
+    cost the same however many rules there are. Only a line it hits is
+    checked rule by rule, to find the first that matches. Patterns with
+    upper-case letters (other than plain text), groups or inline flags are
+    slower to check.
+    """
+
+    def __init__(
+        self,
+        rules: Optional[Mapping[str, Union[int, str]]] = None,
+        suppress_patterns: Optional[Iterable[str]] = None,
+        include_defaults: bool = True,
+    ):
+        """
+        Args:
+            rules (Optional[Mapping[str, Union[int, str]]]): Regular
+                expression to level (a number or a name such as "INFO").
+            suppress_patterns (Optional[Iterable[str]]): Plain substrings whose
+                lines are always logged at DEBUG. Checked before ``rules``.
+            include_defaults (bool): Also apply `DEFAULT_LOG_RULES`.
+
+        Raises:
+            ValueError: If a level is not a logging level name.
+            re.error: If a pattern is not a valid regular expression.
+        """
+        configured: Dict[str, int] = {
+            re.escape(p): logging.DEBUG for p in (suppress_patterns or [])
+        }
+        for pattern, level in (rules or {}).items():
+            configured.setdefault(pattern, _as_level(level))
+        if include_defaults:
+            for pattern, level in DEFAULT_LOG_RULES.items():
+                configured.setdefault(pattern, _as_level(level))
+
+        self.rules = configured
+        self._levels: List[int] = [*configured.values()] + [
+            level for _, level in _BUILTIN_RULES
+        ]
+        self._num_configured = len(configured)
+
+        patterns = [*configured] + [p for p, _ in _BUILTIN_RULES]
+        self._regexes: List[Pattern[str]] = [re.compile(p, re.IGNORECASE) for p in patterns]
+        # Rules with groups of their own (whose numbers would change) or
+        # global flags are left out of the alternation, and always checked.
+        self._alone = [
+            rule
+            for rule, regex in enumerate(self._regexes)
+            if regex.groups or _GLOBAL_FLAGS.search(regex.pattern)
+        ]
+        self._any_rule = re.compile(
+            "|".join(
+                _lower_case(pattern)
+                for rule, pattern in enumerate(patterns)
+                if rule not in self._alone
+            )
+        )
+
+    def level(self, line: str, block_level: Optional[int] = None) -> int:
+        """The level to log ``line`` at.
+
+        Args:
+            line (str): The line of output.
+            block_level (Optional[int]): The level of the block the line
+                continues, if any. A line matching no configured rule is
+                logged at no less than this.
+
+        Returns:
+            int: The logging level.
+        """
+        if self._any_rule.search(line.lower()) is not None:
+            rules: Iterable[int] = range(len(self._regexes))
+        elif self._alone:
+            rules = self._alone
+        else:
+            return block_level if block_level is not None else logging.DEBUG
+        for rule in rules:
+            if self._regexes[rule].search(line) is None:
+                continue
+            if rule < self._num_configured:
+                return self._levels[rule]
+            return max(self._levels[rule], block_level or logging.DEBUG)
+
+        return block_level if block_level is not None else logging.DEBUG
@@ -1,34 +1,102 @@
+import contextvars
 import logging
+import threading
 from functools import wraps
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from .log_pipeline import _SinkQueueHandler, log_pipeline
+
+# State shared by every active `log_to_file` call. While any call is active,
+# one handler on the root logger forwards records to the log pipeline, and
+# the root level is lowered to INFO. Both are undone when the last call ends.
+_lock = threading.Lock()
+_active_files: List[Path] = []
+_root_handler: Optional["_RunFilesHandler"] = None
+_saved_root_level: int = logging.NOTSET
+
+# The files of the `log_to_file` calls the current code is running under.
+# Threads started with a copy of the context (asyncio tasks,
+# asyncio.to_thread, the science images' file pools) inherit it.
+_run_files: contextvars.ContextVar[Tuple[Path, ...]] = contextvars.ContextVar(
+    "sx_log_files", default=()
+)
+
+
+class _RunFilesHandler(_SinkQueueHandler):
+    """Sends each record to the files of the calls it was logged under.
+
+    Records logged outside any call's context (e.g. from a thread it started
+    without copying the context) go to every active file, as there is no
+    telling which call they belong to.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = super().prepare(record)
+        record.sx_sinks = _run_files.get() or self.sinks
+        return record
+
+
+def _start_capture(log_file: Path) -> None:
+    global _root_handler, _saved_root_level
+    with _lock:
+        logger = logging.getLogger()
+        if not _active_files:
+            _saved_root_level = logger.level
+            # Lower the root level to INFO so the file can capture transform
+            # output even when the user's default is WARNING, but never raise
+            # above the user's level — otherwise callers who explicitly set
+            # DEBUG (e.g. caplog.at_level(DEBUG) in tests) would lose their
+            # messages.
+            logger.setLevel(min(logger.getEffectiveLevel(), logging.INFO))
+            _root_handler = _RunFilesHandler(log_pipeline()._queue, ())
+            _root_handler.setLevel(logging.INFO)
+            logger.addHandler(_root_handler)
+        _active_files.append(log_file)
+        assert _root_handler is not None
+        _root_handler.sinks = tuple(set(p.absolute() for p in _active_files))
+
+
+def _stop_capture(log_file: Path) -> None:
+    global _root_handler
+    with _lock:
+        _active_files.remove(log_file)
+        assert _root_handler is not None
+        _root_handler.sinks = tuple(set(p.absolute() for p in _active_files))
+        if not _active_files:
+            logger = logging.getLogger()
+            logger.removeHandler(_root_handler)
+            _root_handler = None
+            logger.setLevel(_saved_root_level)
 
 
 def log_to_file(log_file):
+    """Decorator that also writes the log records emitted while the function
+    runs (at INFO and above) to ``log_file``.
+
+    Records go through the process-wide log pipeline, so the calling thread
+    does no file I/O and decorated functions can run concurrently. Each file
+    receives the records logged in its own call, including from asyncio tasks
+    and threads that inherit the call's context (`contextvars`); records
+    from threads that do not are sent to every running call's file. The file
+    is complete when the function returns.
+
+    Args:
+        log_file: The file to append to.
+    """
+    log_file = Path(log_file)
+
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
-            logger = logging.getLogger()
-            original_logging_level = logger.level
-            # Lower the root level to INFO so the file handler can capture
-            # transform output even when the user's default is WARNING, but
-            # never raise above the user's level — otherwise callers who
-            # explicitly set DEBUG (e.g. caplog.at_level(DEBUG) in tests)
-            # would lose their messages.
-            effective = logger.getEffectiveLevel()
-            logger.setLevel(min(effective, logging.INFO))
-
-            handler = logging.FileHandler(log_file, mode="a")  # Append mode
-            handler.setLevel(logging.INFO)
-            formatter = logging.Formatter(
-                "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-            )
-            handler.setFormatter(formatter)
-            logger.addHandler(handler)
+            _start_capture(log_file)
+            token = _run_files.set(_run_files.get() + (log_file.absolute(),))
             try:
                 return func(*args, **kwargs)
             finally:
-                logger.removeHandler(handler)
-                handler.close()
-                logger.setLevel(original_logging_level)
+                _run_files.reset(token)
+                _stop_capture(log_file)
+                log_pipeline().flush([log_file])
 
         return wrapper
 
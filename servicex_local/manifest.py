@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from servicex.models import ResultFormat, TransformRequest
+
+from .science_images import FileResult
+
+
+def request_key(tq: TransformRequest) -> str:
+    """
+    Generate a key that identifies a request across runs, based on the
+    file_list, selection and result format of the TransformRequest.
+
+    ROOT TTree requests leave the format out of the key so their keys match
+    those written before the format could be chosen.
+
+    Args:
+        tq (TransformRequest): The TransformRequest object.
+    Returns:
+        str: A hash string representing the request.
+    """
+    key = f"{tq.file_list}-{tq.selection}"
+    if tq.result_format != ResultFormat.root_ttree:
+        key += f"-{tq.result_format.value}"
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+class TransformManifest:
+    """Per-request record of which input files have been transformed.
+
+    The manifest is re-written after every file finishes, so if a run dies part
+    way through, a re-run of the same request can pick up the request ID and
+    output directory and only transform the files that are missing or failed.
+    Each file entry also keeps its outcome and timing for diagnosis.
+
+    On disk it is a JSON file:
+
+        {
+            "request_id": "...",
+            "output_directory": "...",
+            "status": "running" | "complete" | "failed",
+            "files": {
+                "<input file>": {
+                    "status": "done" | "failed",
+                    "output_file": "..." | null,
+                    "start": "<iso time>",
+                    "end": "<iso time>",
+                    "duration": 12.3,
+                    "error": "..." | null
+                }
+            }
+        }
+    """
+
+    def __init__(self, path: Path, request_id: str, output_directory: Path):
+        self.path = path
+        self.request_id = request_id
+        self.output_directory = output_directory
+        self.status = "running"
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["TransformManifest"]:
+        """Read a manifest from disk.
+
+        Args:
+            path (Path): The manifest file.
+
+        Returns:
+            Optional[TransformManifest]: The manifest, or None if there is no
+                readable manifest at ``path``.
+        """
+        try:
+            with path.open("r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        manifest = cls(path, data["request_id"], Path(data["output_directory"]))
+        manifest.status = data.get("status", "running")
+        manifest.files = data.get("files", {})
+        return manifest
+
+    @property
+    def resumable(self) -> bool:
+        "True if this manifest belongs to a run that did not finish"
+        return self.status != "complete" and self.output_directory.exists()
+
+    def completed_files(self) -> List[str]:
+        "Input files that finished successfully and whose output is still on disk"
+        return [
+            input_file
+            for input_file, entry in self.files.items()
+            if entry["status"] == "done"
+            and entry["output_file"] is not None
+            and Path(entry["output_file"]).exists()
+        ]
+
+    def completed_outputs(self) -> List[Path]:
+        "Output files of `completed_files`"
+        return [
+            Path(self.files[input_file]["output_file"])
+            for input_file in self.completed_files()
+        ]
+
+    def record(self, result: FileResult) -> None:
+        """Record the outcome of one file and write the manifest out.
+
+        Safe to call from the science image's worker threads.
+
+        Args:
+            result (FileResult): The outcome of the file.
+        """
+        with self._lock:
+            self.files[result.input_file] = {
+                "status": "done" if result.succeeded else "failed",
+                "output_file": (
+                    str(result.output_file) if result.output_file is not None else None
+                ),
+                "start": result.start.isoformat(),
+                "end": result.end.isoformat(),
+                "duration": result.duration,
+                "error": result.error,
+            }
+            self._write()
+
+    def finish(self, status: str) -> None:
+        """Mark the whole request as finished.
+
+        Args:
+            status (str): "complete" or "failed".
+        """
+        with self._lock:
+            self.status = status
+            self._write()
+
+    def _write(self) -> None:
+        "Write the manifest atomically, so a crash never leaves it half-written"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with tmp_path.open("w") as f:
+            json.dump(
+                {
+                    "request_id": self.request_id,
+                    "output_directory": str(self.output_directory),
+                    "status": self.status,
+                    "updated": datetime.now().isoformat(),
+                    "files": self.files,
+                },
+                f,
+                indent=2,
+            )
+        os.replace(tmp_path, self.path)
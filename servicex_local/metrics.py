@@ -0,0 +1,272 @@
+import http.server
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+_Labels = Tuple[Tuple[str, str], ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _sample(name: str, labels: _Labels, value: float) -> str:
+    if labels:
+        text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+        return f"{name}{{{text}}} {value:g}"
+    return f"{name} {value:g}"
+
+
+class Registry:
+    "A set of metrics, rendered together"
+
+    def __init__(self):
+        self._metrics: List["_Metric"] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: "_Metric") -> None:
+        with self._lock:
+            if any(m.name == metric.name for m in self._metrics):
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics.append(metric)
+
+    def render(self) -> str:
+        """The metrics in the Prometheus text exposition format.
+
+        Returns:
+            str: The metrics, one sample per line.
+        """
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, registry: Optional[Registry] = REGISTRY):
+        self.name = name
+        self.help = help
+        self._values: Dict[_Labels, float] = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def _add(self, amount: float, labels: Dict[str, str]) -> None:
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        "The current value for a set of labels"
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            return self._values.get(key, 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [_sample(self.name, labels, v) for labels, v in values]
+
+
+class Counter(_Metric):
+    "A count that only goes up"
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        self._add(amount, labels)
+
+
+class Gauge(_Metric):
+    "A value that goes up and down"
+
+    kind = "gauge"
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        self._add(amount, labels)
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self._add(-amount, labels)
+
+
+class Summary(_Metric):
+    "Count and total of observed values, such as durations"
+
+    kind = "summary"
+
+    def __init__(self, name: str, help: str, registry: Optional[Registry] = REGISTRY):
+        super().__init__(name, help, registry)
+        self._counts: Dict[_Labels, float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + value
+            self._counts[key] = self._counts.get(key, 0.0) + 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        "Observe the wall time of the body of a ``with`` block, in seconds"
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - start, **labels)
+
+    def count(self, **labels: str) -> float:
+        "How many values have been observed for a set of labels"
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            return self._counts.get(key, 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+            counts = dict(self._counts)
+        lines = []
+        for labels, total in values:
+            lines.append(_sample(f"{self.name}_sum", labels, total))
+            lines.append(_sample(f"{self.name}_count", labels, counts[labels]))
+        return lines
+
+
+# The metrics LocalX keeps. The adaptor, the science images and the deliver
+# cache update them as they work. An update is a dictionary update under a
+# lock, so they are always on; nothing is exported unless asked for.
+REQUESTS = Counter(
+    "servicex_local_requests_total",
+    "Transform requests run by the adaptor, by outcome (complete, failed).",
+)
+FILES = Counter(
+    "servicex_local_files_total",
+    "Input files run through a science image, by outcome (done, failed).",
+)
+FILE_SECONDS = Summary(
+    "servicex_local_file_seconds",
+    "Wall time of each input file in the science image.",
+)
+FILES_PENDING = Gauge(
+    "servicex_local_files_pending",
+    "Input files of running requests that have not finished yet.",
+)
+FILES_RUNNING = Gauge(
+    "servicex_local_files_running",
+    "Input files running in a science image right now.",
+)
+CACHE_LOOKUPS = Counter(
+    "servicex_local_cache_lookups_total",
+    "Samples looked up in the deliver cache, by result (hit, miss).",
+)
+CODEGEN_SECONDS = Summary(
+    "servicex_local_codegen_seconds",
+    "Time spent generating the code for each request.",
+)
+
+
+def write_textfile(path: Union[str, Path], registry: Registry = REGISTRY) -> None:
+    """Write the metrics to ``path`` for node_exporter's textfile collector.
+
+    The file is replaced atomically, so the collector never reads a partly
+    written file.
+
+    Args:
+        path (Union[str, Path]): The file, usually ``<collector dir>/<name>.prom``.
+        registry (Registry): The metrics to write.
+    """
+    path = Path(path)
+    temp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    temp.write_text(registry.render())
+    os.replace(temp, path)
+
+
+class TextfileExporter:
+    """Rewrites a textfile collector file every ``interval`` seconds, from a
+    background thread, until stopped. Use as a context manager or call
+    `start` and `stop`."""
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        interval: float = 15.0,
+        registry: Registry = REGISTRY,
+    ):
+        self.path = Path(path)
+        self.interval = interval
+        self.registry = registry
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            write_textfile(self.path, self.registry)
+
+    def start(self) -> None:
+        write_textfile(self.path, self.registry)
+        self._thread = threading.Thread(
+            target=self._run, name="servicex_local_metrics", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        "Stop, after writing the final values"
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        write_textfile(self.path, self.registry)
+
+    def __enter__(self) -> "TextfileExporter":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.stop()
+
+
+def start_http_server(
+    port: int, addr: str = "127.0.0.1", registry: Registry = REGISTRY
+) -> http.server.ThreadingHTTPServer:
+    """Serve the metrics at ``http://<addr>:<port>/metrics`` from a background
+    thread.
+
+    Args:
+        port (int): The port, or 0 for any free port.
+        addr (str): The address to listen on. Only this machine by default.
+        registry (Registry): The metrics to serve.
+
+    Returns:
+        ThreadingHTTPServer: The server. Call ``shutdown()`` to stop it; its
+            ``server_address`` has the port it is listening on.
+    """
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Scrapes are not worth a line on stderr each
+
+    server = http.server.ThreadingHTTPServer((addr, port), Handler)
+    threading.Thread(
+        target=server.serve_forever, name="servicex_local_metrics_http", daemon=True
+    ).start()
+    return server
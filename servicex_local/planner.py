@@ -0,0 +1,395 @@
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Tuple, Union
+
+from servicex import ServiceXSpec
+
+from .adaptor import _user_cache_dir
+from .configurations import Config
+from .deliver import (
+    _image_for_config,
+    _load_ServiceXSpec,
+    _sample_run_info,
+    _science_image,
+    _servicex_cache_dir,
+)
+from .events import EventLog
+from .resources import suggest_memory_limit
+from .utils import _format_bytes, _read_structures
+
+
+@dataclass
+class FileHistory:
+    """One file transformed in an earlier run, from the event logs."""
+
+    seconds: float
+    bytes_in: Optional[int] = None
+    bytes_out: Optional[int] = None
+    peak_rss: Optional[int] = None
+
+
+def file_history(events_dir: Path, image: Optional[str] = None) -> List[FileHistory]:
+    """Every file that was transformed successfully in a directory of event logs.
+
+    Args:
+        events_dir (Path): Directory of `EventLog` files.
+        image (Optional[str]): Only files run on this image (see
+            `BaseScienceImage.image`). Logs written before the image was
+            recorded are left out when one is given.
+
+    Returns:
+        List[FileHistory]: The files, oldest log first.
+    """
+    history = []
+    for path in sorted(events_dir.glob("*.jsonl")):
+        run_image = None
+        for event in EventLog.read(path):
+            if event["event"] == "request_start":
+                # A resumed request appends to its log, so follow each run
+                run_image = event.get("image")
+            elif (
+                event["event"] == "file"
+                and event["status"] == "done"
+                and (image is None or run_image == image)
+            ):
+                history.append(
+                    FileHistory(
+                        event["duration"],
+                        event.get("bytes_in"),
+                        event.get("bytes_out"),
+                        event.get("peak_rss"),
+                    )
+                )
+    return history
+
+
+def _fit_seconds(history: List[FileHistory]) -> Optional[Tuple[float, float]]:
+    """(seconds per file, seconds per input byte), a least squares fit of the
+    time each file took against its size. Without sizes to fit, every file
+    takes the mean time. None with no history."""
+    if not history:
+        return None
+    mean = sum(h.seconds for h in history) / len(history)
+    sized = [(h.bytes_in, h.seconds) for h in history if h.bytes_in]
+    if len({x for x, _ in sized}) < 2:
+        return mean, 0.0
+
+    n = len(sized)
+    mx = sum(x for x, _ in sized) / n
+    my = sum(y for _, y in sized) / n
+    slope = sum((x - mx) * (y - my) for x, y in sized) / sum(
+        (x - mx) ** 2 for x, _ in sized
+    )
+    if slope <= 0:
+        return my, 0.0
+    if my - slope * mx < 0:
+        # Not enough spread to trust the offset: scale with size alone
+        return 0.0, sum(y for _, y in sized) / sum(x for x, _ in sized)
+    return my - slope * mx, slope
+
+
+def _output_ratio(history: List[FileHistory]) -> Optional[float]:
+    "Output bytes per input byte in the history"
+    pairs = [(h.bytes_in, h.bytes_out) for h in history if h.bytes_in and h.bytes_out]
+    if not pairs:
+        return None
+    return sum(o for _, o in pairs) / sum(i for i, _ in pairs)
+
+
+def _named_in(branch: str, selection: str) -> bool:
+    """If the query names a branch, or the xAOD collection it belongs to
+    (``AnalysisJets`` for ``AnalysisJetsAuxDyn.pt``)"""
+    container = branch.split(".")[0]
+    names = {branch, container, re.sub(r"Aux(Dyn)?$", "", container)}
+    return any(
+        re.search(rf"(?<!\w){re.escape(name)}(?!\w)", selection) for name in names if name
+    )
+
+
+def _read_fraction(
+    structures: List[str], selection: str
+) -> Tuple[Optional[float], List[str]]:
+    """The share of the compressed bytes of the files in branches the query
+    names, and those branches, largest first. None if it names none."""
+    total = 0
+    named: Dict[str, int] = {}
+    for structure_str in structures:
+        for branches in json.loads(structure_str).get("BranchStats", {}).values():
+            for branch, stats in branches.items():
+                total += stats["compressed_bytes"]
+                if _named_in(branch, selection):
+                    named[branch] = named.get(branch, 0) + stats["compressed_bytes"]
+    if not named or not total:
+        return None, []
+    return sum(named.values()) / total, sorted(named, key=lambda b: -named[b])
+
+
+@dataclass
+class SampleEstimate:
+    """What one sample of a spec is expected to take."""
+
+    name: str
+    files: int
+    # Total size of the input files; those that can't be sized (remote files)
+    # are counted at the mean of the others.
+    bytes_in: Optional[int] = None
+    # Share of the input bytes in the branches the query names.
+    read_fraction: Optional[float] = None
+    branches: List[str] = field(default_factory=list)
+    # Time of all the files added up, and of the longest, in seconds.
+    seconds: Optional[float] = None
+    longest_file: Optional[float] = None
+    bytes_out: Optional[int] = None
+
+
+@dataclass
+class QueryPlan:
+    """A dry run of a spec: the estimates for each sample, and the settings
+    recommended for running it."""
+
+    image: str
+    samples: List[SampleEstimate]
+    # Files of earlier runs on the same image the estimates are based on.
+    history_files: int
+    peak_rss: Optional[int]
+    memory_limit: Optional[float]
+    # The recommended Config.concurrency: samples run at once.
+    concurrency: int
+    notes: List[str] = field(default_factory=list)
+    # Files of one sample the image runs at once.
+    max_workers: int = 1
+
+    @property
+    def seconds(self) -> Optional[float]:
+        "Time of all the files added up, in seconds"
+        if any(s.seconds is None for s in self.samples if s.files):
+            return None
+        return sum(s.seconds or 0.0 for s in self.samples)
+
+    @property
+    def bytes_out(self) -> Optional[int]:
+        if any(s.bytes_out is None for s in self.samples if s.files):
+            return None
+        return sum(s.bytes_out or 0 for s in self.samples)
+
+    def wall_seconds(self, concurrency: Optional[int] = None) -> Optional[float]:
+        """The expected run time with ``Config.concurrency`` set to
+        ``concurrency`` (the recommended number by default).
+
+        Samples start in spec order, each as soon as one of the
+        ``concurrency`` running samples finishes. The files of a sample run
+        ``max_workers`` at a time, and a sample never takes less than its
+        longest file.
+        """
+        if self.seconds is None:
+            return None
+        concurrency = concurrency or self.concurrency
+        # Config.concurrency also caps the files running across all samples
+        workers = min(self.max_workers, concurrency)
+        running = [0.0] * concurrency
+        for s in self.samples:
+            if not s.files:
+                continue
+            sample_seconds = max((s.seconds or 0.0) / workers, s.longest_file or 0.0)
+            running[running.index(min(running))] += sample_seconds
+        return max(running)
+
+    def report(self) -> str:
+        """A plain-text table of the estimates for each sample, followed by the
+        totals and recommendations.
+
+        Returns:
+            str: The report.
+        """
+        lines = [
+            f"{'Sample':<20} {'Files':>6} {'Input':>10} {'Reads':>6} "
+            f"{'Output':>10} {'File time':>10}"
+        ]
+        for s in self.samples:
+            lines.append(
+                f"{s.name[:20]:<20} {s.files:>6} {_bytes(s.bytes_in):>10} "
+                f"{_percent(s.read_fraction):>6} {_bytes(s.bytes_out):>10} "
+                f"{_duration(s.seconds):>10}"
+            )
+        lines.append(
+            f"Image: {self.image} ({self.history_files} files of history)"
+        )
+        lines.append(
+            f"Estimated run time: {_duration(self.wall_seconds())} with "
+            f"{self.concurrency} samples at once and {self.max_workers} "
+            f"file(s) of each, output {_bytes(self.bytes_out)}"
+        )
+        if self.peak_rss is not None:
+            lines.append(
+                f"Peak memory per file: {_bytes(self.peak_rss)}, "
+                f"memory_limit: {self.memory_limit} GB"
+            )
+        lines.append(f"Recommended concurrency: {self.concurrency}")
+        lines.extend(f"Note: {note}" for note in self.notes)
+        return "\n".join(lines)
+
+
+def _bytes(n: Optional[int]) -> str:
+    return _format_bytes(n) if n is not None else "?"
+
+
+def _percent(fraction: Optional[float]) -> str:
+    return f"{100 * fraction:.0f}%" if fraction is not None else "?"
+
+
+def _duration(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "?"
+    if seconds < 120:
+        return f"{seconds:.0f}s"
+    if seconds < 7200:
+        return f"{seconds / 60:.1f}m"
+    return f"{seconds / 3600:.1f}h"
+
+
+def _total_memory() -> Optional[int]:
+    "Physical memory of this machine in bytes, where it can be found"
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def _estimate_sample(
+    name: str,
+    files: List[str],
+    selection: str,
+    fit: Optional[Tuple[float, float]],
+    output_ratio: Optional[float],
+    structure_files: int,
+) -> SampleEstimate:
+    estimate = SampleEstimate(name, len(files))
+    if not files:
+        return estimate
+
+    sizes = {f: os.path.getsize(f) for f in files if os.path.isfile(f)}
+    mean_size = sum(sizes.values()) / len(sizes) if sizes else None
+    if mean_size is not None:
+        estimate.bytes_in = int(sum(sizes.get(f, mean_size) for f in files))
+
+    # A few files are enough: the files of a sample share their layout
+    outcomes = _read_structures(
+        {f: f for f in list(sizes)[:structure_files]}, max_workers=1, branch_stats=True
+    )
+    structures = [s for s, _ in outcomes.values() if s is not None]
+    estimate.read_fraction, estimate.branches = _read_fraction(structures, selection)
+
+    if fit is not None:
+        per_file, per_byte = fit
+        times = [
+            per_file + per_byte * sizes.get(f, mean_size or 0) if per_byte else per_file
+            for f in files
+        ]
+        estimate.seconds = sum(times)
+        estimate.longest_file = max(times)
+
+    if estimate.bytes_in is not None:
+        if output_ratio is not None:
+            estimate.bytes_out = int(estimate.bytes_in * output_ratio)
+        elif estimate.read_fraction is not None:
+            # No history: at most the branches the query reads
+            estimate.bytes_out = int(estimate.bytes_in * estimate.read_fraction)
+    return estimate
+
+
+def plan_deliver(
+    spec: Union[ServiceXSpec, Mapping[str, Any], str, Path],
+    config: Config,
+    events_dir: Optional[Path] = None,
+    headroom: float = 1.25,
+    structure_files: int = 3,
+    cpus: Optional[int] = None,
+    memory: Optional[int] = None,
+) -> QueryPlan:
+    """Estimate what `local_deliver` of a spec will take, without running it.
+
+    The time each file takes is fitted against its size from the files run on
+    the same image before (the event logs in the cache), and applied to the
+    sizes of the spec's files. The output size is scaled from the history
+    too, or, without one, from the share of the input in the branches the
+    query names (from `local_get_structure` branch statistics of a few
+    files). The peak memory of the history gives the ``memory_limit``.
+
+    `local_deliver` runs ``Config.concurrency`` samples at once, and the
+    files of each sample ``max_workers`` (of the science image) at a time.
+    The recommended concurrency is as many samples as fit in this machine's
+    CPUs and memory, no more than there are to run.
+
+    Nothing is installed or written: the image is only looked up, and the
+    event logs read if they are there.
+
+    Only datasets with a file list (e.g. `FileList`) can be sized; samples
+    whose files are only known to ServiceX are reported with no files.
+
+    Args:
+        spec: The spec that would be delivered.
+        config (Config): The configuration it would be delivered with.
+        events_dir (Optional[Path]): The event logs to learn from. Defaults
+            to those in the cache.
+        headroom (float): Factor to allow on top of the largest peak memory.
+        structure_files (int): Files per sample to read branch statistics from.
+        cpus (Optional[int]): CPUs to plan for. Defaults to this machine's.
+        memory (Optional[int]): Memory to plan for, in bytes. Defaults to this
+            machine's.
+
+    Returns:
+        QueryPlan: The estimates. ``report()`` formats them.
+    """
+    spec = _load_ServiceXSpec(spec)
+    runner = _science_image(*_image_for_config(config))
+    image = runner.image
+    if events_dir is None:
+        cache_dir = _servicex_cache_dir()
+        events_dir = _user_cache_dir(cache_dir) / "events" if cache_dir is not None else None
+
+    history = file_history(events_dir, image) if events_dir and events_dir.is_dir() else []
+    fit = _fit_seconds(history)
+    output_ratio = _output_ratio(history)
+
+    samples = [
+        _estimate_sample(
+            tq.title, tq.file_list or [], tq.selection, fit, output_ratio, structure_files
+        )
+        for tq in _sample_run_info(spec.General, spec.Sample)
+    ]
+
+    peaks = [h.peak_rss for h in history if h.peak_rss is not None]
+    peak_rss = max(peaks) if peaks else None
+    memory_limit = suggest_memory_limit(peaks, headroom=headroom)
+
+    # More samples at once than can be running files at once gains nothing
+    max_workers = runner.max_workers
+    running_files = sum(min(s.files, max_workers) for s in samples)
+    concurrency = min(cpus or os.cpu_count() or 1, max(running_files, 1))
+    memory = memory if memory is not None else _total_memory()
+    if peak_rss and memory:
+        concurrency = min(concurrency, max(1, int(memory // (peak_rss * headroom))))
+
+    notes = []
+    if not history:
+        notes.append(
+            f"No files have been run on {image} yet, so run times can't be "
+            "estimated: deliver a few files first."
+        )
+    notes.extend(
+        f"Sample {s.name} has no file list, so it is not included."
+        for s in samples
+        if not s.files
+    )
+    plan = QueryPlan(
+        image, samples, len(history), peak_rss, memory_limit, concurrency, notes, max_workers
+    )
+    if concurrency != config.concurrency:
+        notes.append(
+            f"With Config.concurrency as it is ({config.concurrency}), the run time "
+            f"is {_duration(plan.wall_seconds(config.concurrency))}."
+        )
+    return plan
@@ -0,0 +1,106 @@
+import cProfile
+import pstats
+import sys
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional, Union
+
+# How many request IDs go into a profile's file name.
+_MAX_NAME_TAGS = 4
+
+# From Python 3.12 cProfile is built on sys.monitoring, which is process-wide:
+# one profiler sees every thread, and no second one can be enabled.
+_PROFILES_ALL_THREADS = sys.version_info >= (3, 12)
+
+
+class DeliverProfile:
+    """Profile a deliver with cProfile and save the stats to a file.
+
+    A deliver runs on its own event loop thread and hands work to more
+    threads. From Python 3.12 one cProfile sees them all. Before that it only
+    sees the thread it is enabled in, so while the profile runs every thread
+    that starts gets a profiler of its own, and they are merged with the
+    calling thread's when it stops.
+
+    Use it as a context manager, or call `start` and `stop`. Set ``tags``
+    (e.g. to the request IDs) before it stops to have them in the file name.
+    The file is a standard pstats dump: read it with ``pstats``, or view it
+    with snakeviz or (after conversion) speedscope.
+    """
+
+    def __init__(self, directory: Union[str, Path]):
+        """
+        Args:
+            directory (Path): Where the profile is written. Created if needed.
+        """
+        self.directory = Path(directory)
+        self.tags: List[str] = []
+        self.path: Optional[Path] = None
+        self._main = cProfile.Profile()
+        self._threads: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+        self._running = False
+        self._started = datetime.now()
+
+    def _on_thread_start(self, frame, event, arg):
+        "The profile hook of each new thread: swaps itself for a cProfile"
+        sys.setprofile(None)
+        with self._lock:
+            if not self._running:
+                return
+            profile = cProfile.Profile()
+            self._threads.append(profile)
+        profile.enable()
+
+    def start(self) -> None:
+        "Start profiling the calling thread and any thread started from now on"
+        self._started = datetime.now()
+        self._running = True
+        if not _PROFILES_ALL_THREADS:
+            threading.setprofile(self._on_thread_start)
+        self._main.enable()
+
+    def stop(self) -> Path:
+        """Stop profiling and write the merged stats.
+
+        Before Python 3.12, each thread's profiler is disabled here, which
+        also records the calls the thread is still in, and is merged with the
+        calling thread's. A profiler can only be unhooked from its own thread,
+        so threads still running keep calling theirs until they exit, but
+        nothing more they do is saved.
+
+        Returns:
+            Path: The profile file.
+        """
+        self._main.disable()
+        if not _PROFILES_ALL_THREADS:
+            threading.setprofile(None)
+        with self._lock:
+            self._running = False
+            threads, self._threads = self._threads, []
+            for profile in threads:
+                profile.disable()
+
+        stats = pstats.Stats(self._main)
+        for profile in threads:
+            try:
+                stats.add(profile)
+            except TypeError:
+                # A thread that started but never made a call has no stats.
+                pass
+
+        name = "-".join(
+            [f"deliver_{self._started:%Y%m%d_%H%M%S}"] + self.tags[:_MAX_NAME_TAGS]
+        )
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.path = self.directory / f"{name}.prof"
+        stats.dump_stats(self.path)
+        return self.path
+
+    def __enter__(self) -> "DeliverProfile":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.stop()
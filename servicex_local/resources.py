@@ -0,0 +1,236 @@
+import logging
+import math
+import os
+import re
+import subprocess
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# How often a running file's resource use is sampled, in seconds.
+_SAMPLE_INTERVAL = 1.0
+
+
+@dataclass
+class ResourceUsage:
+    """What a science image used while transforming one file.
+
+    Both are sampled, so they are lower bounds: anything that happens between
+    samples is missed. None if nothing could be sampled.
+    """
+
+    # Largest resident memory seen, in bytes.
+    peak_rss: Optional[int] = None
+    # CPU time used, user plus system, in seconds.
+    cpu_seconds: Optional[float] = None
+
+
+class ResourceSampler(ABC):
+    """Samples the resources used by a running command in a background thread.
+
+    `run_command_with_logging` calls `start` once the command is running and
+    `stop` when it has finished. The result is then in ``usage``.
+    """
+
+    def __init__(self, interval: float = _SAMPLE_INTERVAL):
+        self.interval = interval
+        self.usage = ResourceUsage()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @abstractmethod
+    def sample(self, pid: int) -> Optional[Tuple[int, float]]:
+        """Take one sample.
+
+        Args:
+            pid (int): The process id of the command.
+
+        Returns:
+            Optional[Tuple[int, float]]: The resident memory now, in bytes, and
+                the CPU seconds used so far. None if nothing could be read.
+        """
+
+    def _take(self, pid: int) -> None:
+        try:
+            s = self.sample(pid)
+        except Exception as e:
+            logging.getLogger(__name__).debug("Resource sample failed: %s", e)
+            return
+        if s is None:
+            return
+        rss, cpu = s
+        self.usage.peak_rss = max(self.usage.peak_rss or 0, rss)
+        self.usage.cpu_seconds = max(self.usage.cpu_seconds or 0.0, cpu)
+
+    def _run(self, pid: int) -> None:
+        self._take(pid)
+        while not self._stop.wait(self.interval):
+            self._take(pid)
+
+    def start(self, pid: int) -> None:
+        "Start sampling the command with process id ``pid``"
+        self._thread = threading.Thread(
+            target=self._run, args=(pid,), name="servicex_local_resources", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> ResourceUsage:
+        "Stop sampling and return what was seen"
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.usage
+
+
+def _proc_stat(pid: int) -> Tuple[int, float]:
+    "(parent pid, CPU seconds of the process and its reaped children)"
+    with open(f"/proc/{pid}/stat") as f:
+        # The command name is in parentheses and may contain spaces.
+        fields = f.read().rsplit(")", 1)[1].split()
+    ticks = sum(int(t) for t in fields[11:15])  # utime, stime, cutime, cstime
+    return int(fields[1]), ticks / os.sysconf("SC_CLK_TCK")
+
+
+def _proc_rss(pid: int) -> int:
+    with open(f"/proc/{pid}/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+class ProcessTreeSampler(ResourceSampler):
+    """Samples a process and all its descendants through ``/proc``.
+
+    Used where the work runs in processes on this machine: the local and
+    Singularity science images. Nothing is sampled where there is no
+    ``/proc``.
+    """
+
+    def sample(self, pid: int) -> Optional[Tuple[int, float]]:
+        if not os.path.isdir("/proc"):
+            return None
+
+        stats: Dict[int, Tuple[int, float]] = {}
+        for entry in os.listdir("/proc"):
+            if entry.isdigit():
+                try:
+                    stats[int(entry)] = _proc_stat(int(entry))
+                except (OSError, IndexError, ValueError):
+                    pass  # Gone since listdir
+
+        tree = {pid} if pid in stats else set()
+        added = True
+        while added:
+            children = {p for p, (ppid, _) in stats.items() if ppid in tree} - tree
+            tree |= children
+            added = bool(children)
+        if not tree:
+            return None
+
+        rss = 0
+        for p in tree:
+            try:
+                rss += _proc_rss(p)
+            except OSError:
+                pass
+        return rss, sum(stats[p][1] for p in tree)
+
+
+_UNITS = {
+    "b": 1,
+    "kb": 1000,
+    "mb": 1000**2,
+    "gb": 1000**3,
+    "tb": 1000**4,
+    "kib": 1 << 10,
+    "mib": 1 << 20,
+    "gib": 1 << 30,
+    "tib": 1 << 40,
+}
+
+
+def _parse_size(text: str) -> int:
+    "Parse a docker size such as ``1.5GiB`` into bytes"
+    m = re.fullmatch(r"\s*([\d.]+)\s*([a-zA-Z]+)\s*", text)
+    if m is None or m.group(2).lower() not in _UNITS:
+        raise ValueError(f"Can not parse size {text!r}")
+    return int(float(m.group(1)) * _UNITS[m.group(2).lower()])
+
+
+class DockerStatsSampler(ResourceSampler):
+    """Samples a docker container with ``docker stats``.
+
+    Docker only reports CPU as a percentage, so the CPU seconds are that
+    percentage integrated over the time between samples.
+    """
+
+    def __init__(self, container_name: str, interval: float = _SAMPLE_INTERVAL):
+        super().__init__(interval)
+        self.container_name = container_name
+        self._cpu_seconds = 0.0
+        self._last: Optional[float] = None
+
+    def sample(self, pid: int) -> Optional[Tuple[int, float]]:
+        r = subprocess.run(
+            [
+                "docker",
+                "stats",
+                "--no-stream",
+                "--format",
+                "{{.MemUsage}}|{{.CPUPerc}}",
+                self.container_name,
+            ],
+            capture_output=True,
+            text=True,
+        )
+        now = time.monotonic()
+        if r.returncode != 0 or "|" not in r.stdout:
+            # Not started yet, or already gone.
+            return None
+
+        mem, cpu = r.stdout.strip().split("|")
+        rss = _parse_size(mem.split("/")[0])
+        if self._last is not None:
+            self._cpu_seconds += float(cpu.strip().rstrip("%")) / 100 * (now - self._last)
+        self._last = now
+        return rss, self._cpu_seconds
+
+
+def suggest_memory_limit(
+    peak_rss: Iterable[Optional[int]], headroom: float = 1.25
+) -> Optional[float]:
+    """A docker ``memory_limit`` that the files seen so far would have fit in.
+
+    Args:
+        peak_rss (Iterable[Optional[int]]): Peak resident memory of each file,
+            in bytes. Unknown (None) values are skipped.
+        headroom (float): Factor to allow on top of the largest peak.
+
+    Returns:
+        Optional[float]: The limit in GB, rounded up to the next half GB, as
+            `DockerScienceImage` takes it. None if no peaks are known.
+    """
+    known = [p for p in peak_rss if p is not None]
+    if not known:
+        return None
+    return math.ceil(max(known) * headroom / (1 << 30) * 2) / 2
+
+
+def peak_rss_history(events_dir: Path) -> List[int]:
+    """The peak resident memory of every file in a directory of event logs.
+
+    Args:
+        events_dir (Path): Directory of `EventLog` files.
+
+    Returns:
+        List[int]: Peaks, in bytes, of each file that has one.
+    """
+    from .events import EventLog
+
+    peaks = []
+    for path in sorted(events_dir.glob("*.jsonl")):
+        for event in EventLog.read(path):
+            if event["event"] == "file" and event.get("peak_rss") is not None:
+                peaks.append(event["peak_rss"])
+    return peaks
@@ -0,0 +1,110 @@
+import hashlib
+import json
+from dataclasses import dataclass, field
+from typing import Dict, List, Mapping, Optional, Tuple
+
+# tree name -> branch name -> uproot interpretation
+Schema = Dict[str, Dict[str, str]]
+
+
+def schema_of(structure_str: str) -> Schema:
+    """The trees and branches of a file, from its `run_query` JSON.
+
+    The file's metadata values and branch statistics are left out: they
+    differ from file to file even when the layout is the same.
+    """
+    structure = json.loads(structure_str)
+    structure.pop("FileMetaData", None)
+    structure.pop("BranchStats", None)
+    return structure
+
+
+def schema_hash(schema: Schema) -> str:
+    "A hash that is the same for two schemas exactly when they are equal"
+    text = json.dumps(schema, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class SchemaGroup:
+    """Files that all have the same schema."""
+
+    schema_hash: str
+    schema: Schema
+    files: List[str] = field(default_factory=list)
+
+
+@dataclass
+class SchemaDiff:
+    """How a schema differs from a reference schema."""
+
+    added_trees: List[str] = field(default_factory=list)
+    removed_trees: List[str] = field(default_factory=list)
+    # tree -> branches
+    added_branches: Dict[str, List[str]] = field(default_factory=dict)
+    removed_branches: Dict[str, List[str]] = field(default_factory=dict)
+    # tree -> branch -> (reference interpretation, this interpretation)
+    changed_branches: Dict[str, Dict[str, Tuple[str, str]]] = field(default_factory=dict)
+
+    def __bool__(self) -> bool:
+        return any(
+            [
+                self.added_trees,
+                self.removed_trees,
+                self.added_branches,
+                self.removed_branches,
+                self.changed_branches,
+            ]
+        )
+
+
+def group_by_schema(structures: Mapping[str, Optional[str]]) -> List[SchemaGroup]:
+    """Group files by their schema.
+
+    Args:
+        structures (Mapping[str, Optional[str]]): File name to its `run_query`
+            JSON. Files with None (unreadable) are skipped.
+
+    Returns:
+        List[SchemaGroup]: One group per distinct schema, in the order each
+            schema is first seen. Files keep their order within a group.
+    """
+    groups: Dict[str, SchemaGroup] = {}
+    for name, structure_str in structures.items():
+        if structure_str is None:
+            continue
+        schema = schema_of(structure_str)
+        h = schema_hash(schema)
+        groups.setdefault(h, SchemaGroup(h, schema)).files.append(name)
+    return list(groups.values())
+
+
+def diff_schemas(reference: Schema, other: Schema) -> SchemaDiff:
+    """What appears, disappears or changes type going from ``reference`` to
+    ``other``.
+
+    Returns:
+        SchemaDiff: The differences. False if there are none.
+    """
+    diff = SchemaDiff(
+        added_trees=[t for t in other if t not in reference],
+        removed_trees=[t for t in reference if t not in other],
+    )
+    for tree, branches in other.items():
+        if tree not in reference:
+            continue
+        ref_branches = reference[tree]
+        added = [b for b in branches if b not in ref_branches]
+        removed = [b for b in ref_branches if b not in branches]
+        changed = {
+            b: (ref_branches[b], dtype)
+            for b, dtype in branches.items()
+            if b in ref_branches and ref_branches[b] != dtype
+        }
+        if added:
+            diff.added_branches[tree] = added
+        if removed:
+            diff.removed_branches[tree] = removed
+        if changed:
+            diff.changed_branches[tree] = changed
+    return diff
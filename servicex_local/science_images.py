@@ -1,46 +1,122 @@
+import contextvars
+import json
 import logging
 import os
 import re
 import subprocess
+import sys
+import tempfile
+import threading
+import uuid
 from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from typing import List, Optional
+from typing import Callable, Deque, Iterable, Iterator, List, Optional, Tuple, Union
+
+from .log_pipeline import log_pipeline
+from . import metrics
+from .log_rules import LogRules
+from .resources import DockerStatsSampler, ProcessTreeSampler, ResourceSampler
+
+
+# How many lines of output are kept for the failure dump.
+_FAILURE_TAIL_LINES = 200
+
+_DEFAULT_RULES = LogRules()
+
+
+class FilesNotStarted(RuntimeError):
+    """A science image stopped before it started every file it was given."""
+
+
+class ScienceRunError(RuntimeError):
+    """A science image command exited with a non-zero exit code."""
+
+    def __init__(self, message: str, exit_code: int):
+        super().__init__(message)
+        self.exit_code = exit_code
 
 
 def run_command_with_logging(
     command: List[str],
     log_file: Path,
     suppress_patterns: Optional[List[str]] = None,
+    log_rules: Optional[LogRules] = None,
+    tail_lines: int = _FAILURE_TAIL_LINES,
+    run_name: Optional[str] = None,
+    cwd: Optional[Path] = None,
+    sampler: Optional[ResourceSampler] = None,
 ) -> None:
     """Run a command in a subprocess and log the output.
 
-    The container's full stdout is written directly to ``log_file`` so the
-    file is a complete record of the run regardless of the active logging
-    level. Lines containing "error" or "warning" are also emitted via the
-    standard logger so they reach the user's console handlers; ordinary
-    lines go through ``logger.debug`` and are filtered out at the default
-    WARNING level. Once a line is emitted at ERROR or WARNING, subsequent
-    non-blank lines inherit that level until a blank line resets the context,
-    so multi-line error blocks are fully promoted.
+    The container's full stdout is written to ``log_file`` so the file is a
+    complete record of the run regardless of the active logging level. The
+    writing is done by the shared log pipeline's writer thread, which buffers
+    it, so chatty jobs do not cost a system call per line and runs in
+    parallel threads never interleave partial lines. The file is complete
+    when this returns. Every line is also emitted via the standard logger at
+    the level ``log_rules`` gives it: by default lines containing "error" or
+    "warning" reach the user's console handlers, and ordinary lines go through
+    DEBUG and are filtered out at the default WARNING level. Once a line is
+    emitted at ERROR or WARNING, subsequent non-blank lines inherit that level
+    until a blank line resets the context, so multi-line error blocks are
+    fully promoted.
+
+    When several commands share a log file, give each a ``run_name``: its
+    lines in ``log_file`` and in the logger are then prefixed with
+    ``[run_name]``, and its own unprefixed transcript is also written to
+    ``<log_file stem>.<run_name><log_file suffix>`` next to ``log_file``.
+
+    Only the last ``tail_lines`` lines, plus the most recent ``tail_lines``
+    lines promoted to WARNING or ERROR, are held in memory for the failure
+    dump, however long the command runs.
 
     Args:
         command (List[str]): The command to run
         log_file (Path): The file to write log messages to
         suppress_patterns (Optional[List[str]]): Substrings that, if found in
             a line, downgrade it to DEBUG regardless of "warning"/"error" content.
+        log_rules (Optional[LogRules]): How lines are classified. Defaults to
+            `LogRules()`.
+        tail_lines (int): Lines of output kept for the failure dump.
+        run_name (Optional[str]): Name of this run, for telling apart runs
+            that share ``log_file``.
+        cwd (Optional[Path]): Working directory for the command.
+        sampler (Optional[ResourceSampler]): Samples the command's resource
+            use while it runs.
 
     Raises:
-        RuntimeError: If the command fails
+        ScienceRunError: If the command fails
     """
     logger = logging.getLogger(__name__)
-
-    log_file.parent.mkdir(parents=True, exist_ok=True)
-    with open(log_file, "a") as lf:
+    if suppress_patterns:
+        log_rules = LogRules(
+            (log_rules or _DEFAULT_RULES).rules, suppress_patterns=suppress_patterns
+        )
+    log_rules = log_rules or _DEFAULT_RULES
+
+    pipeline = log_pipeline()
+    prefix = f"[{run_name}] " if run_name is not None else ""
+    run_log = (
+        log_file.with_name(f"{log_file.stem}.{run_name}{log_file.suffix}")
+        if run_name is not None
+        else None
+    )
+
+    transcript = pipeline.transcript(
+        {log_file: prefix} if run_log is None else {log_file: prefix, run_log: ""}
+    )
+    write = transcript.write
+
+    sampling = False
+    try:
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        lf.write(f"{timestamp} - Running command: {' '.join(command)}\n")
-        lf.flush()
-        logger.debug("Running command: %s", " ".join(command))
+        write(f"{timestamp} - Running command: {' '.join(command)}")
+        logger.debug("%sRunning command: %s", prefix, " ".join(command))
 
         process = subprocess.Popen(
             command,
@@ -48,59 +124,96 @@ def run_command_with_logging(
             stderr=subprocess.STDOUT,
             text=True,
             bufsize=1,
+            cwd=cwd,
         )
+        if sampler is not None:
+            sampler.start(process.pid)
+            sampling = True
 
-        stdout_lines = []
+        # (line number, line) pairs, so the two buffers can be merged back
+        # into output order for the failure dump.
+        tail: Deque[Tuple[int, str]] = deque(maxlen=tail_lines)
+        promoted: Deque[Tuple[int, str]] = deque(maxlen=tail_lines)
 
         assert process.stdout is not None
 
         emit_next_line_level: Optional[int] = None
-        for stdout_line in iter(process.stdout.readline, ""):
+        for line_number, stdout_line in enumerate(iter(process.stdout.readline, "")):
             stripped_line = stdout_line.strip()
-            stdout_lines.append(stripped_line)
+            tail.append((line_number, stripped_line))
 
             # File log is written unconditionally so it remains a complete
             # transcript of the run.
-            lf.write(stripped_line + "\n")
-            lf.flush()
+            write(stripped_line)
 
-            emitted_level: Optional[int] = None
-            line_lower = stripped_line.lower()
-            if suppress_patterns and any(
-                p.lower() in line_lower for p in suppress_patterns
-            ):
-                logger.debug(stripped_line)
-            elif (emit_next_line_level == logging.ERROR) or (
-                "error" in line_lower
-            ):
-                logger.error(stripped_line)
-                emitted_level = logging.ERROR
-            elif (emit_next_line_level == logging.WARNING) or (
-                "warning" in line_lower
-            ):
-                logger.warning(stripped_line)
-                emitted_level = logging.WARNING
-            else:
-                logger.debug(stripped_line)
+            level = log_rules.level(stripped_line, emit_next_line_level)
+            logger.log(level, prefix + stripped_line)
 
-            emit_next_line_level = emitted_level if stripped_line else None
+            if level >= logging.WARNING:
+                promoted.append((line_number, stripped_line))
+            emit_next_line_level = (
+                level if stripped_line and level >= logging.WARNING else None
+            )
 
         process.stdout.close()
         return_code = process.wait()
+    finally:
+        if sampling:
+            assert sampler is not None
+            sampler.stop()
+        pipeline.flush(transcript.sinks)
+
+    if return_code != 0:
+        # On failure, dump the captured output through the logger at
+        # INFO so the user gets context about what went wrong even at
+        # default WARNING level the user gets the warning/error tail.
+        for line in _failure_dump(promoted, tail):
+            logger.info(prefix + line)
+
+        # TODO: Once we are done with 3.11, get rid of newline. Problem is
+        #       we can't have a \n in an f-string for the older versions of python.
+        raise ScienceRunError(
+            f"Failed to run SX science payload locally with exit_code={return_code} "
+            f"({' '.join(command)}). See INFO python logging messages for more details",
+            return_code,
+        )
 
-        if return_code != 0:
-            # On failure, dump the captured output through the logger at
-            # INFO so the user gets context about what went wrong even at
-            # default WARNING level the user gets the warning/error tail.
-            for line in stdout_lines:
-                logger.info(line)
 
-            # TODO: Once we are done with 3.11, get rid of newline. Problem is
-            #       we can't have a \n in an f-string for the older versions of python.
-            raise RuntimeError(
-                f"Failed to run SX science payload locally with exit_code={return_code} "
-                f"({' '.join(command)}). See INFO python logging messages for more details"
-            )
+def _failure_dump(
+    promoted: Iterable[Tuple[int, str]], tail: Iterable[Tuple[int, str]]
+) -> List[str]:
+    """Merge the promoted lines and the output tail back into output order.
+
+    A marker line stands in for each run of lines that was not kept.
+    """
+    lines = []
+    previous = -1
+    for line_number, line in sorted(dict([*promoted, *tail]).items()):
+        if line_number > previous + 1:
+            lines.append(f"... {line_number - previous - 1} lines omitted ...")
+        lines.append(line)
+        previous = line_number
+    return lines
+
+
+def output_file_name(input_file: str, output_format: str) -> str:
+    """Name of the file a science image writes for ``input_file``.
+
+    Outputs keep the input file's name. Parquet outputs have any ROOT file
+    extension replaced by ``.parquet`` so readers such as ``to_awk`` can tell
+    the format from the name.
+
+    Args:
+        input_file (str): The input file path or URL
+        output_format (str): The requested output format ("root-file", "parquet", ...)
+
+    Returns:
+        str: The output file name
+    """
+    name = Path(input_file).name
+    if output_format == "parquet":
+        return re.sub(r"\.root(\.\d+)?$", "", name) + ".parquet"
+    return name
 
 
 def write_file_runner_script(generated_files_dir: Path) -> None:
@@ -173,7 +286,99 @@ sys.exit(exit_code)
         f.write(kick_off)
 
 
+@dataclass
+class FileResult:
+    """The outcome of transforming a single input file."""
+
+    input_file: str
+    output_file: Optional[Path]
+    start: datetime
+    end: datetime
+    error: Optional[str] = None
+    # The science image's exit code, if it got far enough to run.
+    exit_code: Optional[int] = None
+    # The container the file ran in, for images that name their containers.
+    container: Optional[str] = None
+    # Sizes of the input (local files only) and output files.
+    bytes_in: Optional[int] = None
+    bytes_out: Optional[int] = None
+    # Sampled peak resident memory (bytes) and CPU time (seconds) of the run.
+    peak_rss: Optional[int] = None
+    cpu_seconds: Optional[float] = None
+
+    @property
+    def succeeded(self) -> bool:
+        return self.error is None
+
+    @property
+    def duration(self) -> float:
+        "Wall time spent on the file, in seconds"
+        return (self.end - self.start).total_seconds()
+
+
+def _safe_stem(input_file: str) -> str:
+    """Stem of an input file that is safe in container and file names.
+
+    Docker container names only allow [a-zA-Z0-9][a-zA-Z0-9_.-]; strip any URL
+    query string (e.g. ?access_token=...) before extracting the stem, then
+    replace any remaining illegal chars.
+    """
+    raw_stem = Path(input_file.split("?", 1)[0]).stem
+    return re.sub(r"[^a-zA-Z0-9_.-]", "_", raw_stem)
+
+
+def _file_size(path: Union[str, Path, None]) -> Optional[int]:
+    "Size of a local file, or None for remote or missing files"
+    if path is None:
+        return None
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return None
+
+
 class BaseScienceImage(ABC):
+    # How many files of a single request this image may run at once.
+    max_workers: int = 1
+
+    # Optional semaphore shared by every request using this image. Each file
+    # holds one slot while it runs, so it caps the total number of running
+    # files no matter how many requests are in flight.
+    file_slots: Optional[threading.Semaphore] = None
+
+    # How lines of container output are classified. None uses `LogRules()`.
+    log_rules: Optional[LogRules] = None
+
+    # Sample the memory and CPU each file uses while it runs. Off by default:
+    # for docker this runs `docker stats` alongside every file.
+    sample_resources: bool = False
+
+    @property
+    def image(self) -> str:
+        "What the files run in, so runs on different images can be told apart"
+        return type(self).__name__
+
+    @contextmanager
+    def _accounting(
+        self, result: "FileResult", sampler: ResourceSampler
+    ) -> Iterator[Optional[ResourceSampler]]:
+        """The sampler to hand `run_command_with_logging`, or None when
+        sampling is off. What it saw is copied to ``result`` when the block
+        exits, whether or not the run failed."""
+        if not self.sample_resources:
+            yield None
+            return
+        try:
+            yield sampler
+        finally:
+            result.peak_rss = sampler.usage.peak_rss
+            result.cpu_seconds = sampler.usage.cpu_seconds
+
+    def _run_name(self, input_file: str) -> Optional[str]:
+        """Name to tell this file's output apart in a shared log, when files
+        run in parallel"""
+        return _safe_stem(input_file) if self.max_workers > 1 else None
+
     @abstractmethod
     def transform(
         self,
@@ -181,6 +386,8 @@ class BaseScienceImage(ABC):
         input_files: List[str],
         output_directory: Path,
         output_format: str,
+        on_file_done: Optional[Callable[["FileResult"], None]] = None,
+        cancel: Optional[threading.Event] = None,
     ) -> List[Path]:
         """Transform the input directory and return the path to the output file
 
@@ -189,12 +396,129 @@ class BaseScienceImage(ABC):
             input_files (List[str]): List of input files
             output_directory (Path): The output directory
             output_format (str): The desired output format
+            on_file_done (Optional[Callable[[FileResult], None]]): Called as
+                each file finishes, successfully or not
+            cancel (Optional[threading.Event]): Once set, no more files are
+                started. Files already running are waited for.
 
         Returns:
             List[Path]: The paths to the output files
         """
         pass
 
+    def _run_files(
+        self,
+        input_files: List[str],
+        run_one: Callable[[str, FileResult], Path],
+        on_file_done: Optional[Callable[[FileResult], None]] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> List[Path]:
+        """Run ``run_one`` on each input file, using the image's worker pool.
+
+        Up to ``max_workers`` files run at once, and each one holds a slot from
+        ``file_slots`` (when set) for as long as it runs. Once a file fails (or
+        ``on_file_done`` raises), or ``cancel`` is set, no more files start:
+        each is checked just before it would run. The files already running
+        are waited for, and then the first failure is re-raised.
+
+        Args:
+            input_files (List[str]): The files to run over
+            run_one (Callable[[str, FileResult], Path]): Transforms a single
+                file and returns the path of its output. It may fill in details
+                of the run (such as ``container``) on the `FileResult` it is
+                handed; timing, sizes and the outcome are filled in here.
+            on_file_done (Optional[Callable[[FileResult], None]]): Called with
+                the outcome of each file that was started.
+            cancel (Optional[threading.Event]): Set to stop any more files
+                starting. It is also set here when a file fails.
+
+        Returns:
+            List[Path]: The output paths, in the same order as ``input_files``
+
+        Raises:
+            FilesNotStarted: If ``cancel`` was set before every file had
+                started, and none of those that ran failed.
+        """
+        stop = cancel if cancel is not None else threading.Event()
+
+        def run_timed(input_file: str) -> Path:
+            start = datetime.now()
+            result = FileResult(
+                input_file, None, start, start, bytes_in=_file_size(input_file)
+            )
+            metrics.FILES_RUNNING.inc()
+            try:
+                result.output_file = run_one(input_file, result)
+                result.exit_code = 0
+            except Exception as e:
+                stop.set()
+                result.end = datetime.now()
+                result.error = str(e)
+                cause = e if isinstance(e, ScienceRunError) else e.__cause__
+                if isinstance(cause, ScienceRunError):
+                    result.exit_code = cause.exit_code
+                metrics.FILES_RUNNING.dec()
+                metrics.FILES.inc(status="failed")
+                metrics.FILE_SECONDS.observe(result.duration)
+                if on_file_done is not None:
+                    on_file_done(result)
+                raise
+            result.end = datetime.now()
+            result.bytes_out = _file_size(result.output_file)
+            metrics.FILES_RUNNING.dec()
+            metrics.FILES.inc(status="done")
+            metrics.FILE_SECONDS.observe(result.duration)
+            if on_file_done is not None:
+                try:
+                    on_file_done(result)
+                except BaseException:
+                    stop.set()
+                    raise
+            return result.output_file
+
+        def start_file(input_file: str) -> Path:
+            # Checked once the file has its slot, which can take a while
+            if stop.is_set():
+                raise FilesNotStarted(f"{input_file} was not started: the run was stopped")
+            return run_timed(input_file)
+
+        def run_in_slot(input_file: str) -> Path:
+            if self.file_slots is None:
+                return start_file(input_file)
+            with self.file_slots:
+                return start_file(input_file)
+
+        workers = max(1, min(self.max_workers, len(input_files)))
+        if workers == 1:
+            return [run_in_slot(f) for f in input_files]
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # Each file runs in a copy of the caller's context, so its log
+            # records reach the caller's `log_to_file` file.
+            futures = [
+                pool.submit(contextvars.copy_context().run, run_in_slot, f)
+                for f in input_files
+            ]
+            try:
+                # A failure sets ``stop``, as does an outside ``cancel``
+                wait(futures, return_when=FIRST_EXCEPTION)
+            except BaseException:
+                stop.set()
+                raise
+            finally:
+                if stop.is_set():
+                    for f in futures:
+                        f.cancel()
+            # Leaving the pool waits for the files still running
+
+        errors = [f.exception() for f in futures if not f.cancelled()]
+        failures = [e for e in errors if e is not None and not isinstance(e, FilesNotStarted)]
+        if failures:
+            raise failures[0]
+        if any(f.cancelled() or f.exception() is not None for f in futures):
+            raise FilesNotStarted("The run was stopped before all its files started")
+        return [f.result() for f in futures]
+
 
 class WSL2ScienceImage(BaseScienceImage):
     def __init__(self, wsl2_container: str, atlas_release: str):
@@ -207,6 +531,20 @@ class WSL2ScienceImage(BaseScienceImage):
         self._release = atlas_release
         self._container = wsl2_container
 
+    @property
+    def max_workers(self) -> int:
+        "Always 1: each file rewrites the scripts in the generated directory"
+        return 1
+
+    @max_workers.setter
+    def max_workers(self, value: int) -> None:
+        if value != 1:
+            raise ValueError("WSL2ScienceImage can only run one file at a time")
+
+    @property
+    def image(self) -> str:
+        return f"{self._container}:{self._release}"
+
     def _convert_to_wsl_path(self, path: Path) -> str:
         """Convert a Windows path to a WSL path
 
@@ -226,6 +564,8 @@ class WSL2ScienceImage(BaseScienceImage):
         input_files: List[str],
         output_directory: Path,
         output_format: str,
+        on_file_done: Optional[Callable[["FileResult"], None]] = None,
+        cancel: Optional[threading.Event] = None,
     ) -> List[Path]:
         """Transform the input directory and return the path to the output file
 
@@ -234,12 +574,14 @@ class WSL2ScienceImage(BaseScienceImage):
             input_files (List[str]): List of input files
             output_directory (Path): The output directory
             output_format (str): The desired output format
+            on_file_done (Optional[Callable[[FileResult], None]]): Called as
+                each file finishes, successfully or not
+            cancel (Optional[threading.Event]): Once set, no more files are
+                started.
 
         Returns:
             List[Path]: The paths to the output files
         """
-        output_paths = []
-
         # Translate output_directory to WSL2 path
         if not output_directory.exists():
             output_directory.mkdir(parents=True, exist_ok=True)
@@ -250,7 +592,10 @@ class WSL2ScienceImage(BaseScienceImage):
             generated_files_dir.exists()
         ), f"Missing generate files directory: {generated_files_dir}!"
 
-        for input_file in input_files:
+        # Each file rewrites kick_off.py in place, so files for a single
+        # request are always run one at a time (max_workers is always 1).
+        def run_one(input_file: str, result: FileResult) -> Path:
+            result.container = self._container
             # Check if input_file is a root:// or http:// path
             if (
                 input_file.startswith("root://")
@@ -258,13 +603,15 @@ class WSL2ScienceImage(BaseScienceImage):
                 or input_file.startswith("https://")
             ):
                 wsl_input_file = input_file
-                input_path_name = Path(input_file.split("/")[-1]).name
+                input_path_name = output_file_name(
+                    input_file.split("/")[-1], output_format
+                )
             else:
                 # Translate input_file to WSL2 path
                 input_path = Path(input_file)
                 assert input_path.exists(), f"Missing input file: {input_file}"
                 wsl_input_file = self._convert_to_wsl_path(input_path)
-                input_path_name = input_path.name
+                input_path_name = output_file_name(input_file, output_format)
 
             # Create the script to parse the capabilities file.
             file_runner = f"""#!/bin/python
@@ -332,23 +679,37 @@ exit $r
             # Call the WSL command via os.system
             command = ["wsl", "-d", self._container, "bash", "-i", wsl_script_path]
             run_command_with_logging(
-                command, log_file=generated_files_dir / "wsl_log.txt"
+                command,
+                log_file=generated_files_dir / "wsl_log.txt",
+                log_rules=self.log_rules,
+                run_name=self._run_name(input_file),
             )
-            output_paths.append(output_directory / input_path_name)
+            return output_directory / input_path_name
 
-        return output_paths
+        return self._run_files(input_files, run_one, on_file_done, cancel)
 
 
 class DockerScienceImage(BaseScienceImage):
-    def __init__(self, image_name: str, memory_limit: Optional[float] = None):
+    def __init__(
+        self,
+        image_name: str,
+        memory_limit: Optional[float] = None,
+        max_workers: int = 1,
+    ):
         """Science image will run in a Docker container with the specified image name/tag
 
         Args:
             image_name (str): The name/tag of the Docker image to be used
             memory_limit (Optional[float]): Memory limit for the Docker container in GB
+            max_workers (int): How many files of a request to run in parallel
         """
         self.image_name = image_name
         self.memory_limit = memory_limit
+        self.max_workers = max_workers
+
+    @property
+    def image(self) -> str:
+        return self.image_name
 
     def transform(
         self,
@@ -356,6 +717,8 @@ class DockerScienceImage(BaseScienceImage):
         input_files: List[str],
         output_directory: Path,
         output_format: str,
+        on_file_done: Optional[Callable[["FileResult"], None]] = None,
+        cancel: Optional[threading.Event] = None,
     ) -> List[Path]:
         """Transform the input directory and return the path to the output file.
 
@@ -369,11 +732,14 @@ class DockerScienceImage(BaseScienceImage):
             input_files (List[str]): List of input files
             output_directory (Path): The output directory
             output_format (str): The desired output format
+            on_file_done (Optional[Callable[[FileResult], None]]): Called as
+                each file finishes, successfully or not
+            cancel (Optional[threading.Event]): Once set, no more files are
+                started.
 
         Returns:
             List[Path]: The paths to the output files
         """
-        output_paths = []
         x509up_path = Path(os.getenv("TEMP", "/tmp")) / "x509up"
         if x509up_path.exists():
             x509up_volume = ["-v", f"{x509up_path}:/tmp/grid-security/x509up"]
@@ -382,18 +748,20 @@ class DockerScienceImage(BaseScienceImage):
             logger.info("x509up certificate not found at /tmp/x509up")
             x509up_volume = []
 
-        for input_file in input_files:
+        write_file_runner_script(generated_files_dir)
+        write_kickoff_script(generated_files_dir)
+
+        def run_one(input_file: str, result: FileResult) -> Path:
             safe_image = self.image_name.replace(":", "_").replace("/", "_")
-            # Docker container names only allow [a-zA-Z0-9][a-zA-Z0-9_.-];
-            # strip any URL query string (e.g. ?access_token=...) before
-            # extracting the stem, then replace any remaining illegal chars.
-            raw_stem = Path(input_file.split("?", 1)[0]).stem
-            safe_stem = re.sub(r"[^a-zA-Z0-9_.-]", "_", raw_stem)
+            safe_stem = _safe_stem(input_file)
+            # The suffix keeps names unique when the same file is being
+            # transformed by more than one request at a time.
             container_name = (
-                f"sx_codegen_container_{safe_image}_{safe_stem}"
+                f"sx_codegen_container_{safe_image}_{safe_stem}_{uuid.uuid4().hex[:8]}"
             )
+            result.container = container_name
 
-            output_name = Path(input_file).name
+            output_name = output_file_name(input_file, output_format)
 
             # Create docker mapping string for the input file if it exists.
             if (
@@ -413,9 +781,6 @@ class DockerScienceImage(BaseScienceImage):
                 input_volume = ["-v", f"{str(input_path.absolute())}:/input_file.root"]
                 container_path = "/input_file.root"
 
-            write_file_runner_script(generated_files_dir)
-            write_kickoff_script(generated_files_dir)
-
             memory_options = (
                 [
                     "-m",
@@ -450,12 +815,17 @@ class DockerScienceImage(BaseScienceImage):
                     f"/servicex/output/{output_name}",
                     output_format,
                 ]
-                run_command_with_logging(
-                    command,
-                    log_file=generated_files_dir / "docker_log.txt",
-                    suppress_patterns=["x509up"],
-                )
-                output_paths.append(output_directory / Path(input_file).name)
+                with self._accounting(
+                    result, DockerStatsSampler(container_name)
+                ) as sampler:
+                    run_command_with_logging(
+                        command,
+                        log_file=generated_files_dir / "docker_log.txt",
+                        log_rules=self.log_rules,
+                        run_name=self._run_name(input_file),
+                        sampler=sampler,
+                    )
+                return output_directory / output_name
 
             except RuntimeError as e:
                 log_file = generated_files_dir / "docker_log.txt"
@@ -478,7 +848,14 @@ class DockerScienceImage(BaseScienceImage):
                     "Please install Docker or use Singularity/WSL2 options."
                 )
 
-        output_files = list(output_directory.glob("*"))
+        # Only count outputs written by this call; a resumed request already
+        # has the outputs of its earlier files in the directory.
+        existing_files = set(output_directory.glob("*"))
+        self._run_files(input_files, run_one, on_file_done, cancel)
+
+        output_files = [
+            p for p in output_directory.glob("*") if p not in existing_files
+        ]
         if len(output_files) != len(input_files):
             raise RuntimeError(
                 f"Number of output files ({len(output_files)}) does not match number of "
@@ -489,13 +866,19 @@ class DockerScienceImage(BaseScienceImage):
 
 
 class SingularityScienceImage(BaseScienceImage):
-    def __init__(self, image_uri: str):
+    def __init__(self, image_uri: str, max_workers: int = 1):
         """Science image will run in a Singularity container with the specified image URI
 
         Args:
             image_uri (str): The path/URI of the Singularity image
+            max_workers (int): How many files of a request to run in parallel
         """
         self.image_uri = image_uri
+        self.max_workers = max_workers
+
+    @property
+    def image(self) -> str:
+        return self.image_uri
 
     def transform(
         self,
@@ -503,6 +886,8 @@ class SingularityScienceImage(BaseScienceImage):
         input_files: List[str],
         output_directory: Path,
         output_format: str,
+        on_file_done: Optional[Callable[["FileResult"], None]] = None,
+        cancel: Optional[threading.Event] = None,
     ) -> List[Path]:
         """Transform the input files and return the path to the output file.
 
@@ -513,12 +898,15 @@ class SingularityScienceImage(BaseScienceImage):
             input_files (List[str]): List of input files
             output_directory (Path): The output directory
             output_format (str): The desired output format
+            on_file_done (Optional[Callable[[FileResult], None]]): Called as
+                each file finishes, successfully or not
+            cancel (Optional[threading.Event]): Once set, no more files are
+                started.
 
         Returns:
             List[Path]: List of output file paths
         """
 
-        output_paths = []
         x509up_path = Path(os.getenv("TEMP", "/tmp")) / "x509up"
         if x509up_path.exists():
             x509up_volume = ["--bind", f"{x509up_path}:/tmp/grid-security/x509up"]
@@ -527,8 +915,12 @@ class SingularityScienceImage(BaseScienceImage):
             logger.info("x509up certificate not found at /tmp/x509up")
             x509up_volume = []
 
-        for input_file in input_files:
-            output_name = Path(input_file).name
+        write_file_runner_script(generated_files_dir)
+        write_kickoff_script(generated_files_dir)
+
+        def run_one(input_file: str, result: FileResult) -> Path:
+            result.container = self.image_uri
+            output_name = output_file_name(input_file, output_format)
 
             if input_file.startswith(("root://", "http://", "https://")):
                 input_volume = []
@@ -545,9 +937,6 @@ class SingularityScienceImage(BaseScienceImage):
                 ]
                 container_path = "/input_file.root"
 
-            write_file_runner_script(generated_files_dir)
-            write_kickoff_script(generated_files_dir)
-
             import tempfile
 
             with tempfile.TemporaryDirectory() as temp_dir:
@@ -573,12 +962,15 @@ class SingularityScienceImage(BaseScienceImage):
                         f"/servicex/output/{output_name}",
                         output_format,
                     ]
-                    run_command_with_logging(
-                        command,
-                        log_file=generated_files_dir / "singularity_log.txt",
-                        suppress_patterns=["x509up"],
-                    )
-                    output_paths.append(output_directory / Path(input_file).name)
+                    with self._accounting(result, ProcessTreeSampler()) as sampler:
+                        run_command_with_logging(
+                            command,
+                            log_file=generated_files_dir / "singularity_log.txt",
+                            log_rules=self.log_rules,
+                            run_name=self._run_name(input_file),
+                            sampler=sampler,
+                        )
+                    return output_directory / output_name
 
                 except subprocess.CalledProcessError as e:
                     raise RuntimeError(
@@ -591,7 +983,133 @@ class SingularityScienceImage(BaseScienceImage):
                         "Please install Docker or use Docker/WSL2 options."
                     )
 
-        output_files = list(output_directory.glob("*"))
+        # Only count outputs written by this call; a resumed request already
+        # has the outputs of its earlier files in the directory.
+        existing_files = set(output_directory.glob("*"))
+        self._run_files(input_files, run_one, on_file_done, cancel)
+
+        output_files = [
+            p for p in output_directory.glob("*") if p not in existing_files
+        ]
+        if len(output_files) != len(input_files):
+            raise RuntimeError(
+                f"Number of output files ({len(output_files)}) does not match number of "
+                f"input files ({len(input_files)})"
+            )
+
+        return output_files
+
+
+class LocalProcessScienceImage(BaseScienceImage):
+    def __init__(self, python: str = sys.executable, max_workers: int = 1):
+        """Science image that runs the generated transformer directly on this
+        machine, with no container.
+
+        The payload is found the same way the containers' ``kick_off.py``
+        finds it, from ``command`` and ``language`` in the generated
+        ``transformer_capabilities.json``, and is run as a subprocess with
+        the usual ``<input> <output> <format>`` arguments. Everything the
+        payload needs (e.g. uproot, or an ATLAS release for xAOD) must already
+        be installed in the host environment.
+
+        Args:
+            python (str): Interpreter for Python payloads.
+            max_workers (int): How many files of a request to run in parallel
+        """
+        self.python = python
+        self.max_workers = max_workers
+
+    @property
+    def image(self) -> str:
+        return "local"
+
+    def payload_command(self, generated_files_dir: Path) -> List[str]:
+        """The command that runs the generated payload, without its arguments.
+
+        Args:
+            generated_files_dir (Path): The directory with the generated code.
+
+        Raises:
+            ValueError: If the payload language is not supported.
+        """
+        with open(generated_files_dir / "transformer_capabilities.json") as f:
+            info = json.load(f)
+
+        command = info["command"]
+        if command.startswith("/generated/"):
+            command = command[len("/generated/"):]
+        script = generated_files_dir / command
+
+        if info["language"] == "python":
+            return [self.python, str(script)]
+        if info["language"] == "bash":
+            return ["bash", str(script)]
+        raise ValueError(f"Unsupported language: {info['language']}")
+
+    def transform(
+        self,
+        generated_files_dir: Path,
+        input_files: List[str],
+        output_directory: Path,
+        output_format: str,
+        on_file_done: Optional[Callable[["FileResult"], None]] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> List[Path]:
+        """Transform the input files and return the paths to the output files.
+
+        Args:
+            generated_files_dir (str): Directory for generated files
+            input_files (List[str]): List of input files
+            output_directory (Path): The output directory
+            output_format (str): The desired output format
+            on_file_done (Optional[Callable[[FileResult], None]]): Called as
+                each file finishes, successfully or not
+            cancel (Optional[threading.Event]): Once set, no more files are
+                started.
+
+        Returns:
+            List[Path]: List of output file paths
+        """
+        payload = self.payload_command(generated_files_dir)
+
+        def run_one(input_file: str, result: FileResult) -> Path:
+            result.container = "local"
+            output_file = output_directory.absolute() / output_file_name(
+                input_file, output_format
+            )
+
+            if input_file.startswith(("root://", "http://", "https://")):
+                payload_input = input_file
+            else:
+                input_path = Path(input_file)
+                if not input_path.exists():
+                    raise FileNotFoundError(
+                        f"Input file for local science image {input_file} not found."
+                    )
+                payload_input = str(input_path.absolute())
+
+            # Each file gets its own scratch directory, like a fresh container
+            with tempfile.TemporaryDirectory() as scratch, self._accounting(
+                result, ProcessTreeSampler()
+            ) as sampler:
+                run_command_with_logging(
+                    [*payload, payload_input, str(output_file), output_format],
+                    log_file=generated_files_dir / "local_log.txt",
+                    log_rules=self.log_rules,
+                    run_name=self._run_name(input_file),
+                    cwd=Path(scratch),
+                    sampler=sampler,
+                )
+            return output_file
+
+        # Only count outputs written by this call; a resumed request already
+        # has the outputs of its earlier files in the directory.
+        existing_files = set(output_directory.glob("*"))
+        self._run_files(input_files, run_one, on_file_done, cancel)
+
+        output_files = [
+            p for p in output_directory.glob("*") if p not in existing_files
+        ]
         if len(output_files) != len(input_files):
             raise RuntimeError(
                 f"Number of output files ({len(output_files)}) does not match number of "
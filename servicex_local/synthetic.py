@@ -0,0 +1,217 @@
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Union
+
+import awkward as ak
+import numpy as np
+import uproot
+
+# The branch types, used in turn.
+_DTYPES = ["float32", "int32", "float64", "int64"]
+
+# What an xAOD file's MetaData tree looks like to `local_get_structure`.
+DEFAULT_METADATA: Dict[str, Union[str, int, float]] = {
+    "dataType": "StreamDAOD_PHYS",
+    "amiTag": "e0000_s0000_r0000_p0000",
+    "beamType": "collisions",
+    "beamEnergy": 6800000.0,
+    "mcProcID": 999999,
+    "generatorsInfo": "Synthetic(v1)",
+}
+
+
+def _compression(name: Optional[str], level: int):
+    if name is None or name.lower() == "none":
+        return None
+    try:
+        return getattr(uproot, name.upper())(level)
+    except AttributeError:
+        raise ValueError(
+            f"Unknown compression {name}, must be one of ZLIB, LZMA, LZ4, ZSTD or None"
+        )
+
+
+def _bytes_per_item(branch: int) -> int:
+    return np.dtype(_DTYPES[branch % len(_DTYPES)]).itemsize
+
+
+def _is_jagged(branch: int, jagged_depth: int) -> bool:
+    "Every other branch is jagged, like an event's scalars and its collections"
+    return jagged_depth > 0 and branch % 2 == 1
+
+
+def entries_for_size(
+    size: int,
+    n_trees: int = 1,
+    n_branches: int = 10,
+    jagged_depth: int = 1,
+    mean_length: float = 5.0,
+) -> int:
+    """The number of entries per tree that gives a file of about ``size`` bytes.
+
+    The estimate is of the uncompressed size. The generated values are
+    random, so they compress poorly and the file ends up not much smaller.
+
+    Args:
+        size (int): The wanted file size, in bytes.
+        n_trees (int): Trees in the file.
+        n_branches (int): Branches in each tree.
+        jagged_depth (int): Nesting depth of the jagged branches.
+        mean_length (float): Mean length of each jagged list.
+
+    Returns:
+        int: Entries per tree, at least 1.
+    """
+    per_entry = 0.0
+    for b in range(n_branches):
+        if _is_jagged(b, jagged_depth):
+            # The items, plus an offset (or counter) per list at each level.
+            items = mean_length**jagged_depth
+            lists = sum(mean_length**d for d in range(jagged_depth))
+            per_entry += items * _bytes_per_item(b) + lists * 4
+        else:
+            per_entry += _bytes_per_item(b)
+    return max(1, int(size / (per_entry * n_trees)))
+
+
+def _random_column(
+    rng: np.random.Generator,
+    branch: int,
+    entries: int,
+    jagged_depth: int,
+    mean_length: float,
+) -> Union[np.ndarray, ak.Array]:
+    dtype = _DTYPES[branch % len(_DTYPES)]
+
+    def values(n: int) -> np.ndarray:
+        if dtype.startswith("float"):
+            return rng.normal(size=n).astype(dtype)
+        return rng.integers(0, 1000, size=n).astype(dtype)
+
+    if not _is_jagged(branch, jagged_depth):
+        return values(entries)
+
+    # Build the lists from the inside out: each level groups the level below.
+    n = entries
+    counts = []
+    for _ in range(jagged_depth):
+        counts.append(rng.poisson(mean_length, size=n))
+        n = int(counts[-1].sum())
+    column = ak.Array(values(n))
+    for c in reversed(counts):
+        column = ak.unflatten(column, c)
+    return column
+
+
+def _chunks(
+    rng: np.random.Generator,
+    entries: int,
+    chunk_entries: int,
+    n_branches: int,
+    jagged_depth: int,
+    mean_length: float,
+) -> Iterator[Dict[str, Union[np.ndarray, ak.Array]]]:
+    # An empty tree still gets one (empty) chunk, so it is created.
+    for start in range(0, max(entries, 1), chunk_entries):
+        n = min(chunk_entries, entries - start)
+        yield {
+            f"branch{b:03d}": _random_column(rng, b, n, jagged_depth, mean_length)
+            for b in range(n_branches)
+        }
+
+
+def write_synthetic_file(
+    path: Union[str, Path],
+    n_trees: int = 1,
+    n_branches: int = 10,
+    entries: int = 1000,
+    jagged_depth: int = 1,
+    mean_length: float = 5.0,
+    compression: Optional[str] = "ZLIB",
+    compression_level: int = 1,
+    metadata: Optional[Dict[str, Union[str, int, float]]] = DEFAULT_METADATA,
+    rntuple: bool = False,
+    chunk_entries: int = 100_000,
+    seed: int = 0,
+) -> Path:
+    """Write a ROOT file of random data, for benchmarks and structure tests.
+
+    The trees are named ``tree000``, ``tree001``, ... and their branches
+    ``branch000``, ``branch001``, .... Branch types cycle through float32,
+    int32, float64 and int64, and every other branch is jagged. The same
+    arguments and ``seed`` always give the same data.
+
+    Use `entries_for_size` to pick ``entries`` for a target file size. Data
+    is generated and written ``chunk_entries`` at a time, so large files do
+    not have to fit in memory.
+
+    Args:
+        path (Union[str, Path]): The file to write. It is overwritten.
+        n_trees (int): Number of trees.
+        n_branches (int): Number of branches in each tree.
+        entries (int): Number of entries in each tree.
+        jagged_depth (int): Nesting depth of the jagged branches, 0 for none.
+            TTrees can only be written with a depth of 0 or 1.
+        mean_length (float): Mean length of each jagged list.
+        compression (Optional[str]): ZLIB, LZMA, LZ4, ZSTD or None.
+        compression_level (int): Compression level.
+        metadata (Optional[Dict]): Values for an xAOD-like ``MetaData`` tree,
+            written as ``FileMetaDataAuxDyn.<key>`` branches with one entry.
+            None for no ``MetaData`` tree.
+        rntuple (bool): Write RNTuples instead of TTrees.
+        chunk_entries (int): Entries generated and written at a time.
+        seed (int): Seed for the random values.
+
+    Returns:
+        Path: The file written.
+
+    Raises:
+        ValueError: If TTrees are asked for with a ``jagged_depth`` over 1, or
+            the compression is unknown.
+    """
+    if jagged_depth > 1 and not rntuple:
+        raise ValueError(
+            f"TTrees can not be written with a jagged depth of {jagged_depth}; "
+            "use rntuple=True for nested lists."
+        )
+
+    path = Path(path)
+    rng = np.random.default_rng(seed)
+    with uproot.recreate(
+        path, compression=_compression(compression, compression_level)
+    ) as f:
+        for t in range(n_trees):
+            name = f"tree{t:03d}"
+            for i, chunk in enumerate(
+                _chunks(rng, entries, chunk_entries, n_branches, jagged_depth, mean_length)
+            ):
+                if rntuple:
+                    record = ak.Array(chunk)
+                    if i == 0:
+                        f.mkrntuple(name, record.layout.form)
+                    f[name].extend(record)
+                else:
+                    if i == 0:
+                        f.mktree(
+                            name,
+                            {
+                                k: v.type.content if isinstance(v, ak.Array) else v.dtype
+                                for k, v in chunk.items()
+                            },
+                        )
+                    f[name].extend(chunk)
+
+        if metadata:
+            columns = {
+                f"FileMetaDataAuxDyn.{k}": [v] if isinstance(v, str) else np.array([v])
+                for k, v in metadata.items()
+            }
+            f.mktree(
+                "MetaData",
+                {
+                    k: str if isinstance(v, list) else v.dtype
+                    for k, v in columns.items()
+                },
+            )
+            f["MetaData"].extend(columns)
+
+    return path
@@ -0,0 +1,136 @@
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+
+@dataclass
+class Span:
+    """One timed piece of work."""
+
+    stage: str
+    start: datetime
+    end: datetime
+    # The sample the work was for, if any.
+    sample: Optional[str] = None
+    # What was worked on within the sample, e.g. an input file.
+    item: Optional[str] = None
+
+    @property
+    def duration(self) -> float:
+        "Wall time, in seconds"
+        return (self.end - self.start).total_seconds()
+
+
+@dataclass
+class StageSummary:
+    """Totals for all the spans of one stage."""
+
+    count: int
+    total: float
+    max: float
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+class Timings:
+    """Spans recorded while delivering a spec, per stage, sample and file.
+
+    The stages recorded by ``local_deliver`` are:
+
+    - ``codegen``: generating the code for a sample's request.
+    - ``transform``: running the science image over a sample's files.
+    - ``file``: one input file in the science image, including container start.
+    - ``collect``: listing and copying a sample's outputs into the cache.
+    - ``copy``: copying one output file.
+    - ``to_awk``: loading the results into Awkward arrays.
+    - ``deliver``: the whole call.
+
+    Samples run concurrently and the stages are pipelined, so stage totals
+    can add up to more than the ``deliver`` time.
+
+    Spans may be recorded from any thread.
+    """
+
+    def __init__(self):
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        stage: str,
+        start: datetime,
+        end: datetime,
+        sample: Optional[str] = None,
+        item: Optional[str] = None,
+    ) -> None:
+        "Add a span that has already finished"
+        with self._lock:
+            self.spans.append(Span(stage, start, end, sample, item))
+
+    @contextmanager
+    def span(
+        self, stage: str, sample: Optional[str] = None, item: Optional[str] = None
+    ) -> Iterator[None]:
+        """Time the body of a ``with`` block as a span. The span is recorded
+        even if the block raises.
+
+        Args:
+            stage (str): The stage name.
+            sample (Optional[str]): The sample the work is for.
+            item (Optional[str]): What is being worked on within the sample.
+        """
+        start = datetime.now()
+        try:
+            yield
+        finally:
+            self.record(stage, start, datetime.now(), sample, item)
+
+    def summary(self) -> Dict[str, StageSummary]:
+        """Totals per stage, in the order each stage was first recorded.
+
+        Returns:
+            Dict[str, StageSummary]: Stage name to its totals.
+        """
+        with self._lock:
+            spans = list(self.spans)
+        summary: Dict[str, StageSummary] = {}
+        for span in spans:
+            s = summary.setdefault(span.stage, StageSummary(0, 0.0, 0.0))
+            s.count += 1
+            s.total += span.duration
+            s.max = max(s.max, span.duration)
+        return summary
+
+    def slowest(self, stage: str, n: int = 5) -> List[Span]:
+        """The ``n`` longest spans of a stage, longest first.
+
+        Args:
+            stage (str): The stage name.
+            n (int): How many spans to return.
+        """
+        with self._lock:
+            spans = [s for s in self.spans if s.stage == stage]
+        return sorted(spans, key=lambda s: s.duration, reverse=True)[:n]
+
+    def report(self) -> str:
+        """A plain-text table of the per-stage totals, followed by the slowest
+        files.
+
+        Returns:
+            str: The report.
+        """
+        lines = [f"{'Stage':<10} {'Count':>6} {'Total (s)':>10} {'Mean (s)':>10} {'Max (s)':>10}"]
+        for stage, s in self.summary().items():
+            lines.append(
+                f"{stage:<10} {s.count:>6} {s.total:>10.2f} {s.mean:>10.2f} {s.max:>10.2f}"
+            )
+        slowest = self.slowest("file")
+        if slowest:
+            lines.append("Slowest files:")
+            for span in slowest:
+                lines.append(f"  {span.duration:8.2f}s  {span.sample}: {span.item}")
+        return "\n".join(lines)
@@ -1,5 +1,16 @@
+import fnmatch
+import functools
+import glob
+import io
 import logging
+import os
+import re
+import sys
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Tuple
 from .configurations import Config
+from .schemas import diff_schemas, group_by_schema
 from servicex import query, dataset
 import uproot
 import numpy as np
@@ -10,6 +21,7 @@ from servicex.dataset_identifier import DataSetIdentifier
 
 def run_query(
     input_filenames,
+    branch_stats=False,
 ):
     import uproot
     import awkward as ak
@@ -30,8 +42,13 @@ def run_query(
     """
     Opens a ROOT file and returns a JSON-formatted string describing the structure,
     encoded inside an ak.Array for ServiceX.
+
+    With branch_stats, the compressed and uncompressed bytes, baskets and
+    entries of every branch are added under "BranchStats". They come from
+    the TTree metadata, so no basket is read or decompressed.
     """
     tree_dict = {}
+    stats_dict = {}
 
     with uproot.open(input_filenames) as file:
 
@@ -46,10 +63,11 @@ def run_query(
                 fm_branches = [
                     b for b in tree.keys() if b.startswith("FileMetaDataAuxDyn.")
                 ]
+                # Only the first entry is wanted, so read just that, for all
+                # the branches in one go, rather than every entry of each.
+                first = tree.arrays(fm_branches, entry_stop=1, library="ak")
                 # remove the prefix in keys
-                meta_dict = {
-                    p[19:]: str(tree[p].array(library="ak")[0]) for p in fm_branches
-                }
+                meta_dict = {p[19:]: str(first[p][0]) for p in fm_branches}
                 tree_dict["FileMetaData"] = meta_dict
 
             branch_dict = {}
@@ -59,6 +77,20 @@ def run_query(
 
             tree_dict[tree_name_clean] = branch_dict
 
+            if branch_stats:
+                stats_dict[tree_name_clean] = {
+                    branch_name: {
+                        "compressed_bytes": int(branch.compressed_bytes),
+                        "uncompressed_bytes": int(branch.uncompressed_bytes),
+                        "baskets": int(branch.num_baskets),
+                        "entries": int(branch.num_entries),
+                    }
+                    for branch_name, branch in tree.items()
+                }
+
+    if branch_stats:
+        tree_dict["BranchStats"] = stats_dict
+
     # Serialize tree_dict to JSON string
     json_str = json.dumps(tree_dict)
 
@@ -146,22 +178,85 @@ def open_delivered_file(sample, path):
         return None
 
 
-def print_structure_from_str(
-    json_by_sample, filter_branch="", save_to_txt=False, do_print=False
-):
-    """
-    Re-formats the JSON structure string from ServiceX into a readable summary.
+def _branch_filter(filter_branch="", branch_regex=None, branch_glob=None):
+    "A test of branch names that passes those matching every filter given"
+    pattern = re.compile(branch_regex) if branch_regex else None
+
+    def keep(branch_name):
+        if filter_branch and filter_branch not in branch_name:
+            return False
+        if pattern is not None and not pattern.search(branch_name):
+            return False
+        if branch_glob and not fnmatch.fnmatchcase(branch_name, branch_glob):
+            return False
+        return True
+
+    return keep
+
+
+def _format_bytes(n):
+    for unit in ["B", "kB", "MB", "GB"]:
+        if n < 1000 or unit == "GB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1000
+
+
+def _format_branch_stats(branch_stats, total):
+    "Sizes of one branch, and its share of the compressed bytes of those shown"
+    compressed = branch_stats["compressed_bytes"]
+    uncompressed = branch_stats["uncompressed_bytes"]
+    share = f"{100 * compressed / total:.1f}%" if total else "-"
+    ratio = f"{uncompressed / compressed:.2f}" if compressed else "-"
+    return (
+        f"{_format_bytes(compressed)} compressed ({share}), "
+        f"{_format_bytes(uncompressed)} uncompressed, ratio {ratio}, "
+        f"{branch_stats['baskets']} baskets, {branch_stats['entries']} entries"
+    )
+
+
+def _filter_heading(filter_branch="", branch_regex=None, branch_glob=None):
+    "The heading of a branch listing, naming the filters applied to it"
+    filters = ", ".join(
+        f"{kind} '{value}'"
+        for kind, value in [("regex", branch_regex), ("glob", branch_glob)]
+        if value
+    )
+    return (
+        f"\nFile structure with branch filter \U0001f33f '{filter_branch}'"
+        + (f" ({filters})" if filters else "")
+        + ":\n"
+    )
+
+
+def _tree_lines(trees, stats, keep):
+    "The lines listing the branches ``keep`` passes of each tree"
+    for tree_name, branches in trees.items():
+        yield f"\n\U0001f333 Tree: {tree_name}"
+        if stats is None:
+            yield "   ├── Branches:"
+            for branch_name, dtype in branches.items():
+                if keep(branch_name):
+                    yield f"   │   ├── {branch_name} ; dtype: {dtype}"
+            continue
 
-    Parameters:
-      json_by_sample (dict): mapping of sample names to JSON structure strings.
-      filter_branch (str): If provided, only branches containing this string are included.
-      save_to_txt (bool): If True, saves output to a text file instead of returning it.
-      do_print (bool): If True, prints the output to the terminal and returns None.
+        # Largest first, to show which branches dominate the I/O
+        tree_stats = stats.get(tree_name, {})
+        shown = sorted(
+            (b for b in branches if keep(b)),
+            key=lambda b: -tree_stats.get(b, {}).get("compressed_bytes", 0),
+        )
+        total = sum(tree_stats.get(b, {}).get("compressed_bytes", 0) for b in shown)
+        yield f"   ├── Branches (largest first, {_format_bytes(total)} compressed):"
+        for branch_name in shown:
+            line = f"   │   ├── {branch_name} ; dtype: {branches[branch_name]}"
+            if branch_name in tree_stats:
+                line += f" ; {_format_branch_stats(tree_stats[branch_name], total)}"
+            yield line
 
-    Returns:
-      result_str (str): The formatted file structure.
-    """
-    output_lines = []
+
+def _structure_lines(json_by_sample, filter_branch="", branch_regex=None, branch_glob=None):
+    "The lines of the formatted structure, one sample at a time"
+    keep = _branch_filter(filter_branch, branch_regex, branch_glob)
 
     for sample_name, structure_str in json_by_sample.items():
         if structure_str is None:
@@ -172,140 +267,367 @@ def print_structure_from_str(
             continue
         structure_dict = json.loads(structure_str)
 
-        output_lines.append(
+        yield (
             "\n---------------------------\n"
             f"\U0001f4c1 Sample: {sample_name}\n"
             "---------------------------"
         )
 
         # Get the metadata first
-        output_lines.append("\nFile Metadata \u2139\ufe0f :\n")
+        yield "\nFile Metadata \u2139\ufe0f :\n"
         if "FileMetaData" not in structure_dict:
-            output_lines.append("No FileMetaData found in dataset.")
+            yield "No FileMetaData found in dataset."
         else:
             for key, value in structure_dict.get("FileMetaData", {}).items():
-                output_lines.append(f"── {key}: {value}")
-        output_lines.append("\n---------------------------")
+                yield f"── {key}: {value}"
+        yield "\n---------------------------"
 
-        # drop the File metadata from the trees
+        # drop the File metadata and branch statistics from the trees
         structure_dict.pop("FileMetaData", {})
+        stats = structure_dict.pop("BranchStats", None)
 
-        output_lines.append(
-            f"\nFile structure with branch filter \U0001f33f '{filter_branch}':\n"
-        )
+        yield _filter_heading(filter_branch, branch_regex, branch_glob)
+        yield from _tree_lines(structure_dict, stats, keep)
 
-        for tree_name, branches in structure_dict.items():
-            output_lines.append(f"\n\U0001f333 Tree: {tree_name}")
-            output_lines.append("   ├── Branches:")
-            for branch_name, dtype in branches.items():
-                if filter_branch and filter_branch not in branch_name:
-                    continue
-                output_lines.append(f"   │   ├── {branch_name} ; dtype: {dtype}")
 
-    result_str = "\n".join(output_lines).encode("utf-8").decode("utf-8")
+def _write_lines(lines, out):
+    "Write lines to ``out`` as they come, separated by newlines"
+    for i, line in enumerate(lines):
+        if i:
+            out.write("\n")
+        out.write(line)
+
 
-    if save_to_txt:
-        with open("samples_structure.txt", "w", encoding="utf-8") as f:
-            f.write(result_str)
+def write_structure(
+    json_by_sample, out, filter_branch="", branch_regex=None, branch_glob=None
+):
+    """
+    Writes the readable summary of print_structure_from_str to a file as it
+    is formatted, a line at a time, so the whole text is never held in memory.
+
+    Parameters:
+      json_by_sample (dict): mapping of sample names to JSON structure strings.
+      out (str, Path or file-like): The file to write, or anything with a write(str) method.
+      filter_branch (str): If provided, only branches containing this string are included.
+      branch_regex (str): If provided, only branches matching this regular expression
+                          (anywhere in the name) are included.
+      branch_glob (str): If provided, only branches matching this glob pattern
+                         (e.g. "Electron*") are included.
+    """
+    if isinstance(out, (str, os.PathLike)):
+        with open(out, "w", encoding="utf-8") as f:
+            write_structure(json_by_sample, f, filter_branch, branch_regex, branch_glob)
+        return
+
+    _write_lines(
+        _structure_lines(json_by_sample, filter_branch, branch_regex, branch_glob), out
+    )
+
+
+def print_structure_from_str(
+    json_by_sample,
+    filter_branch="",
+    save_to_txt=False,
+    do_print=False,
+    branch_regex=None,
+    branch_glob=None,
+    out=None,
+):
+    """
+    Re-formats the JSON structure string from ServiceX into a readable summary.
+
+    Parameters:
+      json_by_sample (dict): mapping of sample names to JSON structure strings.
+      filter_branch (str): If provided, only branches containing this string are included.
+      save_to_txt (bool): If True, saves output to a text file instead of returning it.
+      do_print (bool): If True, prints the output to the terminal and returns None.
+      branch_regex (str): If provided, only branches matching this regular expression
+                          (anywhere in the name) are included.
+      branch_glob (str): If provided, only branches matching this glob pattern
+                         (e.g. "Electron*") are included.
+      out (str, Path or file-like): If provided, the output is written to this file
+                                    as it is formatted (see write_structure), and
+                                    None is returned.
+
+    Returns:
+      result_str (str): The formatted file structure.
+    """
+    filters = dict(
+        filter_branch=filter_branch, branch_regex=branch_regex, branch_glob=branch_glob
+    )
+
+    if out is not None:
+        write_structure(json_by_sample, out, **filters)
+        return
+    elif save_to_txt:
+        write_structure(json_by_sample, "samples_structure.txt", **filters)
         return "File structure saved to 'samples_structure.txt'."
     elif do_print:
-        print(result_str)
+        write_structure(json_by_sample, sys.stdout, **filters)
+        print()
         return
     else:
-        return result_str
+        buffer = io.StringIO()
+        write_structure(json_by_sample, buffer, **filters)
+        return buffer.getvalue()
 
 
+def _split_args(args_str):
+    "Split the arguments of an interpretation string at its top-level commas"
+    args = []
+    depth = 0
+    quote = None
+    start = 0
+    for i, c in enumerate(args_str):
+        if quote:
+            quote = None if c == quote else quote
+        elif c in "'\"":
+            quote = c
+        elif c in "([":
+            depth += 1
+        elif c in ")]":
+            depth -= 1
+        elif c == "," and depth == 0:
+            args.append(args_str[start:i].strip())
+            start = i + 1
+    args.append(args_str[start:].strip())
+    return args
+
+
+@functools.lru_cache(maxsize=None)
 def parse_jagged_depth_and_dtype(dtype_str):
     """
     Helper to decode the dtype str for each branch.
 
     Parses uproot-style interpretation strings such as:
     - "AsJagged(AsJagged(AsDtype('>f4')))"
+    - "AsJagged(AsDtype('>f4'), header_bytes=10)"
+    - "AsObjects(AsVector(True, AsVector(False, dtype('>i4'))))"
+    - "AsStrings()" or "AsObjects(AsVector(True, AsString(False)))"
 
     Returns the number of nested layers and the inner dtype.
-    Used in str_to_array to reconstruct the ak.array.
+    Used in str_to_array to reconstruct the ak.array. A file has many
+    branches but few distinct interpretations, so the results are cached.
 
     Parameters:
         dtype_str (str): The dtype part of a branch info str; from the delivered file structure.
 
     Returns:
-        int, str: jagged_depth, base_numpy_dtype_str or None if not recognized.
+        int, str: jagged_depth, base_numpy_dtype_str, "string" for strings, or None
+                  if not recognized.
     """
     depth = 0
     current = dtype_str.strip()
 
-    # Count how many nested AsJagged(...) wrappers exist
-    while current.startswith("AsJagged("):
-        depth += 1
-        current = current[
-            len("AsJagged("):-1
-        ].strip()  # Strip outermost wrapper, up to -1 to remove )
-
-    # Extract the base dtype string from AsDtype('<np-format>')
-    if current.startswith("AsDtype('") and current.endswith("')"):
-        base_dtype = current[len("AsDtype('"):-2]
-        return depth, base_dtype
+    # Unwrap one layer at a time, counting the ones that are lists
+    while True:
+        name, _, rest = current.partition("(")
+        if not rest.endswith(")"):
+            return depth, None
+        args = _split_args(rest[:-1])
+
+        if name == "AsJagged":
+            depth += 1
+            current = args[0]
+        elif name == "AsObjects":
+            current = args[0]
+        elif name == "AsVector" and len(args) == 2:
+            depth += 1
+            current = args[1]
+        elif name == "AsArray" and len(args) == 4:
+            depth += 1
+            current = args[2]
+        elif name in ("AsDtype", "dtype"):
+            # AsDtype(from_dtype[, to_dtype]): the values come out as to_dtype
+            return depth, args[-1].strip("'\"")
+        elif name in ("AsStrings", "AsString"):
+            return depth, "string"
+        else:
+            return depth, None
+
+
+_STRING_TYPE = ak.types.ListType(
+    ak.types.NumpyType("uint8", parameters={"__array__": "char"}),
+    parameters={"__array__": "string"},
+)
+
+
+def _branch_type(dtype_str):
+    """
+    The awkward type of a branch: a list of its entries, each nested as deep
+    as the interpretation. ?unknown if the interpretation isn't understood.
+    """
+    depth, base_dtype_str = parse_jagged_depth_and_dtype(dtype_str)
+    if base_dtype_str is None:
+        return ak.types.OptionType(ak.types.UnknownType())
+
+    if base_dtype_str == "string":
+        branch_type = _STRING_TYPE
     else:
-        return depth, None
+        try:
+            np_dtype = np.dtype(base_dtype_str).newbyteorder("=")
+            branch_type = ak.types.NumpyType(
+                ak.types.numpytype.dtype_to_primitive(np_dtype)
+            )
+        except (TypeError, ValueError):
+            return ak.types.OptionType(ak.types.UnknownType())
+
+    for _ in range(depth + 1):
+        branch_type = ak.types.ListType(branch_type)
+    return branch_type
 
 
 def str_to_array(encoded_json_str):
     """
-    Helper to reconstruct ak.Arrays from a JSON-formatted file-structure string.
-    Returns an array mimicking TTrees and TBranches with correct field names and dtypes.
+    Helper to reconstruct the ak type of the trees from a JSON-formatted file-structure string.
+    Returns a type mimicking TTrees and TBranches with correct field names and dtypes.
+
+    The type is built directly, without making any arrays, so it stays quick
+    for files with thousands of branches.
 
     Parameters:
         encoded_json_str (str): JSON string from run_query.
 
     Returns:
-        ak.Array: An array containing a dictionary of trees with branch structures
-                  and dummy typed values.
+        ak.types.ArrayType: A record of trees, each a record of its branches.
     """
-    reconstructed_data = {}
     structure_dict = json.loads(encoded_json_str)
-    # drop the File metadata from the trees
+    # drop the File metadata and branch statistics from the trees
     structure_dict.pop("FileMetaData", {})
+    structure_dict.pop("BranchStats", {})
 
-    for treename, branch_dict in structure_dict.items():
-        branches = {}
+    trees = {
+        treename: ak.types.RecordType(
+            [_branch_type(dtype_str) for dtype_str in branch_dict.values()],
+            list(branch_dict),
+        )
+        for treename, branch_dict in structure_dict.items()
+        if branch_dict
+    }
+    return ak.types.ArrayType(ak.types.RecordType(list(trees.values()), list(trees)), 1)
 
-        for branch_name, dtype_str in branch_dict.items():
-            # Get jagged depth and numpy base dtype
-            depth, base_dtype_str = parse_jagged_depth_and_dtype(dtype_str)
-            if base_dtype_str is None:
-                branches[branch_name] = None
-                continue
 
-            try:
-                np_dtype = np.dtype(base_dtype_str)
-            except TypeError:
-                branches[branch_name] = None
-                continue
+def _outcome(get):
+    "(result of get(), None), or (None, the exception it raised)"
+    try:
+        return get(), None
+    except Exception as e:
+        return None, e
+
+
+def _structure_json(file_path, branch_stats=False):
+    "The structure of one file as a JSON string (top level, so a process pool can run it)"
+    return str(run_query(file_path, branch_stats=branch_stats)[0])
+
+
+# Structures already read, by (path, modification time, size, with branch
+# statistics), so a file is only opened again once it changes. The least
+# recently used are dropped beyond _STRUCTURE_CACHE_SIZE files.
+_STRUCTURE_CACHE_SIZE = 1024
+_structure_cache: "OrderedDict[Tuple[str, int, int, bool], str]" = OrderedDict()
 
-            dummy = np_dtype.type(0)
-            for _ in range(depth):
-                dummy = [dummy]
 
-            branches[branch_name] = ak.Array([dummy])
+def _cache_key(file_path, branch_stats):
+    if not isinstance(file_path, (str, os.PathLike)):
+        return None
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        return None
+    return (os.path.abspath(file_path), st.st_mtime_ns, st.st_size, branch_stats)
+
 
-        if branches:
-            reconstructed_data[treename] = ak.Array([branches])
+def _read_structures(dataset_dict, max_workers, branch_stats=False):
+    """
+    Read the structure of each file, reusing those already read.
+
+    Returns a dict with the keys of dataset_dict, in the same order, of
+    (JSON string, None), or (None, error) for files that couldn't be read.
+    """
+    outcomes = {}
+    to_read = {}
+    for name, file_path in dataset_dict.items():
+        key = _cache_key(file_path, branch_stats)
+        if key in _structure_cache:
+            _structure_cache.move_to_end(key)
+            outcomes[name] = (_structure_cache[key], None)
+        else:
+            outcomes[name] = (None, None)  # Keeps the order until it is read
+            to_read[name] = (file_path, key)
+
+    workers = min(max_workers, len(to_read))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                name: pool.submit(_structure_json, file_path, branch_stats)
+                for name, (file_path, _) in to_read.items()
+            }
+            read = {name: _outcome(f.result) for name, f in futures.items()}
+    else:
+        read = {
+            name: _outcome(lambda: _structure_json(file_path, branch_stats))
+            for name, (file_path, _) in to_read.items()
+        }
 
-    return ak.Array(reconstructed_data).type
+    for name, (structure, error) in read.items():
+        outcomes[name] = (structure, error)
+        key = to_read[name][1]
+        if structure is not None and key is not None:
+            _structure_cache[key] = structure
+            while len(_structure_cache) > _STRUCTURE_CACHE_SIZE:
+                _structure_cache.popitem(last=False)
+    return outcomes
 
 
-def local_get_structure(datasets, config: Config, array_out=False, **kwargs):
+def _structures_or_raise(outcomes, what):
+    """
+    The JSON string (or None) of each file. Errors are logged, and the first
+    is raised if nothing could be read.
+    """
+    structures = {}
+    errors = []
+    for name, (structure, error) in outcomes.items():
+        if error is not None:
+            logging.error(f"Error reading structure of {what} '{name}': {error}")
+            errors.append(error)
+        structures[name] = structure
+    if errors and len(errors) == len(outcomes):
+        raise errors[0]
+    return structures
+
+
+def local_get_structure(
+    datasets,
+    config: Config,
+    array_out=False,
+    max_workers: int = 1,
+    branch_stats=False,
+    **kwargs,
+):
     """
     Utility function.
     Reads the structure of local ROOT files directly using uproot.
     Calls print_structure_from_str() to dump the structure in a user-friendly format.
 
+    Files that can't be read are logged and left out, so one bad file doesn't
+    lose the rest. If none can be read, the first error is raised. A file that
+    has already been read, and not changed since, is not opened again.
+
     Parameters:
       datasets (dict,str,[str]): The datasets from which to print the file structures.
                                 A custom sample name per dataset can be given in a dict form:
                                 {'sample_name':'file_path'}
+      max_workers (int): Number of processes to read files with. With more than
+                         one, files are opened concurrently. Results keep the
+                         order of ``datasets`` either way.
+      branch_stats (bool): If True, the compressed and uncompressed size, baskets and
+                           entries of each branch are shown, largest branches first.
+                           Only the file's metadata is read for them.
       kwargs : Arguments to be propagated to print_structure_from_str
     """
+    if max_workers < 1:
+        raise ValueError(f"max_workers must be at least 1, got {max_workers}")
+
     user_in = type(datasets)
     dataset_dict = {}
     if user_in == str:
@@ -324,11 +646,153 @@ def local_get_structure(datasets, config: Config, array_out=False, **kwargs):
             "a DataSetIdentifier object or a dict ('sample_name':'file_path')"
         )
 
-    json_by_sample = {}
-    for sample_name, file_path in dataset_dict.items():
-        result = run_query(file_path)
-        json_by_sample[sample_name] = str(result[0])
+    json_by_sample = _structures_or_raise(
+        _read_structures(dataset_dict, max_workers, branch_stats), "sample"
+    )
 
     if array_out:
-        return {name: str_to_array(s) for name, s in json_by_sample.items()}
+        return {
+            name: str_to_array(s) if s is not None else None
+            for name, s in json_by_sample.items()
+        }
     return print_structure_from_str(json_by_sample, **kwargs)
+
+
+def _schema_group_lines(
+    groups, unreadable=(), filter_branch="", branch_regex=None, branch_glob=None
+):
+    "The lines of the formatted schemas, one schema at a time"
+    keep = _branch_filter(filter_branch, branch_regex, branch_glob)
+
+    def files_line(files):
+        shown = ", ".join(files[:3])
+        return f"   Files: {shown}" + (f", ... ({len(files) - 3} more)" if len(files) > 3 else "")
+
+    n_files = sum(len(g.files) for g in groups)
+    yield (
+        "\n---------------------------\n"
+        f"\U0001f4da Dataset: {n_files} files, {len(groups)} distinct schemas\n"
+        "---------------------------"
+    )
+    if unreadable:
+        yield f"\nUnreadable files ({len(unreadable)}): {', '.join(unreadable)}"
+
+    for i, group in enumerate(groups):
+        yield f"\n\U0001f9ec Schema {i + 1} ({group.schema_hash[:12]}): {len(group.files)} files"
+        yield files_line(group.files)
+
+        if i == 0:
+            yield _filter_heading(filter_branch, branch_regex, branch_glob)
+            yield from _tree_lines(group.schema, None, keep)
+            continue
+
+        diff = diff_schemas(groups[0].schema, group.schema)
+        yield "   Differences from schema 1:"
+        for tree_name in diff.added_trees:
+            yield f"   ├── + Tree: {tree_name}"
+        for tree_name in diff.removed_trees:
+            yield f"   ├── - Tree: {tree_name}"
+        for tree_name, added in diff.added_branches.items():
+            for b in added:
+                if keep(b):
+                    yield f"   ├── + {tree_name}: {b} ; dtype: {group.schema[tree_name][b]}"
+        for tree_name, removed in diff.removed_branches.items():
+            for b in removed:
+                if keep(b):
+                    yield f"   ├── - {tree_name}: {b}"
+        for tree_name, changed in diff.changed_branches.items():
+            for b, (old, new) in changed.items():
+                if keep(b):
+                    yield f"   ├── ~ {tree_name}: {b} ; dtype: {old} -> {new}"
+
+
+def format_schema_groups(
+    groups, unreadable=(), filter_branch="", branch_regex=None, branch_glob=None, out=None
+):
+    """
+    Format the distinct schemas of a dataset: the first in full, and each of
+    the others as its differences from the first. Branches are filtered as
+    in print_structure_from_str.
+
+    Parameters:
+      groups (List[SchemaGroup]): From group_by_schema.
+      unreadable (List[str]): Files that couldn't be read.
+      filter_branch (str): If provided, only branches containing this string are included.
+      branch_regex (str): If provided, only branches matching this regular expression
+                          (anywhere in the name) are included.
+      branch_glob (str): If provided, only branches matching this glob pattern
+                         (e.g. "Electron*") are included.
+      out (file-like): If provided, the output is written to it as it is
+                       formatted, and None is returned.
+
+    Returns:
+      str: The formatted schemas.
+    """
+    lines = _schema_group_lines(groups, unreadable, filter_branch, branch_regex, branch_glob)
+    if out is not None:
+        _write_lines(lines, out)
+        return
+    buffer = io.StringIO()
+    _write_lines(lines, buffer)
+    return buffer.getvalue()
+
+
+def local_get_dataset_structure(
+    files,
+    config: Config,
+    max_workers: int = 1,
+    filter_branch="",
+    schemas_out=False,
+    do_print=False,
+    branch_regex=None,
+    branch_glob=None,
+):
+    """
+    Utility function.
+    Reads the structure of every file of a dataset and reports each distinct
+    schema (the trees, branches and their types) once, rather than once per
+    file. The first schema is shown in full and the others as what appears,
+    disappears or changes type compared to it.
+
+    Files that were already read, and not changed since, are not opened again.
+
+    Parameters:
+      files (str, [str]): The files of the dataset, or a glob pattern for them.
+      max_workers (int): Number of processes to read files with.
+      filter_branch (str): If provided, only branches containing this string are included.
+      schemas_out (bool): If True, return the List[SchemaGroup] instead of text.
+      do_print (bool): If True, prints the output to the terminal and returns None.
+      branch_regex (str): If provided, only branches matching this regular expression
+                          (anywhere in the name) are included.
+      branch_glob (str): If provided, only branches matching this glob pattern
+                         (e.g. "Electron*") are included.
+
+    Returns:
+      str: The formatted schemas.
+    """
+    if max_workers < 1:
+        raise ValueError(f"max_workers must be at least 1, got {max_workers}")
+    if isinstance(files, str):
+        files = sorted(glob.glob(files)) if glob.has_magic(files) else [files]
+    if not files:
+        raise ValueError("No files given")
+
+    structures = _structures_or_raise(
+        _read_structures({f: f for f in files}, max_workers), "file"
+    )
+    groups = group_by_schema(structures)
+    if schemas_out:
+        return groups
+
+    result_str = format_schema_groups(
+        groups,
+        unreadable=[f for f, s in structures.items() if s is None],
+        filter_branch=filter_branch,
+        branch_regex=branch_regex,
+        branch_glob=branch_glob,
+        out=sys.stdout if do_print else None,
+    )
+    if do_print:
+        print()
+        return
+    return result_str
@@ -2,3 +2,9 @@ def pytest_addoption(parser):
     parser.addoption("--wsl2", action="store_true", help="run WSL2 tests")
     parser.addoption("--docker", action="store_true", help="run Docker tests")
     parser.addoption("--singularity", action="store_true", help="run Singularity tests")
+    parser.addoption("--benchmark", action="store_true", help="run benchmarks")
+    parser.addoption(
+        "--benchmark-output",
+        default=None,
+        help="append benchmark results, as JSON lines, to this file",
+    )
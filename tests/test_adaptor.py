@@ -2,6 +2,7 @@ import getpass
 import logging
 import tempfile
 import uuid
+from datetime import datetime
 from pathlib import Path
 from unittest.mock import MagicMock
 
@@ -10,6 +11,7 @@ from servicex import ResultDestination
 from servicex.models import ResultFormat, Status, TransformRequest, TransformStatus
 
 from servicex_local.adaptor import MinioLocalAdaptor, SXLocalAdaptor
+from servicex_local.timing import Timings
 
 
 def test_adaptor_url():
@@ -145,7 +147,12 @@ def science_runner_one_txt_file() -> MagicMock:
     mock_science_runner = MagicMock()
 
     def mock_transform(
-        generated_files_dir, input_files, output_directory: Path, output_format
+        generated_files_dir,
+        input_files,
+        output_directory: Path,
+        output_format,
+        on_file_done=None,
+        cancel=None,
     ):
         output_file = output_directory / "output_file.txt"
         output_file.write_text("Hello, world!")
@@ -374,3 +381,327 @@ async def test_minio_get_signed_url():
     signed_url = await adaptor.get_signed_url("file1.txt")
     assert signed_url.startswith("file://")
     assert signed_url.endswith("file1.txt")
+
+
+@pytest.mark.asyncio
+async def test_adaptor_prepare_then_run(code_gen_one_file, science_runner_one_txt_file):
+    "prepare_transform generates code; run_prepared_transform runs and cleans it up."
+    adaptor = SXLocalAdaptor(
+        code_gen_one_file,
+        science_runner_one_txt_file,
+        Path(tempfile.gettempdir()),
+        "http://localhost:5000",
+    )
+    transform_request = TransformRequest(
+        **{
+            "selection": "dummy_selection",
+            "file-list": ["input_file.root"],
+            "result_format": ResultFormat.root_ttree,
+            "result_destination": ResultDestination.volume,
+            "codegen": "dummy",
+        }
+    )
+
+    before = datetime.now()
+    prepared = await adaptor.prepare_transform(transform_request)
+    assert (prepared.generated_files_dir / "run_me.sh").exists()
+    assert prepared.transform_request is transform_request
+
+    request_id = await adaptor.run_prepared_transform(prepared)
+
+    assert request_id == prepared.request_id
+    assert not prepared.generated_files_dir.exists()
+    transform_status = await adaptor.get_transform_status(request_id)
+    assert transform_status.files_completed == 1
+    assert before <= transform_status.submit_time <= transform_status.finish_time
+    assert transform_status.submit_time == prepared.submit_time
+
+
+@pytest.mark.asyncio
+async def test_adaptor_resumes_failed_request(tmp_path, code_gen_one_file):
+    "A re-run after a failure only transforms the files that did not finish."
+    import json
+    from unittest.mock import patch
+
+    from servicex_local.events import EventLog
+    from servicex_local.science_images import DockerScienceImage, ScienceRunError
+
+    input_files = []
+    for name in ["a.root", "b.root", "c.root"]:
+        (tmp_path / name).touch()
+        input_files.append(str(tmp_path / name))
+
+    runs = []
+    failing = {"c.root"}
+
+    def mock_run_command_with_logging(command, log_file, **kwargs):
+        name = command[-2].split("/")[-1]
+        runs.append(name)
+        if name in failing:
+            raise ScienceRunError(
+                "Failed to run SX science payload locally with exit_code=1", 1
+            )
+        output_dir = next(
+            a for a in command if a.endswith(":/servicex/output")
+        ).rsplit(":", 1)[0]
+        (Path(output_dir) / name).touch()
+
+    adaptor = SXLocalAdaptor(
+        code_gen_one_file,
+        DockerScienceImage("sslhep/servicex_func_adl_uproot_transformer:uproot5"),
+        tmp_path / "cache",
+        "http://localhost:5000",
+    )
+    adaptor.timings = Timings()
+    transform_request = TransformRequest(
+        **{
+            "selection": "dummy_selection",
+            "file-list": input_files,
+            "result_format": ResultFormat.root_ttree,
+            "result_destination": ResultDestination.volume,
+            "codegen": "dummy",
+        }
+    )
+
+    with patch(
+        "servicex_local.science_images.run_command_with_logging",
+        side_effect=mock_run_command_with_logging,
+    ):
+        with pytest.raises(RuntimeError, match="exit_code=1"):
+            await adaptor.submit_transform(transform_request)
+
+        manifests = list((adaptor.cache_dir / "manifests").glob("*.json"))
+        assert len(manifests) == 1
+        manifest = json.loads(manifests[0].read_text())
+        assert manifest["status"] == "failed"
+        assert manifest["files"][input_files[0]]["status"] == "done"
+        assert manifest["files"][input_files[2]]["status"] == "failed"
+        assert "exit_code=1" in manifest["files"][input_files[2]]["error"]
+        assert manifest["files"][input_files[0]]["duration"] >= 0
+
+        runs.clear()
+        failing.clear()
+        request_id = await adaptor.submit_transform(transform_request)
+
+    assert runs == ["c.root"]
+    assert request_id == manifest["request_id"]
+    transform_status = await adaptor.get_transform_status(request_id)
+    assert transform_status.files_completed == 3
+    assert json.loads(manifests[0].read_text())["status"] == "complete"
+
+    # Both runs are in the request's event log
+    events = EventLog.read(adaptor.cache_dir / "events" / f"{request_id}.jsonl")
+    assert [e["event"] for e in events] == [
+        "request_start", "file", "file", "file", "request_end",
+        "request_start", "file", "request_end",
+    ]
+    failed = events[3]
+    assert failed["input_file"] == input_files[2]
+    assert failed["status"] == "failed"
+    assert failed["exit_code"] == 1
+    assert failed["container"].startswith("sx_codegen_container_")
+    assert events[1]["exit_code"] == 0
+    assert events[1]["bytes_in"] == 0
+    assert events[4]["status"] == "failed"
+    assert events[5]["already_done"] == 2
+    assert events[0]["image"] == events[5]["image"] == (
+        "sslhep/servicex_func_adl_uproot_transformer:uproot5"
+    )
+    assert events[-1]["status"] == "complete"
+
+    # Every file that ran has a timing span
+    file_spans = [s.item for s in adaptor.timings.spans if s.stage == "file"]
+    assert file_spans == input_files + [input_files[2]]
+
+
+@pytest.mark.asyncio
+async def test_adaptor_complete_request_is_not_resumed(
+    tmp_path, code_gen_one_file, science_runner_one_txt_file
+):
+    "Once a request completes, submitting it again starts a fresh request."
+    adaptor = SXLocalAdaptor(
+        code_gen_one_file,
+        science_runner_one_txt_file,
+        tmp_path,
+        "http://localhost:5000",
+    )
+    transform_request = TransformRequest(
+        **{
+            "selection": "dummy_selection",
+            "file-list": ["input_file.root"],
+            "result_format": ResultFormat.root_ttree,
+            "result_destination": ResultDestination.volume,
+            "codegen": "dummy",
+        }
+    )
+
+    first = await adaptor.submit_transform(transform_request)
+    second = await adaptor.submit_transform(transform_request)
+
+    assert first != second
+
+
+@pytest.mark.asyncio
+async def test_adaptor_writes_to_output_dir(
+    tmp_path, code_gen_one_file, science_runner_one_txt_file
+):
+    "With output_dir set, the science image writes straight into it."
+    adaptor = SXLocalAdaptor(
+        code_gen_one_file,
+        science_runner_one_txt_file,
+        tmp_path / "cache",
+        "http://localhost:5000",
+        output_dir=tmp_path / "outputs",
+    )
+    transform_request = TransformRequest(
+        **{
+            "selection": "dummy_selection",
+            "file-list": ["input_file.root"],
+            "result_format": ResultFormat.root_ttree,
+            "result_destination": ResultDestination.volume,
+            "codegen": "dummy",
+        }
+    )
+
+    request_id = await adaptor.submit_transform(transform_request)
+
+    assert (tmp_path / "outputs" / request_id / "output_file.txt").exists()
+
+
+@pytest.mark.asyncio
+async def test_minio_output_root(tmp_path):
+    "MinioLocalAdaptor reads from output_root/<request_id> when given one."
+    transform_status = create_transform_status("test_request_id")
+    adaptor = MinioLocalAdaptor.for_transform(transform_status, output_root=tmp_path)
+
+    (tmp_path / "test_request_id").mkdir()
+    (tmp_path / "test_request_id" / "file1.txt").write_text("content1")
+
+    assert adaptor.output_directory == tmp_path / "test_request_id"
+    result_files = await adaptor.list_bucket()
+    assert [r.filename for r in result_files] == ["file1.txt"]
+
+
+def _capabilities_codegen(file_formats) -> MagicMock:
+    "A code generator that writes a transformer_capabilities.json"
+    import json
+
+    def generate_files(query: str, directory: Path):
+        (directory / "transformer_capabilities.json").write_text(
+            json.dumps({"file-formats": file_formats, "language": "bash"})
+        )
+        return directory
+
+    code_generator = MagicMock()
+    code_generator.gen_code = generate_files
+    return code_generator
+
+
+@pytest.mark.asyncio
+async def test_adaptor_passes_result_format(tmp_path):
+    "The requested result format reaches the science image as output_format."
+    received = {}
+
+    def mock_transform(
+        generated_files_dir,
+        input_files,
+        output_directory,
+        output_format,
+        on_file_done=None,
+        cancel=None,
+    ):
+        received["output_format"] = output_format
+        output_file = output_directory / "input_file.parquet"
+        output_file.touch()
+        return [output_file]
+
+    science_runner = MagicMock()
+    science_runner.transform = mock_transform
+    adaptor = SXLocalAdaptor(
+        _capabilities_codegen(["parquet"]), science_runner, tmp_path, "http://localhost:5000"
+    )
+    transform_request = TransformRequest(
+        **{
+            "selection": "dummy_selection",
+            "file-list": ["input_file.root"],
+            "result_format": ResultFormat.parquet,
+            "result_destination": ResultDestination.volume,
+            "codegen": "dummy",
+        }
+    )
+
+    request_id = await adaptor.submit_transform(transform_request)
+
+    assert received["output_format"] == "parquet"
+    status = await adaptor.get_transform_status(request_id)
+    assert status.result_format == ResultFormat.parquet
+
+
+@pytest.mark.asyncio
+async def test_adaptor_rejects_unsupported_result_format(
+    tmp_path, science_runner_one_txt_file
+):
+    "Asking a ROOT-only transformer for parquet fails before anything runs."
+    adaptor = SXLocalAdaptor(
+        _capabilities_codegen(["root"]),
+        science_runner_one_txt_file,
+        tmp_path,
+        "http://localhost:5000",
+    )
+    transform_request = TransformRequest(
+        **{
+            "selection": "dummy_selection",
+            "file-list": ["input_file.root"],
+            "result_format": ResultFormat.parquet,
+            "result_destination": ResultDestination.volume,
+            "codegen": "dummy",
+        }
+    )
+
+    with pytest.raises(ValueError, match="cannot write parquet"):
+        await adaptor.submit_transform(transform_request)
+
+
+def test_adaptor_suggest_memory_limit(tmp_path):
+    "The suggestion covers the largest peak in any of the cache's event logs."
+    from servicex_local.events import EventLog
+    from servicex_local.science_images import FileResult
+
+    adaptor = SXLocalAdaptor(MagicMock(), MagicMock(), tmp_path, "http://localhost:5000")
+    assert adaptor.suggest_memory_limit() is None
+
+    now = datetime.now()
+    for request_id, peak in [("a", 1 << 30), ("b", 3 << 30)]:
+        EventLog(adaptor._events_path(request_id)).file_done(
+            FileResult("in.root", None, now, now, peak_rss=peak)
+        )
+
+    assert adaptor.suggest_memory_limit() == 4.0
+    assert adaptor.suggest_memory_limit(headroom=1.0) == 3.0
+
+
+@pytest.mark.asyncio
+async def test_adaptor_metrics(tmp_path, code_gen_one_file, science_runner_one_txt_file):
+    "A request is counted, and leaves no files pending once it is done."
+    from servicex_local import metrics
+
+    adaptor = SXLocalAdaptor(
+        code_gen_one_file, science_runner_one_txt_file, tmp_path, "http://localhost:5000"
+    )
+    complete = metrics.REQUESTS.value(status="complete")
+    pending = metrics.FILES_PENDING.value()
+
+    await adaptor.submit_transform(
+        TransformRequest(
+            **{
+                "selection": "dummy_selection",
+                "file-list": ["a.root", "b.root"],
+                "result_format": ResultFormat.root_ttree,
+                "result_destination": ResultDestination.volume,
+                "codegen": "dummy",
+            }
+        )
+    )
+
+    assert metrics.REQUESTS.value(status="complete") == complete + 1
+    assert metrics.FILES_PENDING.value() == pending
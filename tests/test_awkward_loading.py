@@ -0,0 +1,134 @@
+import awkward as ak
+import numpy as np
+import pytest
+import uproot
+
+from servicex_local.awkward_loading import (
+    ChunkedSample,
+    ParallelAwkConverter,
+    lazy_awk,
+    load_file,
+    parallel_awk,
+)
+
+
+@pytest.fixture
+def root_files(tmp_path):
+    "Two ROOT files, each with 100 entries in a tree called 'atlas_xaod_tree'."
+    paths = []
+    for i in range(2):
+        path = tmp_path / f"output_{i}.root"
+        with uproot.create(path) as file:
+            file.mktree("atlas_xaod_tree", {"jet_pt": "float64", "jet_eta": "float64"})
+            file["atlas_xaod_tree"].extend(
+                {"jet_pt": np.arange(100) + 100.0 * i, "jet_eta": np.zeros(100)}
+            )
+        paths.append(path)
+    return paths
+
+
+def test_chunked_sample_step_size(root_files):
+    "ROOT files are split into chunks of step_size entries, in file order."
+    sample = ChunkedSample(root_files, step_size=30)
+
+    chunks = list(sample)
+
+    assert [len(c) for c in chunks] == [30, 30, 30, 10] * 2
+    jet_pt = ak.concatenate([c.jet_pt for c in chunks])
+    assert ak.to_list(jet_pt) == list(np.arange(200.0))
+
+
+def test_chunked_sample_columns(root_files):
+    "Only the requested columns are read."
+    sample = ChunkedSample(root_files, columns=["jet_pt"], step_size=1000)
+
+    chunk = next(iter(sample))
+
+    assert chunk.fields == ["jet_pt"]
+
+
+def test_chunked_sample_reiterable(root_files):
+    "Each iteration re-reads the files from the start."
+    sample = ChunkedSample(root_files, step_size=50)
+
+    assert len(list(sample)) == len(list(sample)) == 4
+
+
+def test_chunked_sample_iter_files(root_files):
+    "iter_files gives one chunk iterator per file."
+    sample = ChunkedSample(root_files, step_size=1000)
+
+    per_file = [list(chunks) for chunks in sample.iter_files()]
+
+    assert [len(chunks) for chunks in per_file] == [1, 1]
+    assert ak.to_list(per_file[1][0].jet_pt[:2]) == [100.0, 101.0]
+
+
+def test_chunked_sample_no_tree(tmp_path):
+    "A ROOT file without a tree is reported when iterated."
+    path = tmp_path / "empty.root"
+    with uproot.recreate(path) as file:
+        file["hist_name"] = "not a tree"
+
+    with pytest.raises(RuntimeError, match="No TTree or RNTuple"):
+        list(ChunkedSample([path]))
+
+
+def test_lazy_awk(root_files):
+    "lazy_awk wraps each sample without reading anything."
+    result = lazy_awk(
+        {"MySample": root_files, "Other": root_files[:1]}, columns=["jet_eta"], step_size=10
+    )
+
+    assert set(result) == {"MySample", "Other"}
+    assert result["Other"].files == [str(root_files[0])]
+    assert result["MySample"].columns == ["jet_eta"]
+    assert sum(len(c) for c in result["Other"]) == 100
+
+
+def test_load_file(root_files):
+    "load_file reads a whole ROOT file, optionally projecting columns."
+    array = load_file(root_files[1], columns=["jet_pt"])
+
+    assert array.fields == ["jet_pt"]
+    assert len(array) == 100
+    assert array.jet_pt[0] == 100.0
+
+
+def test_parallel_awk_concatenates_in_file_order(root_files):
+    "Files are converted in parallel and concatenated per sample in order."
+    result = parallel_awk(
+        {"MySample": root_files, "Reversed": root_files[::-1]}, max_workers=4
+    )
+
+    assert ak.to_list(result["MySample"].jet_pt) == list(np.arange(200.0))
+    assert ak.to_list(result["Reversed"].jet_pt[:2]) == [100.0, 101.0]
+    assert len(result["Reversed"]) == 200
+
+
+def test_parallel_awk_empty_sample():
+    "A sample without files is an error, as with to_awk."
+    with pytest.raises(RuntimeError, match="empty"):
+        parallel_awk({"MySample": []}, max_workers=2)
+
+
+def test_parallel_awk_converter_reports_errors(tmp_path):
+    "A file that cannot be read fails results()."
+    bad = tmp_path / "bad.root"
+    bad.write_text("not a root file")
+
+    with ParallelAwkConverter(max_workers=2) as converter:
+        converter.submit("MySample", [bad])
+        with pytest.raises(Exception):
+            converter.results()
+
+
+def test_parallel_awk_converter_results_order(root_files):
+    "results(order=...) returns the samples in that order, not submit order."
+    with ParallelAwkConverter(max_workers=2) as converter:
+        converter.submit("Second", root_files[1:])
+        converter.submit("First", root_files[:1])
+        result = converter.results(order=["First", "Second"])
+
+    assert list(result) == ["First", "Second"]
+    assert result["First"].jet_pt[0] == 0.0
@@ -0,0 +1,333 @@
+"""Benchmarks of the local deliver overhead.
+
+These drive ``deliver_async`` through a real ``SXLocalAdaptor`` with either a
+science image that does no work (so only our own overhead is measured) or the
+raw generated payloads run as host subprocesses. Each case is run with a cold
+cache and then again with a warm one, and records the time of every stage,
+and the process RSS sampled at the start and end of its spans.
+
+They only run with ``--benchmark``. Add ``--benchmark-output=<file>`` to
+append the results, one JSON object per case, for comparing between releases.
+"""
+
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import threading
+import timeit
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import pytest
+from servicex import General, Sample, ServiceXSpec, dataset
+
+from servicex_local.adaptor import SXLocalAdaptor
+from servicex_local.codegen import SXCodeGen
+from servicex_local.deliver import deliver_async
+from servicex_local.log_rules import LogRules
+from servicex_local.science_images import (
+    BaseScienceImage,
+    FileResult,
+    LocalProcessScienceImage,
+    output_file_name,
+    run_command_with_logging,
+)
+from servicex_local.timing import Timings
+
+_PAYLOAD = Path(__file__).parent / "genfiles_raw" / "query2_bash"
+
+
+@pytest.fixture(autouse=True)
+def benchmarks_only(request):
+    if not request.config.getoption("--benchmark"):
+        pytest.skip("Use the --benchmark pytest flag to run this test")
+
+
+def _rss_mb() -> Optional[float]:
+    "Resident set size of this process right now, in MB (None off Linux)"
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except OSError:
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") / (1 << 20)
+
+
+class _RSSTimings(Timings):
+    """Also samples the process RSS at the start and end of each span.
+
+    This is the RSS of the whole process at those moments, not of the stage:
+    stages overlap, and memory allocated between samples and freed again is
+    missed. ``rss`` is the largest sample per stage, and ``rss_growth`` the
+    largest rise over a single span of the stage.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.rss: Dict[str, float] = {}
+        self.rss_growth: Dict[str, float] = {}
+
+    def _sample_rss(self, stage: str, start_rss: Optional[float] = None) -> None:
+        rss = _rss_mb()
+        if rss is None:
+            return
+        with self._lock:
+            self.rss[stage] = max(self.rss.get(stage, 0.0), rss, start_rss or 0.0)
+            if start_rss is not None:
+                self.rss_growth[stage] = max(
+                    self.rss_growth.get(stage, 0.0), rss - start_rss
+                )
+
+    @contextmanager
+    def span(self, stage, sample=None, item=None):
+        start_rss = _rss_mb()
+        start = datetime.now()
+        try:
+            yield
+        finally:
+            super().record(stage, start, datetime.now(), sample, item)
+            self._sample_rss(stage, start_rss)
+
+    def record(self, stage, start, end, sample=None, item=None) -> None:
+        "A span recorded after the fact only gets its end sampled"
+        super().record(stage, start, end, sample, item)
+        self._sample_rss(stage)
+
+
+class _PayloadCodegen(SXCodeGen):
+    "Hands out the raw generated payload whatever the query"
+
+    def gen_code(
+        self,
+        query: str,
+        directory: Path,
+        transformer_capabilities_file: Optional[Path] = None,
+    ) -> Path:
+        shutil.copytree(_PAYLOAD, directory, dirs_exist_ok=True)
+        return directory
+
+
+class _NoOpScienceImage(BaseScienceImage):
+    "Writes an empty output for each input, without running anything"
+
+    def transform(
+        self,
+        generated_files_dir: Path,
+        input_files: List[str],
+        output_directory: Path,
+        output_format: str,
+        on_file_done: Optional[Callable[[FileResult], None]] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> List[Path]:
+        def run_one(input_file: str, result: FileResult) -> Path:
+            output_file = output_directory / output_file_name(input_file, output_format)
+            output_file.touch()
+            return output_file
+
+        return self._run_files(input_files, run_one, on_file_done, cancel)
+
+
+def _spec(input_dir: Path, n_samples: int, n_files: int) -> ServiceXSpec:
+    "A spec of ``n_samples`` samples, each over its own ``n_files`` input files"
+    samples = []
+    for s in range(n_samples):
+        files = []
+        for f in range(n_files):
+            path = input_dir / f"sample{s:03d}_file{f:04d}.root"
+            path.touch()
+            files.append(str(path))
+        samples.append(
+            Sample(Name=f"sample{s:03d}", Dataset=dataset.FileList(files), Query="q")
+        )
+    return ServiceXSpec(General=General(), Sample=samples)
+
+
+def _record(request, case: dict) -> None:
+    output = request.config.getoption("--benchmark-output")
+    if output:
+        with open(output, "a") as f:
+            f.write(json.dumps(case) + "\n")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "image, n_samples, n_files",
+    [
+        ("noop", 1, 1),
+        ("noop", 1, 100),
+        ("noop", 1, 1000),
+        ("noop", 10, 100),
+        ("noop", 50, 20),
+        ("payload", 1, 1),
+        ("payload", 1, 100),
+        ("payload", 10, 10),
+    ],
+)
+async def test_benchmark_deliver(request, tmp_path, image, n_samples, n_files):
+    input_dir = tmp_path / "inputs"
+    input_dir.mkdir()
+    spec = _spec(input_dir, n_samples, n_files)
+
+    runner = _NoOpScienceImage() if image == "noop" else LocalProcessScienceImage()
+    runner.max_workers = 4
+    adaptor = SXLocalAdaptor(
+        _PayloadCodegen(),
+        runner,
+        tmp_path / "cache",
+        "http://localhost:5001",
+        output_dir=tmp_path / "outputs",
+    )
+
+    for cache in ["cold", "warm"]:
+        timings = _RSSTimings()
+        r = await deliver_async(
+            spec,
+            adaptor,
+            display_progress=False,
+            concurrency=min(n_samples, 4),
+            timings=timings,
+        )
+
+        assert r is not None
+        assert sum(len(files) for files in r.values()) == n_samples * n_files
+
+        stages = {
+            stage: {
+                "count": s.count,
+                "total": s.total,
+                "mean": s.mean,
+                "max": s.max,
+                "rss_mb": timings.rss.get(stage),
+                "rss_growth_mb": timings.rss_growth.get(stage),
+            }
+            for stage, s in timings.summary().items()
+        }
+        _record(
+            request,
+            {
+                "image": image,
+                "samples": n_samples,
+                "files": n_files,
+                "cache": cache,
+                "stages": stages,
+            },
+        )
+        print(f"\n{image} {n_samples}x{n_files} ({cache} cache)\n{timings.report()}")
+
+    # The warm run is served from the cache, so never reaches the transform
+    assert "transform" not in stages
+
+
+def _baseline_levels(lines: List[str], suppress_patterns: List[str]) -> None:
+    "The lower()/in checks science image output was classified with before LogRules"
+    patterns = [p.lower() for p in suppress_patterns]
+    for line in lines:
+        line_lower = line.lower()
+        if any(p in line_lower for p in patterns):
+            pass
+        elif "error" in line_lower:
+            pass
+        elif "warning" in line_lower:
+            pass
+
+
+@pytest.mark.parametrize("n_rules", [0, 20])
+def test_benchmark_log_rules(n_rules):
+    "Classifying a line is no slower than the checks LogRules replaced"
+    lines = [f"Processing event {i} of run 284500, 12 jets found" for i in range(20000)]
+    lines[::100] = ["WARNING: a warning"] * len(lines[::100])
+    rules = LogRules({f"benign message {i}": "DEBUG" for i in range(n_rules)})
+
+    def with_rules():
+        for line in lines:
+            rules.level(line)
+
+    new = min(timeit.repeat(with_rules, number=1, repeat=5))
+    baseline = min(
+        timeit.repeat(
+            lambda: _baseline_levels(lines, list(rules.rules)), number=1, repeat=5
+        )
+    )
+    print(f"\nlog rules ({n_rules} configured): {new:.4f}s, baseline {baseline:.4f}s")
+    # Some slack for timing noise
+    assert new <= baseline * 1.2
+
+
+def _per_rule_levels(lines: List[str], rules: LogRules) -> None:
+    "Checking each line against the rules one by one, until one matches"
+    regexes = [re.compile(p, re.IGNORECASE) for p in [*rules.rules, "error", "warning"]]
+    for line in lines:
+        for regex in regexes:
+            if regex.search(line):
+                break
+
+
+def test_benchmark_many_log_rules():
+    "With many rules, one search per line beats checking the rules in turn"
+    lines = [f"Processing event {i} of run 284500, 12 jets found" for i in range(20000)]
+    lines[::100] = ["WARNING: a warning"] * len(lines[::100])
+    rules = LogRules(
+        {
+            **{f"benign message {i}": "DEBUG" for i in range(50)},
+            **{rf"retrying transfer {i} after \d+ s": "INFO" for i in range(50)},
+        }
+    )
+
+    def with_rules():
+        for line in lines:
+            rules.level(line)
+
+    new = min(timeit.repeat(with_rules, number=1, repeat=5))
+    baseline = min(timeit.repeat(lambda: _per_rule_levels(lines, rules), number=1, repeat=5))
+    print(f"\nlog rules (100 configured): {new:.4f}s, one by one {baseline:.4f}s")
+    assert new * 3 <= baseline
+
+
+def _baseline_transcript(command: List[str], log_file: Path) -> None:
+    """What running a command cost before the log pipeline: each line written
+    to a buffered file, classified and sent to the logger"""
+    logger = logging.getLogger("servicex_local.science_images")
+    rules = LogRules()
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True, bufsize=1)
+    assert process.stdout is not None
+    with open(log_file, "a", buffering=1 << 16) as f:
+        for line in iter(process.stdout.readline, ""):
+            stripped_line = line.strip()
+            f.write(stripped_line + "\n")
+            logger.log(rules.level(stripped_line), stripped_line)
+    process.wait()
+
+
+@pytest.mark.skipif(shutil.which("seq") is None, reason="Needs the seq command")
+@pytest.mark.parametrize("run_name", [None, "run1"])
+def test_benchmark_command_transcript(tmp_path, run_name):
+    "Logging a chatty command's output costs little over copying it to a file"
+    command = ["seq", "1", "300000"]
+
+    baseline = min(
+        timeit.repeat(
+            lambda: _baseline_transcript(command, tmp_path / "baseline.log"),
+            number=1,
+            repeat=3,
+        )
+    )
+    elapsed = min(
+        timeit.repeat(
+            lambda: run_command_with_logging(
+                command, tmp_path / "run.log", run_name=run_name
+            ),
+            number=1,
+            repeat=3,
+        )
+    )
+
+    print(f"\ntranscript ({run_name}): {elapsed:.2f}s, baseline {baseline:.2f}s")
+    assert len((tmp_path / "run.log").read_text().splitlines()) == 3 * 300001
+    # The writer thread shares the GIL, and the timings are noisy; a line at a
+    # time through the logging machinery was 10-25x
+    assert elapsed <= baseline * 2
@@ -1,5 +1,7 @@
 import getpass
 import logging
+import pstats
+import sys
 import tempfile
 import uuid
 from datetime import datetime
@@ -7,6 +9,7 @@ from pathlib import Path
 from unittest.mock import patch
 from unittest.mock import MagicMock
 
+import awkward as ak
 import pytest
 from servicex import General, Sample, ServiceXSpec, dataset
 from servicex.models import (
@@ -17,13 +20,16 @@ from servicex.models import (
     TransformStatus,
 )
 
-from servicex_local import local_deliver
-from servicex_local.configurations import Config
+from servicex_local import local_deliver, metrics
+from servicex_local.awkward_loading import ChunkedSample
+from servicex_local.configurations import Config, xAODConfig
+from servicex_local.timing import Timings
 from servicex_local.deliver import deliver, install_sx_local, Platform
 
 from servicex_local.science_images import (
     DockerScienceImage,
     SingularityScienceImage,
+    LocalProcessScienceImage,
     WSL2ScienceImage,
 )
 
@@ -130,9 +136,14 @@ def fake_install(tmp_path):
     adaptor = _make_adaptor(tmp_path)
     captured: dict = {}
 
-    def fake_install_sx_local(image, platform):
+    def fake_install_sx_local(
+        image, platform, output_dir=None, log_rules=None, sample_resources=False
+    ):
         captured["image"] = image
         captured["platform"] = platform
+        captured["output_dir"] = output_dir
+        captured["log_rules"] = log_rules
+        captured["sample_resources"] = sample_resources
         return adaptor
 
     with patch(
@@ -220,6 +231,54 @@ def test_local_deliver_awk_true_returns_awk_for_mysample(fake_install):
     assert mock_to_awk.call_count == 1
 
 
+def test_local_deliver_awk_workers_converts_in_parallel(fake_install):
+    "awk_workers > 1 converts the files on a pool instead of calling to_awk."
+    config = Config(version="25.2.41", awk=True, awk_workers=4)
+
+    with patch("servicex_local.deliver.to_awk") as mock_to_awk, patch(
+        "servicex_local.awkward_loading.load_file", return_value=ak.Array([1, 2])
+    ) as mock_load:
+        r = local_deliver(_spec(), config, display_progress=False)
+
+    assert ak.to_list(r) == [1, 2]
+    assert mock_load.call_count == 1
+    mock_to_awk.assert_not_called()
+
+
+def test_local_deliver_awk_columns_without_workers(fake_install):
+    "awk_columns selects columns on the in-memory path too, not only with workers."
+    config = Config(version="25.2.41", awk=True, awk_columns=["jet_pt"])
+
+    with patch("servicex_local.deliver.to_awk") as mock_to_awk, patch(
+        "servicex_local.awkward_loading.load_file", return_value=ak.Array([1, 2])
+    ) as mock_load:
+        r = local_deliver(_spec(), config, display_progress=False)
+
+    assert ak.to_list(r) == [1, 2]
+    assert mock_load.call_args.args[1] == ["jet_pt"]
+    mock_to_awk.assert_not_called()
+
+
+def test_local_deliver_awk_lazy_returns_chunked_sample(fake_install):
+    "awk_lazy=True wraps the files in a ChunkedSample and never calls to_awk."
+    config = Config(
+        version="25.2.41",
+        awk=True,
+        awk_lazy=True,
+        awk_columns=["jet_pt"],
+        awk_step_size=1000,
+    )
+
+    with patch("servicex_local.deliver.to_awk") as mock_to_awk:
+        r = local_deliver(_spec(), config, display_progress=False)
+
+    assert isinstance(r, ChunkedSample)
+    assert len(r.files) == 1
+    assert r.columns == ["jet_pt"]
+    assert r.step_size == 1000
+    mock_to_awk.assert_not_called()
+
+
 def _basic_spec() -> ServiceXSpec:
     return ServiceXSpec(
         General=General(),
@@ -252,17 +311,286 @@ def test_deliver_warns_for_multiple_ignored_kwargs(simple_adaptor, caplog):
             _basic_spec(),
             adaptor=simple_adaptor,
             progress_bar="compact",
-            concurrency=4,
+            return_exceptions=True,
             servicex_name="prod",
         )
 
     warnings = [r for r in caplog.records if r.levelno == logging.WARNING]
     assert len(warnings) == 1
     msg = warnings[0].getMessage()
-    for name in ("progress_bar", "concurrency", "servicex_name"):
+    for name in ("progress_bar", "return_exceptions", "servicex_name"):
         assert name in msg
 
 
+def test_deliver_concurrency_is_not_ignored(simple_adaptor, caplog):
+    "concurrency is honoured, so it must not show up in the ignored warning."
+    with caplog.at_level(logging.WARNING, logger="servicex_local.deliver"):
+        deliver(_basic_spec(), adaptor=simple_adaptor, concurrency=4)
+
+    assert not [r for r in caplog.records if r.levelno == logging.WARNING]
+
+
+def test_deliver_concurrency_must_be_positive(simple_adaptor):
+    with pytest.raises(ValueError, match="concurrency"):
+        deliver(_basic_spec(), adaptor=simple_adaptor, concurrency=0)
+
+
+class _SlowAdaptor:
+    "Adaptor whose transforms take a while, recording how many overlap."
+
+    def __init__(self, cache_dir: Path, delays: dict):
+        self.cache_dir = cache_dir
+        self.delays = delays
+        self.running = 0
+        self.max_running = 0
+        self._titles: dict = {}
+
+    async def submit_transform(self, tq: TransformRequest) -> str:
+        import asyncio
+
+        request_id = str(uuid.uuid4())
+        self._titles[request_id] = tq.title
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(self.delays[tq.title])
+        self.running -= 1
+
+        output = (
+            Path(tempfile.gettempdir())
+            / f"servicex_{getpass.getuser()}"
+            / request_id
+            / f"{tq.title}.root"
+        )
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.touch()
+        return request_id
+
+    async def get_transform_status(self, request_id: str):
+        return TransformStatus(
+            **{
+                "did": "file1",
+                "did_id": 0,
+                "selection": "q",
+                "request_id": request_id,
+                "status": Status.complete,
+                "tree-name": "my-tree",
+                "image": "doit",
+                "result-destination": ResultDestination.object_store,
+                "result-format": ResultFormat.root_ttree,
+                "files-completed": 1,
+                "files-failed": 0,
+                "files-remaining": 0,
+                "files": 1,
+                "app-version": "this",
+                "generated-code-cm": "this",
+                "submit-time": datetime.now(),
+            }
+        )
+
+
+def _multi_sample_spec(names) -> ServiceXSpec:
+    return ServiceXSpec(
+        General=General(),
+        Sample=[
+            Sample(
+                Name=n,
+                Dataset=dataset.FileList(f"{n}.root"),
+                Query="query1",
+            )
+            for n in names
+        ],
+    )
+
+
+@pytest.mark.parametrize("concurrency, expected_max", [(1, 1), (2, 2), (10, 3)])
+def test_deliver_concurrency_limits_running_samples(
+    tmp_path, concurrency, expected_max
+):
+    "No more than concurrency samples are transformed at the same time."
+    adaptor = _SlowAdaptor(tmp_path, {"a": 0.05, "b": 0.05, "c": 0.05})
+
+    deliver(
+        _multi_sample_spec(["a", "b", "c"]),
+        adaptor=adaptor,
+        display_progress=False,
+        concurrency=concurrency,
+    )
+
+    assert adaptor.max_running == expected_max
+
+
+@pytest.mark.parametrize("concurrency", [1, 4])
+def test_share_file_slots_keeps_image_workers(concurrency):
+    "The deliver's budget is a slot per file; each image keeps its own pool size"
+    from types import SimpleNamespace
+
+    from servicex_local.deliver import _share_file_slots
+
+    docker = DockerScienceImage("image:tag", max_workers=8)
+    wsl2 = WSL2ScienceImage("al9_atlas", "22.2.107")
+    for runner in [docker, wsl2]:
+        _share_file_slots(SimpleNamespace(science_runner=runner), concurrency)
+        assert runner.file_slots is not None
+
+    assert docker.max_workers == 8
+    assert wsl2.max_workers == 1
+    with pytest.raises(ValueError, match="one file at a time"):
+        wsl2.max_workers = concurrency + 1
+
+
+def test_deliver_failure_waits_for_running_sample(tmp_path):
+    "A sample running when another fails keeps its generated files until it stops"
+    import time
+
+    from servicex_local.adaptor import SXLocalAdaptor
+    from servicex_local.events import EventLog
+    from servicex_local.science_images import BaseScienceImage
+
+    class _Runner(BaseScienceImage):
+        def __init__(self):
+            self.runs = []
+
+        def transform(
+            self, generated_files_dir, input_files, output_directory, output_format,
+            on_file_done=None, cancel=None,
+        ):
+            def run_one(input_file, result):
+                if "bad" in input_file:
+                    time.sleep(0.05)
+                    raise RuntimeError("bad input")
+                time.sleep(0.3)
+                self.runs.append(generated_files_dir.exists())
+                output = output_directory / Path(input_file).name
+                output.touch()
+                return output
+
+            return self._run_files(input_files, run_one, on_file_done, cancel)
+
+    def gen_code(query, directory):
+        (directory / "run_me.sh").write_text("echo hi")
+        return directory / "run_me.sh"
+
+    runner = _Runner()
+    adaptor = SXLocalAdaptor(
+        MagicMock(gen_code=gen_code), runner, tmp_path / "cache", "http://localhost:5000"
+    )
+    spec = ServiceXSpec(
+        General=General(),
+        Sample=[
+            Sample(Name="bad", Dataset=dataset.FileList(["bad.root"]), Query="q"),
+            Sample(
+                Name="good",
+                Dataset=dataset.FileList([f"good{i}.root" for i in range(5)]),
+                Query="q",
+            ),
+        ],
+    )
+    pending = metrics.FILES_PENDING.value()
+
+    with pytest.raises(RuntimeError, match="bad input"):
+        deliver(spec, adaptor=adaptor, display_progress=False, concurrency=2)
+
+    # The good sample stopped after its running file, with its files in place
+    assert runner.runs == [True]
+    assert metrics.FILES_PENDING.value() == pending
+    ends = [
+        e["status"]
+        for log in (adaptor.cache_dir / "events").glob("*.jsonl")
+        for e in EventLog.read(log)
+        if e["event"] == "request_end"
+    ]
+    assert sorted(ends) == ["cancelled", "failed"]
+
+
+@pytest.mark.parametrize("second_output_dir", ["other", None])
+def test_deliver_resume_keeps_first_output_dir(tmp_path, second_output_dir):
+    "A resumed request returns its outputs from the directory it started in"
+    from servicex_local.adaptor import SXLocalAdaptor
+    from servicex_local.science_images import BaseScienceImage
+
+    failing = {"b.root"}
+
+    class _Runner(BaseScienceImage):
+        def transform(
+            self, generated_files_dir, input_files, output_directory, output_format,
+            on_file_done=None, cancel=None,
+        ):
+            def run_one(input_file, result):
+                if input_file in failing:
+                    raise RuntimeError("bad input")
+                output = output_directory / input_file
+                output.touch()
+                return output
+
+            return self._run_files(input_files, run_one, on_file_done, cancel)
+
+    def gen_code(query, directory):
+        (directory / "run_me.sh").write_text("echo hi")
+        return directory / "run_me.sh"
+
+    def adaptor(output_dir):
+        return SXLocalAdaptor(
+            MagicMock(gen_code=gen_code),
+            _Runner(),
+            tmp_path / "cache",
+            "http://localhost:5000",
+            output_dir=output_dir,
+        )
+
+    spec = ServiceXSpec(
+        General=General(),
+        Sample=[
+            Sample(Name="s", Dataset=dataset.FileList(["a.root", "b.root"]), Query="q")
+        ],
+    )
+
+    with pytest.raises(RuntimeError, match="bad input"):
+        deliver(spec, adaptor=adaptor(tmp_path / "first"), display_progress=False)
+
+    failing.clear()
+    second = tmp_path / second_output_dir if second_output_dir else None
+    r = deliver(spec, adaptor=adaptor(second), display_progress=False)
+
+    assert r is not None
+    assert sorted(Path(f).name for f in r["s"]) == ["a.root", "b.root"]
+    assert all(Path(f).parent.parent == tmp_path / "first" for f in r["s"])
+
+
+def test_deliver_concurrent_results_keep_spec_order(tmp_path):
+    "Results are keyed by sample title in spec order, whatever finishes first."
+    adaptor = _SlowAdaptor(tmp_path, {"slow": 0.1, "fast": 0.0, "medium": 0.05})
+
+    r = deliver(
+        _multi_sample_spec(["slow", "fast", "medium"]),
+        adaptor=adaptor,
+        display_progress=False,
+        concurrency=3,
+    )
+
+    assert r is not None
+    assert list(r.keys()) == ["slow", "fast", "medium"]
+    for name, files in r.items():
+        assert [Path(f).name for f in files] == [f"{name}.root"]
+
+
+def test_deliver_on_sample_done_in_completion_order(tmp_path):
+    "on_sample_done sees each sample's files as soon as they are collected."
+    adaptor = _SlowAdaptor(tmp_path, {"slow": 0.1, "fast": 0.0})
+    seen = []
+
+    r = deliver(
+        _multi_sample_spec(["slow", "fast"]),
+        adaptor=adaptor,
+        display_progress=False,
+        concurrency=2,
+        on_sample_done=lambda title, files: seen.append((title, list(files))),
+    )
+
+    assert r is not None
+    assert [title for title, _ in seen] == ["fast", "slow"]
+    assert dict(seen) == {k: list(v) for k, v in r.items()}
+
+
 def test_deliver_no_warning_when_no_extra_kwargs(simple_adaptor, caplog):
     "No warning when only supported arguments are passed."
     with caplog.at_level(logging.WARNING, logger="servicex_local.deliver"):
@@ -293,6 +621,20 @@ def test_local_deliver_ignore_cache_false_uses_cache(fake_install):
     assert adaptor.submit_called == 1
 
 
+def test_local_deliver_counts_cache_lookups(fake_install):
+    "Cache hits and misses are counted in the metrics."
+    config = Config(version="25.2.41")
+    hits = metrics.CACHE_LOOKUPS.value(result="hit")
+    misses = metrics.CACHE_LOOKUPS.value(result="miss")
+
+    local_deliver(_spec(), config, display_progress=False)
+    local_deliver(_spec(), config, display_progress=False)
+
+    assert metrics.CACHE_LOOKUPS.value(result="miss") == misses + 1
+    assert metrics.CACHE_LOOKUPS.value(result="hit") == hits + 1
+    assert metrics.CODEGEN_SECONDS.count() >= 1
+
+
 @pytest.fixture(autouse=True)
 def restore_root_logger():
     "Snapshot and restore the root logger's level + handlers around every test."
@@ -333,11 +675,305 @@ def test_local_deliver_applies_logging_level_over_existing_handlers(
     assert root.level == logging.DEBUG
 
 
+class _StagedAdaptor(_SlowAdaptor):
+    "Adaptor with separate codegen and transform steps that logs their order."
+
+    def __init__(self, cache_dir: Path, fail_title=None):
+        super().__init__(cache_dir, {})
+        self.events: list = []
+        self.fail_title = fail_title
+
+    async def prepare_transform(self, tq: TransformRequest):
+        from servicex_local.adaptor import PreparedTransform
+
+        self.events.append(("codegen", tq.title))
+        generated = Path(tempfile.mkdtemp())
+        return PreparedTransform(str(uuid.uuid4()), tq, generated)
+
+    async def run_prepared_transform(self, prepared) -> str:
+        import asyncio
+
+        title = prepared.transform_request.title
+        self.events.append(("transform-start", title))
+        await asyncio.sleep(0.05)
+        if title == self.fail_title:
+            raise RuntimeError(f"transform of {title} failed")
+        self.events.append(("transform-end", title))
+
+        output = (
+            Path(tempfile.gettempdir())
+            / f"servicex_{getpass.getuser()}"
+            / prepared.request_id
+            / f"{title}.root"
+        )
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.touch()
+        return prepared.request_id
+
+
+def test_deliver_records_stage_timings(tmp_path):
+    "Each stage of each sample is recorded as a span."
+    adaptor = _StagedAdaptor(tmp_path)
+    timings = Timings()
+
+    deliver(
+        _multi_sample_spec(["a", "b"]),
+        adaptor=adaptor,
+        display_progress=False,
+        timings=timings,
+    )
+
+    spans = {(s.stage, s.sample) for s in timings.spans}
+    for title in ("a", "b"):
+        for stage in ("codegen", "transform", "copy", "collect"):
+            assert (stage, title) in spans
+    assert ("deliver", None) in spans
+    assert timings.summary()["transform"].total >= 0.1
+
+
+def test_local_deliver_logs_timing_report(fake_install):
+    "local_deliver logs a timing summary and fills in the caller's Timings."
+    timings = Timings()
+    config = Config(version="25.2.41", awk=True)
+
+    # local_deliver resets the logging handlers, so watch the logger directly
+    with patch("servicex_local.deliver.to_awk", return_value={"MySample": 1}), patch(
+        "servicex_local.deliver.logger"
+    ) as mock_logger:
+        local_deliver(_spec(), config, display_progress=False, timings=timings)
+
+    assert {"transform", "collect", "to_awk", "deliver"} <= set(timings.summary())
+    (call,) = [
+        c for c in mock_logger.info.call_args_list if "Timing summary" in c.args[0]
+    ]
+    assert "to_awk" in call.args[1]
+
+
+def test_local_deliver_profile(fake_install, tmp_path):
+    "With profile set, the deliver, including its event loop thread, is profiled."
+    config = Config(version="25.2.41", profile=True)
+
+    local_deliver(_spec(), config, display_progress=False)
+
+    (profile,) = (tmp_path / "profiles").glob("deliver_*.prof")
+    functions = {name for _, _, name in pstats.Stats(str(profile)).stats}
+    assert "deliver_async" in functions
+
+
+def test_local_deliver_no_profile_by_default(fake_install, tmp_path):
+    local_deliver(_spec(), Config(version="25.2.41"), display_progress=False)
+
+    assert not (tmp_path / "profiles").exists()
+
+
+def test_deliver_pipeline_overlaps_codegen_and_transform(tmp_path):
+    "Code for the next sample is generated while the previous one transforms."
+    adaptor = _StagedAdaptor(tmp_path)
+
+    r = deliver(
+        _multi_sample_spec(["a", "b", "c"]),
+        adaptor=adaptor,
+        display_progress=False,
+        concurrency=1,
+    )
+
+    assert r is not None
+    assert list(r.keys()) == ["a", "b", "c"]
+    events = adaptor.events
+    assert events.index(("codegen", "b")) < events.index(("transform-end", "a"))
+    # With one transform worker the transforms themselves never overlap.
+    assert events.index(("transform-end", "a")) < events.index(("transform-start", "b"))
+
+
+def test_deliver_pipeline_transform_failure_raises(tmp_path):
+    "A failed transform stops the pipeline and is raised to the caller."
+    adaptor = _StagedAdaptor(tmp_path, fail_title="b")
+
+    with pytest.raises(RuntimeError, match="transform of b failed"):
+        deliver(
+            _multi_sample_spec(["a", "b", "c"]),
+            adaptor=adaptor,
+            display_progress=False,
+            concurrency=1,
+        )
+
+    assert ("transform-end", "c") not in adaptor.events
+
+
+class _OutputDirAdaptor(_SlowAdaptor):
+    "Adaptor that writes its outputs under a user chosen output_dir."
+
+    def __init__(self, cache_dir: Path, output_dir: Path):
+        super().__init__(cache_dir, {})
+        self.output_dir = output_dir
+        self.submit_called = 0
+
+    async def submit_transform(self, tq: TransformRequest) -> str:
+        request_id = str(uuid.uuid4())
+        output = self.output_dir / request_id / f"{tq.title}.root"
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text("data")
+        self.submit_called += 1
+        return request_id
+
+
+def test_deliver_output_dir_skips_copy(tmp_path):
+    "Outputs written to output_dir are returned in place, not copied to the cache."
+    adaptor = _OutputDirAdaptor(tmp_path / "cache", tmp_path / "outputs")
+
+    r = deliver(_multi_sample_spec(["a"]), adaptor=adaptor, display_progress=False)
+
+    assert r is not None
+    (file_path,) = r["a"]
+    assert Path(file_path).parent.parent == tmp_path / "outputs"
+    assert not any(p.is_dir() for p in (tmp_path / "cache").iterdir())
+
+    # A cache hit still finds the files in the output directory.
+    r2 = deliver(_multi_sample_spec(["a"]), adaptor=adaptor, display_progress=False)
+    assert r2 is not None
+    assert list(r2["a"]) == [file_path]
+    assert adaptor.submit_called == 1
+
+
+def test_local_deliver_passes_output_dir(fake_install, tmp_path):
+    "Config.output_dir is handed to install_sx_local."
+    _, captured = fake_install
+    config = Config(version="25.2.41", output_dir=str(tmp_path / "out"))
+
+    local_deliver(_spec(), config, display_progress=False)
+
+    assert captured["output_dir"] == str(tmp_path / "out")
+
+
+def test_install_sx_local_output_dir(tmp_path):
+    adaptor = install_sx_local(
+        "sslhep/servicex_func_adl_xaod_transformer:25.2.41",
+        Platform.docker,
+        output_dir=tmp_path / "out",
+    )
+    assert adaptor.output_dir == (tmp_path / "out").resolve()
+
+
+def test_install_sx_local_log_rules():
+    "Configured log rules are compiled onto the science image."
+    adaptor = install_sx_local(
+        "sslhep/servicex_func_adl_xaod_transformer:25.2.41",
+        Platform.docker,
+        log_rules={r"Error in <TFile::ReadBuffer>": "INFO"},
+    )
+    rules = adaptor.science_runner.log_rules
+    assert rules.level("Error in <TFile::ReadBuffer>: bad") == logging.INFO
+
+
+def test_local_deliver_passes_log_rules(fake_install):
+    "Config.log_rules is handed to install_sx_local."
+    _, captured = fake_install
+    config = Config(version="25.2.41", log_rules={"boring": "DEBUG"})
+
+    local_deliver(_spec(), config, display_progress=False)
+
+    assert captured["log_rules"] == {"boring": "DEBUG"}
+
+
+@pytest.mark.parametrize("sample_resources", [False, True])
+def test_local_deliver_passes_sample_resources(fake_install, sample_resources):
+    "Resource sampling is off unless the config turns it on."
+    _, captured = fake_install
+    config = Config(version="25.2.41", sample_resources=sample_resources)
+
+    local_deliver(_spec(), config, display_progress=False)
+
+    assert captured["sample_resources"] is sample_resources
+
+
+def test_install_sx_local_sample_resources():
+    "Sampling is set on the science image, and is off by default."
+    image = "sslhep/servicex_func_adl_xaod_transformer:25.2.41"
+    assert not install_sx_local(image, Platform.docker).science_runner.sample_resources
+    adaptor = install_sx_local(image, Platform.docker, sample_resources=True)
+    assert adaptor.science_runner.sample_resources
+
+
+def test_config_log_rules_rejects_bad_level():
+    with pytest.raises(ValueError, match="Log rule level"):
+        Config(version="25.2.41", log_rules={"boring": "LOUD"})
+
+
+@pytest.mark.parametrize(
+    "output_format, expected",
+    [
+        (None, ResultFormat.root_ttree),
+        ("root-ttree", ResultFormat.root_ttree),
+        ("parquet", ResultFormat.parquet),
+    ],
+)
+def test_sample_run_info_result_format(output_format, expected):
+    "The Spec's General.OutputFormat sets each request's result_format."
+    from servicex_local.deliver import _sample_run_info
+
+    general = General() if output_format is None else General(OutputFormat=output_format)
+    spec = ServiceXSpec(
+        General=general,
+        Sample=[
+            Sample(Name="s", Dataset=dataset.FileList("test.root"), Query="query1")
+        ],
+    )
+
+    (tq,) = _sample_run_info(spec.General, spec.Sample)
+
+    assert tq.result_format == expected
+
+
+def test_config_concurrency_rejects_zero():
+    with pytest.raises(ValueError, match="concurrency"):
+        Config(version="25.2.41", concurrency=0)
+
+
+def test_config_awk_workers_rejects_zero():
+    with pytest.raises(ValueError, match="awk_workers"):
+        Config(version="25.2.41", awk_workers=0)
+
+
+def test_local_deliver_passes_concurrency(fake_install):
+    "Config.concurrency reaches deliver_async."
+    config = Config(version="25.2.41", concurrency=3)
+
+    with patch(
+        "servicex_local.deliver._deliver_sync", return_value={"MySample": []}
+    ) as mock_deliver:
+        local_deliver(_spec(), config, display_progress=False)
+
+    assert mock_deliver.call_args.kwargs["concurrency"] == 3
+
+
 def test_config_logging_level_default_is_warning():
     "Default logging_level is WARNING (a recognised level name)."
     assert Config(version="25.2.41").logging_level == "WARNING"
 
 
+def test_config_positional_fields_keep_their_place():
+    "New settings are keyword-only, so positional Config calls keep working."
+    config = Config("25.2.41", "local", True, True, "INFO")
+    assert (config.version, config.platform, config.ignore_cache, config.awk) == (
+        "25.2.41",
+        Platform.local,
+        True,
+        True,
+    )
+    assert config.logging_level == "INFO"
+
+    if sys.version_info >= (3, 10):
+        # The release follows the base settings, ahead of the keyword-only ones
+        config = xAODConfig("25.2.41", "local", True, True, "INFO", 25)
+        assert (config.version, config.logging_level, config.release) == (
+            "25.2.41",
+            "INFO",
+            25,
+        )
+        with pytest.raises(TypeError):
+            Config("25.2.41", "local", True, True, "INFO", 2)
+
+
 @pytest.mark.parametrize(
     "image, platform, expected_class",
     [
@@ -352,6 +988,7 @@ def test_config_logging_level_default_is_warning():
             SingularityScienceImage,
         ),
         ("servicex_func_adl_xaod_transformer:25.2.41", Platform.wsl2, WSL2ScienceImage),
+        ("", Platform.local, LocalProcessScienceImage),
     ],
 )
 def test_install_sx_local(monkeypatch, image, platform, expected_class):
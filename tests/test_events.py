@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from servicex_local.events import EventLog
+from servicex_local.science_images import FileResult
+
+
+def test_emit_and_read(tmp_path):
+    "Events are appended one JSON object per line, oldest first."
+    log = EventLog(tmp_path / "events" / "req.jsonl")
+
+    log.emit("request_start", request_id="req", files=2)
+    log.emit("request_end", status="complete", duration=1.5)
+
+    events = EventLog.read(log.path)
+    assert [e["event"] for e in events] == ["request_start", "request_end"]
+    assert events[0]["files"] == 2
+    assert events[1]["duration"] == 1.5
+    assert all("time" in e for e in events)
+
+
+def test_existing_log_is_appended_to(tmp_path):
+    "A second EventLog on the same path keeps the earlier events."
+    EventLog(tmp_path / "req.jsonl").emit("request_start")
+    EventLog(tmp_path / "req.jsonl").emit("request_start")
+
+    assert len(EventLog.read(tmp_path / "req.jsonl")) == 2
+
+
+def test_file_done(tmp_path):
+    "A file result is recorded with its outcome, timing and sizes."
+    log = EventLog(tmp_path / "req.jsonl")
+    start = datetime(2024, 1, 1, 12, 0, 0)
+    log.file_done(
+        FileResult(
+            "in.root",
+            Path("out.root"),
+            start,
+            start + timedelta(seconds=3),
+            exit_code=0,
+            container="sx_codegen_container_x",
+            bytes_in=100,
+            bytes_out=10,
+            peak_rss=1 << 30,
+            cpu_seconds=2.5,
+        )
+    )
+    log.file_done(
+        FileResult("bad.root", None, start, start, error="boom", exit_code=2)
+    )
+
+    good, bad = EventLog.read(log.path)
+    assert good["event"] == "file"
+    assert good["status"] == "done"
+    assert good["start"] == "2024-01-01T12:00:00"
+    assert good["duration"] == 3.0
+    assert good["output_file"] == "out.root"
+    assert good["container"] == "sx_codegen_container_x"
+    assert (good["bytes_in"], good["bytes_out"]) == (100, 10)
+    assert (good["peak_rss"], good["cpu_seconds"]) == (1 << 30, 2.5)
+    assert bad["peak_rss"] is None
+    assert bad["status"] == "failed"
+    assert bad["error"] == "boom"
+    assert bad["exit_code"] == 2
+    assert bad["output_file"] is None
@@ -0,0 +1,131 @@
+import logging
+import threading
+import time
+from pathlib import Path
+
+from servicex_local.log_pipeline import LogPipeline, log_pipeline
+
+
+def test_write_and_flush(tmp_path: Path):
+    "Lines are appended as-is and are on disk once flush returns."
+    pipeline = LogPipeline(flush_interval=3600)
+    log = tmp_path / "logs" / "run.log"
+    try:
+        for i in range(100):
+            pipeline.write([log], f"line {i}")
+        pipeline.flush([log])
+    finally:
+        pipeline.stop()
+
+    assert log.read_text().splitlines() == [f"line {i}" for i in range(100)]
+
+
+def test_concurrent_writers_do_not_interleave(tmp_path: Path):
+    "Many threads writing to one file never split or lose a line."
+    pipeline = LogPipeline()
+    log = tmp_path / "run.log"
+
+    def writer(n: int):
+        for i in range(500):
+            pipeline.write([log], f"writer {n} line {i} " + "x" * 100)
+
+    try:
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        pipeline.flush([log])
+    finally:
+        pipeline.stop()
+
+    lines = log.read_text().splitlines()
+    assert len(lines) == 8 * 500
+    assert all(ln.endswith("x" * 100) for ln in lines)
+    for n in range(8):
+        mine = [ln for ln in lines if ln.startswith(f"writer {n} ")]
+        assert mine == [f"writer {n} line {i} " + "x" * 100 for i in range(500)]
+
+
+def test_line_to_several_sinks(tmp_path: Path):
+    pipeline = LogPipeline()
+    try:
+        pipeline.write([tmp_path / "a.log", tmp_path / "b.log"], "both")
+        pipeline.write([str(tmp_path / "a.log")], "only a")
+        pipeline.flush([tmp_path / "a.log", tmp_path / "b.log"])
+    finally:
+        pipeline.stop()
+
+    assert (tmp_path / "a.log").read_text() == "both\nonly a\n"
+    assert (tmp_path / "b.log").read_text() == "both\n"
+
+
+def test_transcript_prefixes_per_sink(tmp_path: Path):
+    "A transcript writes each line to all its files, with each file's prefix."
+    pipeline = LogPipeline(flush_interval=3600)
+    shared, own = tmp_path / "run.log", tmp_path / "run.a.log"
+    try:
+        transcript = pipeline.transcript({shared: "[a] ", str(own): ""})
+        for i in range(1000):
+            transcript.write(f"line {i}")
+        pipeline.flush(transcript.sinks)
+    finally:
+        pipeline.stop()
+
+    assert shared.read_text().splitlines() == [f"[a] line {i}" for i in range(1000)]
+    assert own.read_text().splitlines() == [f"line {i}" for i in range(1000)]
+
+
+def test_transcript_lines_do_not_wait_for_more(tmp_path: Path):
+    "A line is written without a later one to push it out."
+    pipeline = LogPipeline(flush_interval=0.01)
+    log = tmp_path / "run.log"
+    try:
+        pipeline.transcript({log: ""}).write("only line")
+        deadline = time.monotonic() + 5
+        while not (log.exists() and log.read_text()) and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        pipeline.stop()
+
+    assert log.read_text() == "only line\n"
+
+
+def test_handler_formats_records(tmp_path: Path):
+    "Records from a pipeline handler are written with time, name and level."
+    pipeline = LogPipeline()
+    log = tmp_path / "run.log"
+    logger = logging.getLogger("servicex_local.test_pipeline")
+    handler = pipeline.handler([log])
+    logger.addHandler(handler)
+    try:
+        logger.warning("value is %d", 42)
+        pipeline.flush([log])
+    finally:
+        logger.removeHandler(handler)
+        pipeline.stop()
+
+    (line,) = log.read_text().splitlines()
+    assert line.endswith(" - servicex_local.test_pipeline - WARNING - value is 42")
+
+
+def test_handler_without_sinks_drops_records(tmp_path: Path):
+    pipeline = LogPipeline()
+    logger = logging.getLogger("servicex_local.test_pipeline")
+    handler = pipeline.handler([])
+    logger.addHandler(handler)
+    try:
+        logger.warning("nowhere")
+        handler.sinks = (tmp_path / "run.log",)
+        logger.warning("somewhere")
+        pipeline.flush([tmp_path / "run.log"])
+    finally:
+        logger.removeHandler(handler)
+        pipeline.stop()
+
+    assert "nowhere" not in (tmp_path / "run.log").read_text()
+    assert "somewhere" in (tmp_path / "run.log").read_text()
+
+
+def test_shared_pipeline():
+    assert log_pipeline() is log_pipeline()
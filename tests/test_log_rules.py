@@ -0,0 +1,128 @@
+import logging
+import re
+
+import pytest
+
+from servicex_local.log_rules import DEFAULT_LOG_RULES, LogRules
+
+
+@pytest.mark.parametrize(
+    "line, expected",
+    [
+        ("Processing event 10", logging.DEBUG),
+        ("", logging.DEBUG),
+        ("ERROR: could not open file", logging.ERROR),
+        ("Something failed with an Error", logging.ERROR),
+        ("WARNING: deprecated option", logging.WARNING),
+        ("Warning and error on the same line", logging.ERROR),
+        ("Warning in <TClass::Init>: no dictionary for class Foo", logging.DEBUG),
+        ("error reading /tmp/x509up_u1000", logging.DEBUG),
+        ("xAOD::TFileAccessTracer   WARNING Failed to send report", logging.INFO),
+    ],
+)
+def test_default_levels(line, expected):
+    assert LogRules().level(line) == expected
+
+
+def test_block_level_promotes_plain_lines():
+    "Lines continuing a WARNING or ERROR block are logged at its level."
+    rules = LogRules()
+
+    assert rules.level("  at line 12", logging.ERROR) == logging.ERROR
+    assert rules.level("", logging.WARNING) == logging.WARNING
+    assert rules.level("an error inside a warning block", logging.WARNING) == logging.ERROR
+
+
+def test_block_level_does_not_override_configured_rules():
+    "A configured rule wins even inside an error block."
+    assert LogRules().level("x509up_u1000", logging.ERROR) == logging.DEBUG
+
+
+def test_configured_rules_take_precedence():
+    "Configured rules are checked before the defaults and the built-in rules."
+    rules = LogRules(
+        {r"Error in <TFile::ReadBuffer>": "INFO", r"x509up": logging.WARNING}
+    )
+
+    assert rules.level("Error in <TFile::ReadBuffer>: oops") == logging.INFO
+    assert rules.level("copying x509up") == logging.WARNING
+    assert rules.level("error in something else") == logging.ERROR
+
+
+def test_rules_are_regular_expressions():
+    rules = LogRules({r"segmentation (fault|violation)": "CRITICAL"})
+
+    assert rules.level("*** Segmentation violation ***") == logging.CRITICAL
+
+
+def test_suppress_patterns_are_literal():
+    "suppress_patterns are plain substrings, checked first."
+    rules = LogRules({"skip.*": "ERROR"}, suppress_patterns=["skip.*"])
+
+    assert rules.level("error: skip.* this") == logging.DEBUG
+    assert rules.level("error: skipped") == logging.ERROR
+
+
+def test_without_defaults():
+    rules = LogRules(include_defaults=False)
+
+    assert rules.rules == {}
+    assert rules.level("error reading x509up") == logging.ERROR
+
+
+def test_defaults_are_kept_alongside_configured_rules():
+    rules = LogRules({"boring": "DEBUG"})
+
+    assert set(DEFAULT_LOG_RULES) < set(rules.rules)
+
+
+def test_bad_level():
+    with pytest.raises(ValueError, match="Log rule level"):
+        LogRules({"boring": "LOUD"})
+
+
+def test_bad_pattern():
+    with pytest.raises(re.error):
+        LogRules({"(unclosed": "DEBUG"})
+
+
+def test_plain_and_regex_rules_keep_their_order():
+    "Rules checked as plain substrings and as regexes still go first-match-wins."
+    rules = LogRules(
+        {r"disk (full|quota)": "CRITICAL", "Disk": "INFO", r"x509up\.pem": "ERROR"},
+        include_defaults=False,
+    )
+
+    assert rules.level("DISK QUOTA exceeded") == logging.CRITICAL
+    assert rules.level("disk usage 50%") == logging.INFO
+    assert rules.level("copied X509UP.pem") == logging.ERROR
+    assert rules.level("copied x509upXpem") == logging.DEBUG
+    assert rules.level("Warning: slow disk") == logging.INFO
+
+
+def test_first_rule_wins_wherever_it_matches():
+    "A rule earlier in order wins even when a later one matches earlier in the line."
+    rules = LogRules({"disk full": "CRITICAL", "retry": "INFO"}, include_defaults=False)
+
+    assert rules.level("retry 3: disk full") == logging.CRITICAL
+    assert rules.level("retry 3: warning") == logging.INFO
+
+
+@pytest.mark.parametrize(
+    "pattern, line, expected",
+    [
+        # Upper-case regular expressions still ignore case
+        (r"Disk [A-Z]+ at \d+%", "disk usage at 90%", logging.CRITICAL),
+        (r"\x44ISK", "disk", logging.CRITICAL),
+        (r"\D+full", "disk full", logging.CRITICAL),
+        # Groups of their own, and inline flags
+        (r"(disk|tape) (full)\2", "tape fullfull", logging.CRITICAL),
+        (r"(?P<what>disk) (?P=what)", "DISK disk", logging.CRITICAL),
+        (r"(?s)disk.full", "disk\nfull", logging.CRITICAL),
+        (r"(disk|tape) (full)\2", "tape full", logging.DEBUG),
+    ],
+)
+def test_rules_keep_their_meaning(pattern, line, expected):
+    "A pattern matches the same lines as it would on its own."
+    rules = LogRules({pattern: "CRITICAL", "(a)(b)": "INFO"}, include_defaults=False)
+    assert rules.level(line) == expected
@@ -1,4 +1,7 @@
+import contextvars
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from pytest import LogCaptureFixture
@@ -43,3 +46,81 @@ def test_logfile_no_mess_with_levels(tmp_path: Path, caplog: LogCaptureFixture):
         assert root_logger.level == logging.WARNING
 
     assert root_logger.level == logging.WARNING
+
+
+def test_logfile_concurrent_calls(tmp_path: Path):
+    "Decorated functions running at once each get a complete file."
+    import threading
+
+    root_logger = logging.getLogger()
+    handlers_before = list(root_logger.handlers)
+    level_before = root_logger.level
+    both_running = threading.Barrier(2)
+
+    def make(name: str):
+        @log_to_file(tmp_path / f"{name}.txt")
+        def run_me():
+            both_running.wait()
+            for i in range(50):
+                logging.info("%s %d", name, i)
+            both_running.wait()
+
+        return run_me
+
+    threads = [threading.Thread(target=make(n)) for n in ("a", "b")]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    for name in ("a", "b"):
+        text = (tmp_path / f"{name}.txt").read_text()
+        assert all(f"INFO - {name} {i}\n" in text for i in range(50))
+    assert root_logger.handlers == handlers_before
+    assert root_logger.level == level_before
+
+
+def test_logfile_concurrent_calls_keep_their_own_records(tmp_path: Path):
+    "Each call's file only gets the records logged under that call."
+    both_running = threading.Barrier(2)
+
+    def make(name: str):
+        @log_to_file(tmp_path / f"{name}.txt")
+        def run_me():
+            both_running.wait()
+            for i in range(50):
+                logging.info("%s %d", name, i)
+            with ThreadPoolExecutor(1) as pool:
+                pool.submit(
+                    contextvars.copy_context().run, logging.info, "%s pool", name
+                ).result()
+            both_running.wait()
+
+        return run_me
+
+    threads = [threading.Thread(target=make(n)) for n in ("a", "b")]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    for name, other in (("a", "b"), ("b", "a")):
+        text = (tmp_path / f"{name}.txt").read_text()
+        assert all(f"INFO - {name} {i}\n" in text for i in range(50))
+        assert f"INFO - {name} pool\n" in text
+        assert f" - {other} " not in text
+
+
+def test_logfile_records_from_other_threads(tmp_path: Path):
+    "A record logged outside the call's context still reaches the file."
+    log = tmp_path / "func_log.txt"
+
+    @log_to_file(log)
+    def run_me():
+        t = threading.Thread(target=logging.info, args=("from a thread",))
+        t.start()
+        t.join()
+
+    run_me()
+
+    assert "INFO - from a thread" in log.read_text()
@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from servicex.models import ResultDestination, ResultFormat, TransformRequest
+
+from servicex_local.manifest import TransformManifest, request_key
+from servicex_local.science_images import FileResult
+
+
+def _result(input_file: str, output_file, error=None) -> FileResult:
+    start = datetime(2024, 1, 1, 12, 0, 0)
+    return FileResult(input_file, output_file, start, start + timedelta(seconds=2), error)
+
+
+def test_manifest_round_trip(tmp_path: Path):
+    output_directory = tmp_path / "out"
+    output_directory.mkdir()
+    (output_directory / "a.root").touch()
+
+    manifest = TransformManifest(tmp_path / "m.json", "req-1", output_directory)
+    manifest.record(_result("a.root", output_directory / "a.root"))
+    manifest.record(_result("b.root", None, error="exit_code=3"))
+
+    loaded = TransformManifest.load(tmp_path / "m.json")
+    assert loaded is not None
+    assert loaded.request_id == "req-1"
+    assert loaded.output_directory == output_directory
+    assert loaded.files["a.root"]["duration"] == 2.0
+    assert loaded.files["b.root"]["status"] == "failed"
+    assert loaded.files["b.root"]["error"] == "exit_code=3"
+    assert loaded.completed_files() == ["a.root"]
+    assert loaded.resumable
+
+
+def test_manifest_missing_output_is_not_complete(tmp_path: Path):
+    "A file recorded as done whose output has since vanished must be redone."
+    manifest = TransformManifest(tmp_path / "m.json", "req-1", tmp_path)
+    manifest.record(_result("a.root", tmp_path / "gone.root"))
+
+    assert manifest.completed_files() == []
+
+
+def test_manifest_complete_is_not_resumable(tmp_path: Path):
+    manifest = TransformManifest(tmp_path / "m.json", "req-1", tmp_path)
+    manifest.finish("complete")
+
+    loaded = TransformManifest.load(tmp_path / "m.json")
+    assert loaded is not None
+    assert not loaded.resumable
+
+
+def test_manifest_load_missing_or_corrupt(tmp_path: Path):
+    assert TransformManifest.load(tmp_path / "nope.json") is None
+    (tmp_path / "bad.json").write_text("{not json")
+    assert TransformManifest.load(tmp_path / "bad.json") is None
+
+
+def test_request_key_depends_on_files_and_selection():
+    def tq(files, selection):
+        return TransformRequest(
+            **{
+                "selection": selection,
+                "file-list": files,
+                "result_format": ResultFormat.root_ttree,
+                "result_destination": ResultDestination.volume,
+                "codegen": "dummy",
+            }
+        )
+
+    assert request_key(tq(["a"], "q")) == request_key(tq(["a"], "q"))
+    assert request_key(tq(["a"], "q")) != request_key(tq(["b"], "q"))
+    assert request_key(tq(["a"], "q")) != request_key(tq(["a"], "q2"))
+
+
+def test_request_key_depends_on_result_format():
+    def tq(result_format):
+        return TransformRequest(
+            **{
+                "selection": "q",
+                "file-list": ["a"],
+                "result_format": result_format,
+                "result_destination": ResultDestination.volume,
+                "codegen": "dummy",
+            }
+        )
+
+    assert request_key(tq(ResultFormat.root_ttree)) != request_key(
+        tq(ResultFormat.parquet)
+    )
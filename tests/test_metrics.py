@@ -0,0 +1,105 @@
+import urllib.error
+import urllib.request
+
+import pytest
+
+from servicex_local.metrics import (
+    Counter,
+    Gauge,
+    Registry,
+    Summary,
+    TextfileExporter,
+    start_http_server,
+    write_textfile,
+)
+
+
+@pytest.fixture
+def registry():
+    registry = Registry()
+    requests = Counter("test_requests_total", "Requests.", registry)
+    requests.inc(status="complete")
+    requests.inc(2, status="failed")
+    Gauge("test_running", "Running.", registry).inc(3)
+    seconds = Summary("test_seconds", "Seconds.", registry)
+    seconds.observe(1.5)
+    seconds.observe(0.5)
+    return registry
+
+
+def test_render(registry):
+    assert registry.render() == (
+        "# HELP test_requests_total Requests.\n"
+        "# TYPE test_requests_total counter\n"
+        'test_requests_total{status="complete"} 1\n'
+        'test_requests_total{status="failed"} 2\n'
+        "# HELP test_running Running.\n"
+        "# TYPE test_running gauge\n"
+        "test_running 3\n"
+        "# HELP test_seconds Seconds.\n"
+        "# TYPE test_seconds summary\n"
+        "test_seconds_sum 2\n"
+        "test_seconds_count 2\n"
+    )
+
+
+def test_label_values_escaped():
+    registry = Registry()
+    Counter("c", "C.", registry).inc(path='a"b\\c\nd')
+    assert 'c{path="a\\"b\\\\c\\nd"} 1' in registry.render()
+
+
+def test_gauge_dec_and_value():
+    g = Gauge("g", "G.", None)
+    g.inc(5, kind="x")
+    g.dec(2, kind="x")
+    assert g.value(kind="x") == 3
+    assert g.value(kind="y") == 0
+
+
+def test_summary_time():
+    s = Summary("s", "S.", None)
+    with s.time(stage="codegen"):
+        pass
+    assert s.count(stage="codegen") == 1
+    assert s.value(stage="codegen") >= 0
+
+
+def test_duplicate_metric():
+    registry = Registry()
+    Counter("c", "C.", registry)
+    with pytest.raises(ValueError, match="already registered"):
+        Counter("c", "C.", registry)
+
+
+def test_write_textfile(registry, tmp_path):
+    path = tmp_path / "servicex_local.prom"
+    write_textfile(path, registry)
+
+    assert path.read_text() == registry.render()
+    assert [p.name for p in tmp_path.iterdir()] == ["servicex_local.prom"]
+
+
+def test_textfile_exporter(registry, tmp_path):
+    path = tmp_path / "servicex_local.prom"
+    running = Gauge("late", "Late.", registry)
+    with TextfileExporter(path, interval=60, registry=registry):
+        assert "test_running 3" in path.read_text()
+        running.inc()
+
+    # The final values are written when it stops
+    assert "late 1" in path.read_text()
+
+
+def test_http_server(registry):
+    server = start_http_server(0, registry=registry)
+    try:
+        port = server.server_address[1]
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as r:
+            assert r.headers["Content-Type"].startswith("text/plain")
+            assert r.read().decode() == registry.render()
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/other")
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,205 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+from servicex import dataset
+
+from servicex_local import Config
+from servicex_local.events import EventLog
+from servicex_local.planner import (
+    FileHistory,
+    QueryPlan,
+    SampleEstimate,
+    _fit_seconds,
+    _named_in,
+    file_history,
+    plan_deliver,
+)
+from servicex_local.science_images import FileResult
+from servicex_local.synthetic import write_synthetic_file
+
+
+def _history(events_dir: Path, image: str, runs):
+    "An event log with a file for each (bytes_in, seconds) in runs"
+    log = EventLog(events_dir / f"{image}.jsonl")
+    log.emit("request_start", request_id=image, image=image, files=len(runs))
+    start = datetime(2024, 1, 1)
+    for bytes_in, seconds in runs:
+        log.file_done(
+            FileResult(
+                "in.root",
+                Path("out.parquet"),
+                start,
+                start + timedelta(seconds=seconds),
+                exit_code=0,
+                bytes_in=bytes_in,
+                bytes_out=bytes_in // 10,
+                peak_rss=1 << 30,
+            )
+        )
+
+
+def test_file_history_by_image(tmp_path):
+    _history(tmp_path, "local", [(100, 1.0), (200, 2.0)])
+    _history(tmp_path, "other", [(100, 9.0)])
+    EventLog(tmp_path / "old.jsonl").emit(
+        "file", status="done", duration=5.0, bytes_in=100
+    )
+
+    assert [h.seconds for h in file_history(tmp_path, "local")] == [1.0, 2.0]
+    assert len(file_history(tmp_path)) == 4
+
+
+@pytest.mark.parametrize(
+    "history, expected",
+    [
+        ([], None),
+        # Time grows with size: an offset per file plus a rate
+        ([FileHistory(3.0, 1000), FileHistory(5.0, 2000)], (1.0, 0.002)),
+        # No sizes, or no spread in them: the mean time
+        ([FileHistory(3.0), FileHistory(5.0)], (4.0, 0.0)),
+        ([FileHistory(3.0, 1000), FileHistory(5.0, 1000)], (4.0, 0.0)),
+        # Faster for larger files: size is no help
+        ([FileHistory(5.0, 1000), FileHistory(3.0, 2000)], (4.0, 0.0)),
+    ],
+)
+def test_fit_seconds(history, expected):
+    assert _fit_seconds(history) == (pytest.approx(expected) if expected else None)
+
+
+@pytest.mark.parametrize(
+    "branch, named",
+    [
+        ("branch001", True),
+        ("nbranch001", False),
+        ("AnalysisJetsAuxDyn.pt", True),
+        ("AnalysisElectronsAuxDyn.pt", False),
+    ],
+)
+def test_named_in(branch, named):
+    selection = "(call Jets 'AnalysisJets') (attr branch001)"
+    assert _named_in(branch, selection) == named
+
+
+def _spec(files, background=()):
+    samples = [
+        {
+            "Name": "signal",
+            "Dataset": dataset.FileList(files),
+            "Query": "events.branch001 + events.branch003",
+        },
+        {"Name": "remote", "Dataset": dataset.Rucio("scope:name"), "Query": "x"},
+    ]
+    if background:
+        samples.append(
+            {"Name": "background", "Dataset": dataset.FileList(list(background)), "Query": "x"}
+        )
+    return {"Sample": samples}
+
+
+@pytest.fixture
+def plan_files(tmp_path):
+    return [
+        str(write_synthetic_file(tmp_path / f"f{i}.root", n_branches=6, entries=2000 * (i + 1)))
+        for i in range(3)
+    ]
+
+
+def test_plan_deliver(tmp_path, plan_files):
+    _history(tmp_path / "events", "local", [(100_000, 2.0), (200_000, 3.0)])
+
+    plan = plan_deliver(
+        _spec(plan_files),
+        Config(platform="local"),
+        events_dir=tmp_path / "events",
+        cpus=8,
+        memory=3 << 30,
+    )
+
+    signal, remote = plan.samples
+    sizes = [Path(f).stat().st_size for f in plan_files]
+    assert signal.files == 3
+    assert signal.bytes_in == sum(sizes)
+    assert signal.branches == ["branch003", "branch001"]
+    assert 0 < signal.read_fraction < 1
+    assert signal.seconds == pytest.approx(sum(1.0 + s / 100_000 for s in sizes))
+    assert signal.bytes_out == pytest.approx(sum(sizes) / 10, rel=0.01)
+    assert remote.files == 0
+
+    assert plan.image == "local"
+    assert plan.history_files == 2
+    assert plan.peak_rss == 1 << 30
+    assert plan.memory_limit == 1.5
+    # One sample, whose files the image runs one at a time
+    assert plan.max_workers == 1
+    assert plan.concurrency == 1
+    assert plan.wall_seconds() == pytest.approx(signal.seconds)
+    assert plan.wall_seconds(4) == pytest.approx(signal.seconds)
+
+    report = plan.report()
+    assert "signal" in report
+    assert "1 samples at once and 1 file(s) of each" in report
+    assert "Recommended concurrency: 1" in report
+    assert "Sample remote has no file list" in report
+
+
+def test_plan_deliver_samples_at_once(tmp_path, plan_files):
+    "Samples run side by side, as many as fit in memory"
+    _history(tmp_path / "events", "local", [(100_000, 2.0), (200_000, 3.0)])
+    spec = _spec(plan_files[:1], background=plan_files[1:])
+
+    plan = plan_deliver(
+        spec,
+        Config(platform="local"),
+        events_dir=tmp_path / "events",
+        cpus=8,
+        memory=3 << 30,
+    )
+
+    signal, _, background = plan.samples
+    # 2 samples, and memory for 2 files with the headroom
+    assert plan.concurrency == 2
+    assert plan.wall_seconds() == pytest.approx(max(signal.seconds, background.seconds))
+    assert plan.wall_seconds(1) == pytest.approx(signal.seconds + background.seconds)
+
+    assert plan_deliver(
+        spec, Config(platform="local"), events_dir=tmp_path / "events", cpus=8,
+        memory=2 << 30,
+    ).concurrency == 1
+
+
+def test_wall_seconds_max_workers():
+    "The files of a sample share its image's workers"
+    sample = SampleEstimate("s", files=4, seconds=40.0, longest_file=10.0)
+    plan = QueryPlan("image", [sample], 4, None, None, 1, max_workers=2)
+
+    assert plan.wall_seconds(1) == pytest.approx(40.0)
+    assert plan.wall_seconds(2) == pytest.approx(20.0)
+    assert plan.wall_seconds(8) == pytest.approx(20.0)
+
+
+def test_plan_deliver_installs_nothing(tmp_path, plan_files, monkeypatch):
+    "Planning reads the cache location, but never makes one"
+    monkeypatch.setattr("servicex_local.planner._servicex_cache_dir", lambda: None)
+    monkeypatch.setattr(
+        "tempfile.mkdtemp", lambda *a, **k: pytest.fail("made a directory")
+    )
+
+    plan = plan_deliver(_spec(plan_files), Config(platform="local"), cpus=2)
+
+    assert plan.history_files == 0
+
+
+def test_plan_deliver_no_history(tmp_path, plan_files):
+    "Without history there are no times, and the output comes from the branches"
+    plan = plan_deliver(
+        _spec(plan_files), Config(platform="local"), events_dir=tmp_path / "events", cpus=2
+    )
+
+    signal = plan.samples[0]
+    assert signal.seconds is None
+    assert plan.wall_seconds() is None
+    assert signal.bytes_out == int(signal.bytes_in * signal.read_fraction)
+    assert plan.memory_limit is None
+    assert plan.concurrency == 1
+    assert "No files have been run on local yet" in plan.report()
@@ -0,0 +1,71 @@
+import pstats
+import sys
+import threading
+
+from servicex_local.profiling import DeliverProfile
+
+
+def _busy_work():
+    return sum(range(1000))
+
+
+def test_profile_file_named_with_tags(tmp_path):
+    with DeliverProfile(tmp_path / "profiles") as profile:
+        profile.tags = ["req1", "req2"]
+        _busy_work()
+
+    assert profile.path is not None
+    assert profile.path.parent == tmp_path / "profiles"
+    assert profile.path.name.startswith("deliver_")
+    assert profile.path.name.endswith("-req1-req2.prof")
+
+
+def test_profile_includes_new_threads(tmp_path):
+    results = []
+    with DeliverProfile(tmp_path) as profile:
+        t = threading.Thread(target=lambda: results.append(_busy_work()))
+        t.start()
+        t.join()
+
+    # The profiler must not get in the way of the thread's own work
+    assert results == [_busy_work()]
+    assert profile.path is not None
+    functions = {name for _, _, name in pstats.Stats(str(profile.path)).stats}
+    assert "_busy_work" in functions
+
+
+def _waits_for(started, stopped):
+    _busy_work()
+    started.set()
+    stopped.wait()
+
+
+def test_profile_includes_running_threads(tmp_path):
+    "A thread still running when the profile stops has what it did so far saved"
+    started, stopped = threading.Event(), threading.Event()
+    with DeliverProfile(tmp_path) as profile:
+        t = threading.Thread(target=_waits_for, args=(started, stopped))
+        t.start()
+        started.wait()
+    threads = profile._threads
+    stopped.set()
+    t.join()
+
+    functions = {name for _, _, name in pstats.Stats(str(profile.path)).stats}
+    assert "_busy_work" in functions
+    if sys.version_info < (3, 12):
+        # Its own profiler also records the call it is still in
+        assert "_waits_for" in functions
+    assert threads == []
+
+
+def test_profile_stops_hooking_threads(tmp_path):
+    "Threads started after the profile stops are not profiled"
+    with DeliverProfile(tmp_path) as profile:
+        pass
+
+    t = threading.Thread(target=_busy_work)
+    t.start()
+    t.join()
+
+    assert profile._threads == []
@@ -0,0 +1,146 @@
+import subprocess
+import sys
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+
+from servicex_local.events import EventLog
+from servicex_local.resources import (
+    DockerStatsSampler,
+    ProcessTreeSampler,
+    _parse_size,
+    peak_rss_history,
+    suggest_memory_limit,
+)
+from servicex_local.science_images import FileResult, run_command_with_logging
+
+linux_only = pytest.mark.skipif(
+    not sys.platform.startswith("linux"), reason="Needs /proc"
+)
+
+# Holds 200 MB and burns some CPU before exiting.
+_HUNGRY = (
+    "import time\n"
+    "x = bytearray(200 * 1024 * 1024)\n"
+    "end = time.process_time() + 0.3\n"
+    "while time.process_time() < end: pass\n"
+    "time.sleep(0.2)\n"
+)
+
+
+@linux_only
+def test_process_tree_sampler(tmp_path):
+    sampler = ProcessTreeSampler(interval=0.02)
+    run_command_with_logging(
+        [sys.executable, "-c", _HUNGRY], tmp_path / "log.txt", sampler=sampler
+    )
+
+    assert sampler.usage.peak_rss is not None
+    assert sampler.usage.peak_rss > 150 * 1024 * 1024
+    assert sampler.usage.cpu_seconds is not None
+    assert sampler.usage.cpu_seconds >= 0.2
+
+
+@linux_only
+def test_process_tree_sampler_includes_children(tmp_path):
+    "The memory of processes the command starts counts too"
+    sampler = ProcessTreeSampler(interval=0.02)
+    run_command_with_logging(
+        ["bash", "-c", f"{sys.executable} -c '{_HUNGRY}'; true"],
+        tmp_path / "log.txt",
+        sampler=sampler,
+    )
+
+    assert sampler.usage.peak_rss is not None
+    assert sampler.usage.peak_rss > 150 * 1024 * 1024
+
+
+@linux_only
+def test_sampler_stopped_on_failure(tmp_path):
+    sampler = ProcessTreeSampler(interval=0.02)
+    with pytest.raises(RuntimeError):
+        run_command_with_logging(
+            [sys.executable, "-c", "import sys; sys.exit(3)"],
+            tmp_path / "log.txt",
+            sampler=sampler,
+        )
+    assert sampler._thread is not None
+    assert not sampler._thread.is_alive()
+
+
+def test_process_tree_sampler_gone_process():
+    assert ProcessTreeSampler().sample(2**22 + 1) is None
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("512MiB", 512 * 1024 * 1024),
+        ("1.5GiB", int(1.5 * 1024**3)),
+        ("100kB", 100_000),
+        ("0B", 0),
+    ],
+)
+def test_parse_size(text, expected):
+    assert _parse_size(text) == expected
+
+
+def test_parse_size_bad():
+    with pytest.raises(ValueError):
+        _parse_size("lots")
+
+
+def test_docker_stats_sampler():
+    "Memory is read from docker stats and the CPU percentage integrated"
+    outputs = iter(["1GiB / 8GiB|200.00%\n", "2GiB / 8GiB|200.00%\n"])
+    times = iter([10.0, 12.0])
+
+    def fake_run(command, **kwargs):
+        assert command[:3] == ["docker", "stats", "--no-stream"]
+        assert command[-1] == "my_container"
+        return subprocess.CompletedProcess(command, 0, stdout=next(outputs))
+
+    sampler = DockerStatsSampler("my_container")
+    with patch("servicex_local.resources.subprocess.run", fake_run), patch(
+        "servicex_local.resources.time.monotonic", lambda: next(times)
+    ):
+        sampler._take(0)
+        sampler._take(0)
+
+    assert sampler.usage.peak_rss == 2 * 1024**3
+    assert sampler.usage.cpu_seconds == pytest.approx(4.0)
+
+
+def test_docker_stats_sampler_no_container():
+    def fake_run(command, **kwargs):
+        return subprocess.CompletedProcess(command, 1, stdout="", stderr="No such container")
+
+    with patch("servicex_local.resources.subprocess.run", fake_run):
+        assert DockerStatsSampler("gone").sample(0) is None
+
+
+@pytest.mark.parametrize(
+    "peaks, expected",
+    [
+        ([1 << 30], 1.5),
+        ([None, 3 << 29, 1 << 28], 2.0),
+        ([], None),
+        ([None], None),
+    ],
+)
+def test_suggest_memory_limit(peaks, expected):
+    assert suggest_memory_limit(peaks) == expected
+
+
+def test_peak_rss_history(tmp_path):
+    now = datetime.now()
+    log = EventLog(tmp_path / "req.jsonl")
+    log.emit("request_start")
+    log.file_done(FileResult("a.root", None, now, now, peak_rss=100))
+    log.file_done(FileResult("b.root", None, now, now))
+    EventLog(tmp_path / "req2.jsonl").file_done(
+        FileResult("c.root", None, now, now, peak_rss=300)
+    )
+
+    assert peak_rss_history(tmp_path) == [100, 300]
@@ -0,0 +1,59 @@
+import json
+
+from servicex_local.schemas import (
+    SchemaDiff,
+    diff_schemas,
+    group_by_schema,
+    schema_hash,
+    schema_of,
+)
+
+
+def _structure(trees, **metadata):
+    return json.dumps({"FileMetaData": metadata, **trees})
+
+
+def test_schema_of_drops_metadata():
+    s = _structure({"t": {"a": "AsDtype('>f8')"}}, amiTag="p1")
+    assert schema_of(s) == {"t": {"a": "AsDtype('>f8')"}}
+
+
+def test_schema_hash_ignores_order():
+    a = {"t": {"a": "x", "b": "y"}, "u": {}}
+    b = {"u": {}, "t": {"b": "y", "a": "x"}}
+    assert schema_hash(a) == schema_hash(b)
+    assert schema_hash(a) != schema_hash({"t": {"a": "x", "b": "z"}, "u": {}})
+
+
+def test_group_by_schema():
+    one = {"t": {"a": "x"}}
+    two = {"t": {"a": "x", "b": "y"}}
+    structures = {
+        "f1": _structure(one, amiTag="p1"),
+        "f2": _structure(two),
+        "f3": None,
+        "f4": _structure(one, amiTag="p2"),
+    }
+
+    groups = group_by_schema(structures)
+
+    assert [g.files for g in groups] == [["f1", "f4"], ["f2"]]
+    assert groups[0].schema == one
+    assert groups[0].schema_hash == schema_hash(one)
+
+
+def test_diff_schemas():
+    reference = {"t": {"a": "x", "b": "y"}, "gone": {}}
+    other = {"t": {"a": "z", "c": "y"}, "new": {}}
+
+    diff = diff_schemas(reference, other)
+
+    assert diff == SchemaDiff(
+        added_trees=["new"],
+        removed_trees=["gone"],
+        added_branches={"t": ["c"]},
+        removed_branches={"t": ["b"]},
+        changed_branches={"t": {"a": ("x", "z")}},
+    )
+    assert diff
+    assert not diff_schemas(reference, reference)
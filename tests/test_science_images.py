@@ -1,15 +1,21 @@
 import logging
 import os
 import shutil
+import sys
 from pathlib import Path
 from typing import List
 
 import pytest
 
+from servicex_local.log_rules import LogRules
 from servicex_local.science_images import (
+    BaseScienceImage,
     DockerScienceImage,
+    FilesNotStarted,
+    LocalProcessScienceImage,
     WSL2ScienceImage,
     SingularityScienceImage,
+    run_command_with_logging,
 )
 
 
@@ -428,7 +434,7 @@ def test_docker_container_conflict_error(tmp_path: Path):
 
     from unittest.mock import patch
 
-    def mock_run_command_with_logging(command, log_file, suppress_patterns=None):
+    def mock_run_command_with_logging(command, log_file, **kwargs):
         log_file.parent.mkdir(parents=True, exist_ok=True)
         log_file.write_text(
             "Error response from daemon: Conflict. The container name "
@@ -464,7 +470,7 @@ def test_docker_command(tmp_path: Path):
 
     captured_command = {}
 
-    def mock_run_command_with_logging(command, log_file, suppress_patterns=None):
+    def mock_run_command_with_logging(command, log_file, **kwargs):
         captured_command["command"] = command
         captured_command["log_file"] = log_file
 
@@ -501,7 +507,7 @@ def test_docker_command_memory_limit(tmp_path: Path):
 
     captured_command = {}
 
-    def mock_run_command_with_logging(command, log_file, suppress_patterns=None):
+    def mock_run_command_with_logging(command, log_file, **kwargs):
         captured_command["command"] = command
         captured_command["log_file"] = log_file
 
@@ -628,6 +634,133 @@ def test_docker_science_error(
         )
 
 
+@pytest.mark.parametrize(
+    "source_directory, input_files",
+    [
+        ("./tests/genfiles_raw/query2_bash", ["file1.root"]),
+        ("./tests/genfiles_raw/query1_python", ["file1.root"]),
+        ("./tests/genfiles_raw/query2_bash", ["file1.root", "file2.root"]),
+        ("./tests/genfiles_raw/query2_bash", ["http://root.ch/file1"]),
+    ],
+)
+def test_local_science(tmp_path, source_directory, input_files):
+    "The local science image runs the generated payload with no container"
+    generated_file_directory, actual_input_files, output_file_directory = (
+        prepare_input_files(tmp_path, source_directory, input_files)
+    )
+
+    local = LocalProcessScienceImage()
+    output_files = local.transform(
+        generated_file_directory, actual_input_files, output_file_directory, "root-file"
+    )
+
+    assert len(output_files) == len(actual_input_files)
+    assert all(o.exists() for o in output_files)
+    assert (generated_file_directory / "local_log.txt").exists()
+
+
+@pytest.mark.parametrize(
+    "transform_path, exception_message",
+    [
+        ("tests/genfiles_raw/query3_bash_exit_error", "exit_code=10"),
+        ("tests/genfiles_raw/query4_python_exit_error", "exit_code=10"),
+        ("tests/genfiles_raw/query5_python_exception_error", "exit_code=1"),
+    ],
+)
+def test_local_science_error(tmp_path, transform_path, exception_message):
+    generated_file_directory, actual_input_files, output_file_directory = (
+        prepare_input_files(tmp_path, transform_path, ["file1.root"])
+    )
+
+    local = LocalProcessScienceImage()
+    with pytest.raises(RuntimeError, match=exception_message):
+        local.transform(
+            generated_file_directory,
+            actual_input_files,
+            output_file_directory,
+            "root-file",
+        )
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="Needs /proc")
+@pytest.mark.parametrize("sample_resources", [True, False])
+def test_local_science_resources(tmp_path, sample_resources):
+    "Each file's memory and CPU use are recorded when sampling is on"
+    generated_file_directory, actual_input_files, output_file_directory = (
+        prepare_input_files(tmp_path, "./tests/genfiles_raw/query1_python", ["file1.root"])
+    )
+
+    local = LocalProcessScienceImage()
+    local.sample_resources = sample_resources
+    results = []
+    local.transform(
+        generated_file_directory,
+        actual_input_files,
+        output_file_directory,
+        "root-file",
+        on_file_done=results.append,
+    )
+
+    (result,) = results
+    if sample_resources:
+        assert result.peak_rss is not None and result.peak_rss > 0
+        assert result.cpu_seconds is not None
+    else:
+        assert result.peak_rss is None
+        assert result.cpu_seconds is None
+
+
+def test_local_science_metrics(tmp_path):
+    "Files are counted by outcome and none are left running"
+    from servicex_local import metrics
+
+    done = metrics.FILES.value(status="done")
+    failed = metrics.FILES.value(status="failed")
+    observed = metrics.FILE_SECONDS.count()
+
+    generated_file_directory, actual_input_files, output_file_directory = (
+        prepare_input_files(tmp_path, "./tests/genfiles_raw/query2_bash", ["f1.root", "f2.root"])
+    )
+    LocalProcessScienceImage().transform(
+        generated_file_directory, actual_input_files, output_file_directory, "root-file"
+    )
+    assert metrics.FILES.value(status="done") == done + 2
+
+    with pytest.raises(FileNotFoundError):
+        LocalProcessScienceImage().transform(
+            generated_file_directory,
+            [str(tmp_path / "missing.root")],
+            output_file_directory,
+            "root-file",
+        )
+    assert metrics.FILES.value(status="failed") == failed + 1
+    assert metrics.FILE_SECONDS.count() == observed + 3
+    assert metrics.FILES_RUNNING.value() == 0
+
+
+def test_local_science_missing_input(tmp_path):
+    generated_file_directory, _, output_file_directory = prepare_input_files(
+        tmp_path, "tests/genfiles_raw/query1_python", []
+    )
+
+    local = LocalProcessScienceImage()
+    with pytest.raises(FileNotFoundError):
+        local.transform(
+            generated_file_directory,
+            [str(tmp_path / "missing.root")],
+            output_file_directory,
+            "root-file",
+        )
+
+
+def test_local_science_unknown_language(tmp_path):
+    (tmp_path / "transformer_capabilities.json").write_text(
+        '{"language": "cobol", "command": "/generated/transform_a_file.cbl"}'
+    )
+    with pytest.raises(ValueError, match="cobol"):
+        LocalProcessScienceImage().payload_command(tmp_path)
+
+
 def test_docker_stderr_ordering(tmp_path, caplog, request):
     "Make sure that we can deal with stderr and stdout messages interleaved"
     if not request.config.getoption("--docker"):
@@ -678,3 +811,339 @@ def test_docker_stderr_ordering(tmp_path, caplog, request):
             break
 
     assert len(expected_messages) == 0
+
+
+def test_docker_parallel_files_respect_file_slots(tmp_path: Path):
+    "The worker pool runs files in parallel, but never more than the shared slots."
+    import threading
+    import time
+    from unittest.mock import patch
+
+    input_names = ["file1.root", "file2.root", "file3.root", "file4.root"]
+    generated_file_directory, actual_input_files, output_file_directory = (
+        prepare_input_files(tmp_path, "tests/genfiles_raw/query2_bash", input_names)
+    )
+
+    lock = threading.Lock()
+    running = {"now": 0, "max": 0}
+    container_names = []
+
+    def mock_run_command_with_logging(command, log_file, **kwargs):
+        with lock:
+            running["now"] += 1
+            running["max"] = max(running["max"], running["now"])
+            container_names.append(command[command.index("--name") + 1])
+        time.sleep(0.05)
+        output_name = command[-2].split("/")[-1]
+        (output_file_directory / output_name).touch()
+        with lock:
+            running["now"] -= 1
+
+    with patch(
+        "servicex_local.science_images.run_command_with_logging",
+        side_effect=mock_run_command_with_logging,
+    ):
+        docker = DockerScienceImage(
+            "sslhep/servicex_func_adl_uproot_transformer:uproot5", max_workers=4
+        )
+        docker.file_slots = threading.BoundedSemaphore(2)
+        output_files = docker.transform(
+            generated_file_directory,
+            actual_input_files,
+            output_file_directory,
+            "root-file",
+        )
+
+    assert sorted(o.name for o in output_files) == input_names
+    assert running["max"] == 2
+    assert len(set(container_names)) == len(input_names)
+
+
+def test_docker_parallel_files_first_failure_raises(tmp_path: Path):
+    "A failing file in the worker pool fails the whole transform."
+    from unittest.mock import patch
+
+    generated_file_directory, actual_input_files, output_file_directory = (
+        prepare_input_files(
+            tmp_path, "tests/genfiles_raw/query2_bash", ["file1.root", "file2.root"]
+        )
+    )
+
+    def mock_run_command_with_logging(command, log_file, **kwargs):
+        if command[-2].endswith("file2.root"):
+            raise RuntimeError("Failed to run SX science payload locally with exit_code=3")
+        (output_file_directory / "file1.root").touch()
+
+    with patch(
+        "servicex_local.science_images.run_command_with_logging",
+        side_effect=mock_run_command_with_logging,
+    ):
+        docker = DockerScienceImage(
+            "sslhep/servicex_func_adl_uproot_transformer:uproot5", max_workers=2
+        )
+        with pytest.raises(RuntimeError, match="exit_code=3"):
+            docker.transform(
+                generated_file_directory,
+                actual_input_files,
+                output_file_directory,
+                "root-file",
+            )
+
+
+@pytest.mark.parametrize("cancel_first", [False, True])
+def test_parallel_files_stop_starting_after_failure(tmp_path: Path, cancel_first):
+    "Once a file fails, or the run is cancelled, queued files never start."
+    import threading
+    import time
+
+    started = []
+
+    class _Image(BaseScienceImage):
+        def transform(
+            self, generated_files_dir, input_files, output_directory, output_format,
+            on_file_done=None, cancel=None,
+        ):
+            def run_one(input_file, result):
+                started.append(input_file)
+                if input_file == "f0":
+                    # Long enough for f1 to start alongside
+                    time.sleep(0.05)
+                    if cancel_first:
+                        cancel.set()
+                    else:
+                        raise RuntimeError("bad input")
+                time.sleep(0.2)
+                return output_directory / input_file
+
+            return self._run_files(input_files, run_one, on_file_done, cancel)
+
+    image = _Image()
+    image.max_workers = 2
+    done = []
+    with pytest.raises(RuntimeError) as e:
+        image.transform(
+            tmp_path,
+            [f"f{i}" for i in range(6)],
+            tmp_path,
+            "root-file",
+            on_file_done=done.append,
+            cancel=threading.Event(),
+        )
+
+    assert isinstance(e.value, FilesNotStarted) == cancel_first
+    assert sorted(started) == ["f0", "f1"]
+    assert sorted(r.input_file for r in done) == ["f0", "f1"]
+
+
+@pytest.mark.parametrize(
+    "input_file, output_format, expected",
+    [
+        ("/data/file1.root", "root-file", "file1.root"),
+        ("/data/file1.root", "parquet", "file1.parquet"),
+        ("/data/DAOD_PHYS.pool.root.1", "parquet", "DAOD_PHYS.pool.parquet"),
+        ("root://server//data/file1.root", "parquet", "file1.parquet"),
+    ],
+)
+def test_output_file_name(input_file, output_format, expected):
+    from servicex_local.science_images import output_file_name
+
+    assert output_file_name(input_file, output_format) == expected
+
+
+def test_docker_parquet_output_name(tmp_path: Path):
+    "Parquet requests write a .parquet output file."
+    from unittest.mock import patch
+
+    generated_file_directory, actual_input_files, output_file_directory = (
+        prepare_input_files(tmp_path, "tests/genfiles_raw/query1_python", ["file1.root"])
+    )
+    captured = {}
+
+    def mock_run_command_with_logging(command, log_file, **kwargs):
+        captured["command"] = command
+        (output_file_directory / "file1.parquet").touch()
+
+    with patch(
+        "servicex_local.science_images.run_command_with_logging",
+        side_effect=mock_run_command_with_logging,
+    ):
+        docker = DockerScienceImage("sslhep/servicex_func_adl_uproot_transformer:uproot5")
+        output_files = docker.transform(
+            generated_file_directory,
+            actual_input_files,
+            output_file_directory,
+            "parquet",
+        )
+
+    assert captured["command"][-2:] == ["/servicex/output/file1.parquet", "parquet"]
+    assert [o.name for o in output_files] == ["file1.parquet"]
+
+
+def _print_lines_command(lines: List[str], exit_code: int = 0) -> List[str]:
+    "A command that prints ``lines`` and exits with ``exit_code``."
+    script = f"import sys; print({chr(10).join(lines)!r}); sys.exit({exit_code})"
+    return [sys.executable, "-c", script]
+
+
+def test_run_command_log_file_is_complete(tmp_path: Path):
+    "Every line is in the log file by the time the command returns."
+    lines = [f"line {i}" for i in range(1000)]
+    log_file = tmp_path / "logs" / "run.log"
+
+    run_command_with_logging(_print_lines_command(lines), log_file)
+
+    logged = log_file.read_text().splitlines()
+    assert logged[1:] == lines
+
+
+def test_run_command_failure_dump_is_bounded(tmp_path: Path, caplog):
+    "On failure only the tail plus the promoted lines are dumped, in order."
+    lines = [f"line {i}" for i in range(1000)]
+    lines[10] = "ERROR: first problem"
+    lines[11] = "details of the problem"
+    lines[12] = ""
+
+    with caplog.at_level(logging.INFO, logger="servicex_local.science_images"):
+        with pytest.raises(RuntimeError, match="exit_code=3"):
+            run_command_with_logging(
+                _print_lines_command(lines, exit_code=3),
+                tmp_path / "run.log",
+                tail_lines=5,
+            )
+
+    dumped = [
+        r.getMessage()
+        for r in caplog.records
+        if r.levelno == logging.INFO
+    ]
+    assert dumped == [
+        "... 10 lines omitted ...",
+        "ERROR: first problem",
+        "details of the problem",
+        "",
+        "... 982 lines omitted ...",
+        "line 995",
+        "line 996",
+        "line 997",
+        "line 998",
+        "line 999",
+    ]
+    assert len((tmp_path / "run.log").read_text().splitlines()) == 1001
+
+
+def test_run_command_uses_log_rules(tmp_path: Path, caplog):
+    "Each line is logged at the level the log rules give it."
+    rules = LogRules({r"Error in <TFile": "INFO"})
+    lines = ["Error in <TFile::Init>: recovering", "error: real problem"]
+
+    with caplog.at_level(logging.DEBUG, logger="servicex_local.science_images"):
+        run_command_with_logging(
+            _print_lines_command(lines), tmp_path / "run.log", log_rules=rules
+        )
+
+    levels = {r.getMessage(): r.levelno for r in caplog.records}
+    assert levels[lines[0]] == logging.INFO
+    assert levels[lines[1]] == logging.ERROR
+
+
+def test_docker_file_results(tmp_path: Path):
+    "Each file's result records its container, exit code and sizes."
+    from unittest.mock import patch
+
+    from servicex_local.science_images import FileResult, ScienceRunError
+
+    generated_file_directory, actual_input_files, output_file_directory = (
+        prepare_input_files(
+            tmp_path, "tests/genfiles_raw/query2_bash", ["good.root", "bad.root"]
+        )
+    )
+    Path(actual_input_files[0]).write_bytes(b"x" * 10)
+
+    def mock_run_command_with_logging(command, log_file, **kwargs):
+        output_name = command[-2].split("/")[-1]
+        if output_name == "bad.root":
+            raise ScienceRunError("Failed to run SX science payload locally", 137)
+        (output_file_directory / output_name).write_bytes(b"y" * 4)
+
+    results: List[FileResult] = []
+    with patch(
+        "servicex_local.science_images.run_command_with_logging",
+        side_effect=mock_run_command_with_logging,
+    ):
+        docker = DockerScienceImage("sslhep/servicex_func_adl_uproot_transformer:uproot5")
+        with pytest.raises(RuntimeError):
+            docker.transform(
+                generated_file_directory,
+                actual_input_files,
+                output_file_directory,
+                "root-file",
+                on_file_done=results.append,
+            )
+
+    good, bad = results
+    assert good.exit_code == 0
+    assert good.bytes_in == 10
+    assert good.bytes_out == 4
+    assert good.container is not None and "good" in good.container
+    assert bad.exit_code == 137
+    assert bad.bytes_out is None
+    assert not bad.succeeded
+
+
+def test_run_command_failure_exit_code(tmp_path: Path):
+    "A failing command raises a ScienceRunError carrying its exit code."
+    from servicex_local.science_images import ScienceRunError
+
+    with pytest.raises(ScienceRunError) as e:
+        run_command_with_logging(_print_lines_command([], exit_code=5), tmp_path / "run.log")
+
+    assert e.value.exit_code == 5
+
+
+def test_run_command_run_name(tmp_path: Path, caplog):
+    "Runs sharing a log file are prefixed there and get their own transcript."
+    import threading
+
+    log_file = tmp_path / "docker_log.txt"
+
+    def run(name: str):
+        run_command_with_logging(
+            _print_lines_command([f"{name} {i}" for i in range(200)] + ["warning: x"]),
+            log_file,
+            run_name=name,
+        )
+
+    with caplog.at_level(logging.WARNING, logger="servicex_local.science_images"):
+        threads = [threading.Thread(target=run, args=(n,)) for n in ("a", "b")]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    shared = log_file.read_text().splitlines()
+    for name in ("a", "b"):
+        mine = [ln for ln in shared if ln.startswith(f"[{name}] ")]
+        assert [ln[4:] for ln in mine[1:]] == [f"{name} {i}" for i in range(200)] + [
+            "warning: x"
+        ]
+        own = (tmp_path / f"docker_log.{name}.txt").read_text().splitlines()
+        assert own[1:] == [f"{name} {i}" for i in range(200)] + ["warning: x"]
+    assert sorted(r.getMessage() for r in caplog.records) == [
+        "[a] warning: x",
+        "[b] warning: x",
+    ]
+
+
+def test_science_image_names():
+    "Each image says what its files run in, for the event log"
+    from servicex_local.science_images import (
+        DockerScienceImage,
+        LocalProcessScienceImage,
+        SingularityScienceImage,
+        WSL2ScienceImage,
+    )
+
+    assert DockerScienceImage("repo/image:tag").image == "repo/image:tag"
+    assert SingularityScienceImage("docker://repo/image:tag").image == "docker://repo/image:tag"
+    assert WSL2ScienceImage("al9_atlas", "22.2.107").image == "al9_atlas:22.2.107"
+    assert LocalProcessScienceImage().image == "local"
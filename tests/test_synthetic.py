@@ -0,0 +1,101 @@
+import awkward as ak
+import pytest
+import uproot
+
+from servicex_local import utils
+from servicex_local.synthetic import entries_for_size, write_synthetic_file
+
+
+def test_synthetic_trees_and_branches(tmp_path):
+    path = write_synthetic_file(
+        tmp_path / "f.root", n_trees=2, n_branches=4, entries=50
+    )
+
+    with uproot.open(path) as f:
+        assert sorted(f.keys(cycle=False)) == ["MetaData", "tree000", "tree001"]
+        tree = f["tree000"]
+        assert tree.num_entries == 50
+        a = tree.arrays(["branch000", "branch001", "branch002", "branch003"])
+
+    assert str(a.type.content) == (
+        "{branch000: float32, branch001: var * int32, "
+        "branch002: float64, branch003: var * int64}"
+    )
+
+
+def test_synthetic_is_reproducible(tmp_path):
+    def read(path):
+        with uproot.open(path) as f:
+            return f["tree000"].arrays().tolist()
+
+    assert read(write_synthetic_file(tmp_path / "a.root", entries=20, seed=3)) == read(
+        write_synthetic_file(tmp_path / "b.root", entries=20, seed=3)
+    )
+    assert read(write_synthetic_file(tmp_path / "c.root", entries=20, seed=4)) != read(
+        tmp_path / "a.root"
+    )
+
+
+def test_synthetic_chunked_write(tmp_path):
+    "Writing in chunks gives every entry"
+    path = write_synthetic_file(
+        tmp_path / "f.root", n_branches=2, entries=1001, chunk_entries=100
+    )
+    with uproot.open(path) as f:
+        assert f["tree000"].num_entries == 1001
+
+
+def test_synthetic_flat(tmp_path):
+    path = write_synthetic_file(
+        tmp_path / "f.root", n_branches=2, entries=10, jagged_depth=0
+    )
+    with uproot.open(path) as f:
+        assert f["tree000"].keys() == ["branch000", "branch001"]
+
+
+def test_synthetic_rntuple_nested(tmp_path):
+    path = write_synthetic_file(
+        tmp_path / "f.root", n_branches=2, entries=10, jagged_depth=2, rntuple=True
+    )
+    with uproot.open(path) as f:
+        assert f["tree000"].classname == "ROOT::RNTuple"
+        a = f["tree000"].arrays()
+    assert len(a) == 10
+    assert ak.Array(a["branch001"]).ndim == 3
+
+
+def test_synthetic_ttree_nested_not_supported(tmp_path):
+    with pytest.raises(ValueError, match="rntuple"):
+        write_synthetic_file(tmp_path / "f.root", jagged_depth=2)
+
+
+def test_synthetic_unknown_compression(tmp_path):
+    with pytest.raises(ValueError, match="compression"):
+        write_synthetic_file(tmp_path / "f.root", compression="snappy")
+
+
+def test_synthetic_metadata_structure(tmp_path):
+    "The MetaData tree is read back as FileMetaData by the structure query"
+    path = write_synthetic_file(
+        tmp_path / "f.root", entries=5, metadata={"dataType": "StreamAOD", "mcProcID": 7}
+    )
+
+    structure = ak.to_list(utils.run_query(str(path)))[0]
+
+    assert '"FileMetaData": {"dataType": "StreamAOD", "mcProcID": "7"}' in structure
+
+
+def test_synthetic_no_metadata(tmp_path):
+    path = write_synthetic_file(tmp_path / "f.root", entries=5, metadata=None)
+    with uproot.open(path) as f:
+        assert "MetaData" not in f.keys(cycle=False)
+
+
+def test_entries_for_size(tmp_path):
+    "The size estimate lands within a factor of two of the file size"
+    size = 2_000_000
+    entries = entries_for_size(size, n_branches=6)
+    path = write_synthetic_file(
+        tmp_path / "f.root", n_branches=6, entries=entries, compression=None
+    )
+    assert size / 2 < path.stat().st_size < size * 2
@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from servicex_local.timing import Timings
+
+
+def test_span_records_on_error():
+    "A span is recorded even when its block raises."
+    timings = Timings()
+
+    with pytest.raises(ValueError):
+        with timings.span("codegen", "MySample"):
+            raise ValueError("bad query")
+
+    (span,) = timings.spans
+    assert (span.stage, span.sample) == ("codegen", "MySample")
+    assert span.duration >= 0
+
+
+def test_summary():
+    timings = Timings()
+    start = datetime(2024, 1, 1)
+    for seconds in (1, 2, 6):
+        timings.record("file", start, start + timedelta(seconds=seconds), "s", f"{seconds}")
+    timings.record("collect", start, start + timedelta(seconds=1), "s")
+
+    summary = timings.summary()
+
+    assert list(summary) == ["file", "collect"]
+    assert summary["file"].count == 3
+    assert summary["file"].total == 9.0
+    assert summary["file"].mean == 3.0
+    assert summary["file"].max == 6.0
+
+
+def test_report_lists_stages_and_slowest_files():
+    timings = Timings()
+    start = datetime(2024, 1, 1)
+    for n in range(7):
+        timings.record("file", start, start + timedelta(seconds=n), "MySample", f"f{n}.root")
+    timings.record("deliver", start, start + timedelta(seconds=30))
+
+    report = timings.report().splitlines()
+
+    assert report[0].split() == ["Stage", "Count", "Total", "(s)", "Mean", "(s)", "Max", "(s)"]
+    assert report[1].split() == ["file", "7", "21.00", "3.00", "6.00"]
+    assert report[2].split()[0] == "deliver"
+    assert report[3] == "Slowest files:"
+    assert [ln.split()[-1] for ln in report[4:]] == [f"f{n}.root" for n in (6, 5, 4, 3, 2)]
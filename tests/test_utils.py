@@ -6,6 +6,7 @@ import numpy as np
 import os
 import re
 import filecmp
+from collections import OrderedDict
 from servicex_local import utils
 from servicex import dataset
 from servicex.python_dataset import PythonFunction
@@ -288,3 +289,355 @@ def test_metadata_retrieval(build_test_samples, tmp_path, capsys):
     assert (
         expected == output_str
     ), f"Output does not match expected.\n Output: {output_str}"
+
+
+def test_metadata_reads_first_entry_only(tmp_path):
+    "Merged files have many MetaData entries; only the first is read."
+    from unittest.mock import patch
+
+    path = str(tmp_path / "merged.root")
+    with uproot.create(path) as file:
+        file.mktree("MetaData", {"FileMetaDataAuxDyn.runNumber": "int64"})
+        for start in range(0, 100_000, 10_000):
+            file["MetaData"].extend(
+                {"FileMetaDataAuxDyn.runNumber": np.arange(start, start + 10_000) + 7}
+            )
+
+    seen = []
+    real_arrays = uproot.TTree.arrays
+
+    def spy_arrays(self, *args, **kwargs):
+        seen.append(kwargs.get("entry_stop"))
+        return real_arrays(self, *args, **kwargs)
+
+    with patch.object(uproot.TTree, "arrays", spy_arrays), patch.object(
+        uproot.TBranch, "array", side_effect=AssertionError("whole branch read")
+    ):
+        structure = json.loads(utils.run_query(path)[0])
+
+    assert structure["FileMetaData"] == {"runNumber": "7"}
+    assert seen == [1]
+
+
+@pytest.fixture
+def structure_files(tmp_path):
+    "Files with different structures, named so sorting would change their order"
+    from servicex_local.synthetic import write_synthetic_file
+
+    return {
+        f"sample_{name}": str(
+            write_synthetic_file(tmp_path / f"{name}.root", n_branches=n, entries=5)
+        )
+        for name, n in [("c", 1), ("a", 2), ("d", 3), ("b", 4)]
+    }
+
+
+def test_local_get_structure_parallel(structure_files, monkeypatch):
+    "A process pool gives the same result, in input order, as reading serially"
+    serial = utils.local_get_structure(structure_files, None, array_out=True)
+    monkeypatch.setattr(utils, "_structure_cache", OrderedDict())
+    parallel = utils.local_get_structure(
+        structure_files, None, array_out=True, max_workers=3
+    )
+
+    assert list(parallel) == list(structure_files)
+    assert {k: str(v) for k, v in parallel.items()} == {
+        k: str(v) for k, v in serial.items()
+    }
+    assert utils.local_get_structure(
+        structure_files, None, max_workers=3
+    ) == utils.local_get_structure(structure_files, None)
+
+
+@pytest.mark.parametrize("max_workers", [1, 3])
+def test_local_get_structure_bad_file_isolated(
+    structure_files, tmp_path, caplog, max_workers
+):
+    bad = tmp_path / "bad.root"
+    bad.write_text("not a ROOT file")
+    datasets = {"bad": str(bad), **structure_files}
+
+    result = utils.local_get_structure(
+        datasets, None, array_out=True, max_workers=max_workers
+    )
+
+    assert list(result) == list(datasets)
+    assert result["bad"] is None
+    assert all(result[name] is not None for name in structure_files)
+    assert "Error reading structure of sample 'bad'" in caplog.text
+
+    text = utils.local_get_structure(datasets, None, max_workers=max_workers)
+    assert "Sample: bad" not in text
+    assert "Sample: sample_a" in text
+
+
+@pytest.mark.parametrize("max_workers", [1, 3])
+def test_local_get_structure_all_bad(tmp_path, max_workers):
+    "With nothing readable, the error is raised"
+    with pytest.raises(FileNotFoundError):
+        utils.local_get_structure(
+            [str(tmp_path / "missing1.root"), str(tmp_path / "missing2.root")],
+            None,
+            max_workers=max_workers,
+        )
+
+
+def test_local_get_structure_bad_workers(structure_files):
+    with pytest.raises(ValueError, match="max_workers"):
+        utils.local_get_structure(structure_files, None, max_workers=0)
+
+
+def test_local_get_structure_cached(structure_files, monkeypatch):
+    "A file is only read again once it has changed"
+    monkeypatch.setattr(utils, "_structure_cache", OrderedDict())
+    reads = []
+    real = utils._structure_json
+    monkeypatch.setattr(
+        utils, "_structure_json", lambda path, *args: reads.append(path) or real(path, *args)
+    )
+
+    first = utils.local_get_structure(structure_files, None)
+    assert utils.local_get_structure(structure_files, None) == first
+    assert len(reads) == len(structure_files)
+
+    from servicex_local.synthetic import write_synthetic_file
+
+    write_synthetic_file(structure_files["sample_a"], n_branches=5, entries=7)
+    changed = utils.local_get_structure(structure_files, None)
+    assert len(reads) == len(structure_files) + 1
+    assert changed != first
+
+
+def test_structure_cache_bounded(structure_files, monkeypatch):
+    "Only the most recently used structures are kept"
+    monkeypatch.setattr(utils, "_structure_cache", OrderedDict())
+    monkeypatch.setattr(utils, "_STRUCTURE_CACHE_SIZE", 1)
+    reads = []
+    real = utils._structure_json
+    monkeypatch.setattr(
+        utils, "_structure_json", lambda path, *args: reads.append(path) or real(path, *args)
+    )
+
+    first, second = list(structure_files.values())[:2]
+    utils.local_get_structure(first, None)
+    utils.local_get_structure(first, None)
+    assert reads == [first]
+    utils.local_get_structure(second, None)
+    assert len(utils._structure_cache) == 1
+    utils.local_get_structure(first, None)
+    assert reads == [first, second, first]
+
+
+@pytest.fixture
+def dataset_files(tmp_path):
+    "A dataset with two schemas: most files have 3 branches, two have 4"
+    from servicex_local.synthetic import write_synthetic_file
+
+    return [
+        str(
+            write_synthetic_file(
+                tmp_path / f"file{i}.root", n_branches=4 if i in (2, 5) else 3, entries=5
+            )
+        )
+        for i in range(6)
+    ]
+
+
+@pytest.mark.parametrize("max_workers", [1, 3])
+def test_local_get_dataset_structure_groups(dataset_files, monkeypatch, max_workers):
+    monkeypatch.setattr(utils, "_structure_cache", OrderedDict())
+    groups = utils.local_get_dataset_structure(
+        dataset_files, None, max_workers=max_workers, schemas_out=True
+    )
+
+    assert len(groups) == 2
+    assert groups[0].files == [dataset_files[i] for i in (0, 1, 3, 4)]
+    assert groups[1].files == [dataset_files[2], dataset_files[5]]
+    assert "branch003" in groups[1].schema["tree000"]
+    assert "branch003" not in groups[0].schema["tree000"]
+
+
+def test_local_get_dataset_structure_text(dataset_files, tmp_path):
+    bad = tmp_path / "bad.root"
+    bad.write_text("not a ROOT file")
+
+    text = utils.local_get_dataset_structure(
+        [*dataset_files, str(bad)], None, filter_branch="branch"
+    )
+
+    assert "Dataset: 6 files, 2 distinct schemas" in text
+    assert f"Unreadable files (1): {bad}" in text
+    # The first schema in full, the second only as its differences.
+    assert text.count("Tree: tree000") == 1
+    assert "branch000 ; dtype: AsDtype('>f4')" in text
+    assert "+ tree000: branch003 ; dtype: AsJagged(AsDtype('>i8'))" in text
+    assert "- tree000" not in text
+
+
+@pytest.mark.parametrize(
+    "filters",
+    [{"branch_regex": "branch00[03]$"}, {"branch_glob": "branch00[03]"}],
+)
+def test_local_get_dataset_structure_filters(dataset_files, filters, capsys):
+    "The schemas are filtered the same way as a single file's structure"
+    utils.local_get_dataset_structure(dataset_files, None, do_print=True, **filters)
+    text = capsys.readouterr().out
+
+    assert "branch000 ; dtype" in text
+    assert "branch001" not in text
+    assert "+ tree000: branch003" in text
+    kind, value = next(iter(filters.items()))
+    assert f"({kind.split('_')[1]} '{value}')" in text
+
+
+def test_local_get_dataset_structure_glob(dataset_files, tmp_path):
+    groups = utils.local_get_dataset_structure(
+        str(tmp_path / "file*.root"), None, schemas_out=True
+    )
+    assert sorted(f for g in groups for f in g.files) == sorted(dataset_files)
+
+
+def test_local_get_dataset_structure_no_files(tmp_path):
+    with pytest.raises(ValueError, match="No files"):
+        utils.local_get_dataset_structure(str(tmp_path / "*.root"), None)
+
+
+@pytest.mark.parametrize(
+    "dtype_str, expected",
+    [
+        ("AsDtype('>f4')", (0, ">f4")),
+        ("AsJagged(AsJagged(AsDtype('>i8')))", (2, ">i8")),
+        ("AsJagged(AsDtype('>f4'), header_bytes=10)", (1, ">f4")),
+        ("AsDtype('>f4', '>f8')", (0, ">f8")),
+        ("AsStrings()", (0, "string")),
+        ("AsObjects(AsVector(True, dtype('>f4')))", (1, ">f4")),
+        ("AsObjects(AsVector(True, AsVector(False, dtype('>i4'))))", (2, ">i4")),
+        ("AsObjects(AsVector(True, AsString(False)))", (1, "string")),
+        ("AsObjects(AsArray(True, False, AsVector(False, dtype('float32')), ()))", (2, "float32")),
+        ("AsObjects(AsMap(True, AsString(True), dtype('>i4')))", (0, None)),
+        ("AsObjects(Model_xAOD_3a3a_EventInfo_v1)", (0, None)),
+    ],
+)
+def test_parse_jagged_depth_and_dtype(dtype_str, expected):
+    assert utils.parse_jagged_depth_and_dtype(dtype_str) == expected
+
+
+def test_str_to_array_interpretations(monkeypatch):
+    "Types are built for every kind of branch, without making any arrays"
+    monkeypatch.setattr(ak, "Array", None)
+    encoded = json.dumps(
+        {
+            "FileMetaData": {"amiTag": "p1"},
+            "events": {
+                "flag": "AsDtype('bool')",
+                "pt": "AsJagged(AsDtype('>f4'), header_bytes=10)",
+                "names": "AsObjects(AsVector(True, AsString(False)))",
+                "title": "AsStrings()",
+                "info": "AsObjects(Model_xAOD_3a3a_EventInfo_v1)",
+            },
+            "empty": {},
+        }
+    )
+
+    result = utils.str_to_array(encoded)
+
+    assert str(result) == (
+        "1 * {events: {flag: var * bool, pt: var * var * float32, "
+        "names: var * var * string, title: var * string, info: ?unknown}}"
+    )
+
+
+def _branch_structure():
+    return {
+        "sample": json.dumps(
+            {
+                "events": {
+                    "Electron_pt": "AsDtype('>f4')",
+                    "Electron_eta": "AsDtype('>f4')",
+                    "Muon_pt": "AsDtype('>f4')",
+                    "jet_pt": "AsDtype('>f4')",
+                }
+            }
+        )
+    }
+
+
+@pytest.mark.parametrize(
+    "filters, kept",
+    [
+        ({"branch_regex": r"_pt$"}, ["Electron_pt", "Muon_pt", "jet_pt"]),
+        ({"branch_regex": r"^(Electron|Muon)_"}, ["Electron_pt", "Electron_eta", "Muon_pt"]),
+        ({"branch_glob": "Electron*"}, ["Electron_pt", "Electron_eta"]),
+        ({"branch_glob": "*_pt", "filter_branch": "on"}, ["Electron_pt", "Muon_pt"]),
+    ],
+)
+def test_print_structure_filters(filters, kept):
+    text = utils.print_structure_from_str(_branch_structure(), **filters)
+    shown = re.findall(r"── (\w+) ; dtype", text)
+    assert shown == kept
+
+
+def test_print_structure_out(tmp_path):
+    "Written to a path or a file-like object as it is formatted, same as returned"
+    expected = utils.print_structure_from_str(_branch_structure())
+
+    path = tmp_path / "structure.txt"
+    assert utils.print_structure_from_str(_branch_structure(), out=path) is None
+    assert path.read_text(encoding="utf-8") == expected
+
+    class Writes:
+        def __init__(self):
+            self.chunks = []
+
+        def write(self, text):
+            self.chunks.append(text)
+
+    out = Writes()
+    utils.write_structure(_branch_structure(), out)
+    assert "".join(out.chunks) == expected
+    assert len(out.chunks) > 10
+
+
+def test_run_query_branch_stats(tmp_path):
+    from servicex_local.synthetic import write_synthetic_file
+
+    path = write_synthetic_file(tmp_path / "stats.root", n_branches=4, entries=2000)
+    without = json.loads(utils.run_query(str(path))[0])
+    assert "BranchStats" not in without
+
+    result = json.loads(utils.run_query(str(path), branch_stats=True)[0])
+    stats = result.pop("BranchStats")
+    assert result == without
+
+    tree = uproot.open(path)["tree000"]
+    assert set(stats["tree000"]) == set(tree.keys())
+    for name, s in stats["tree000"].items():
+        assert s == {
+            "compressed_bytes": tree[name].compressed_bytes,
+            "uncompressed_bytes": tree[name].uncompressed_bytes,
+            "baskets": tree[name].num_baskets,
+            "entries": 2000,
+        }
+
+
+def test_local_get_structure_branch_stats(tmp_path, monkeypatch):
+    "Branches are shown with their sizes, largest first; the types stay the same"
+    from servicex_local.synthetic import write_synthetic_file
+
+    monkeypatch.setattr(utils, "_structure_cache", OrderedDict())
+    path = str(write_synthetic_file(tmp_path / "stats.root", n_branches=4, entries=2000))
+
+    plain = utils.local_get_structure(path, None)
+    assert "compressed" not in plain
+
+    text = utils.local_get_structure(path, None, branch_stats=True, branch_glob="branch*")
+    sizes = [
+        float(m) for m in re.findall(r"branch\d+ ; dtype: .* ; ([\d.]+) kB compressed", text)
+    ]
+    assert len(sizes) == 4
+    assert sizes == sorted(sizes, reverse=True)
+    assert "Branches (largest first" in text
+
+    assert str(utils.local_get_structure(path, None, array_out=True, branch_stats=True)) == str(
+        utils.local_get_structure(path, None, array_out=True)
+    )